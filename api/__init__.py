@@ -1,13 +1,22 @@
 """Main quart application"""
 
 from hypercorn.config import Config
+import asyncio
+import base64
+import binascii
+import hashlib
 import logging
-from math import ceil
+import zlib
+from collections.abc import AsyncIterator
+from datetime import datetime, timezone
+from math import ceil, isfinite
 from os import environ
+import iso8601
+import orjson
 import pydash as py_
 from dotenv import load_dotenv
 import frontmatter
-from quart import Quart, request, jsonify, redirect
+from quart import Quart, Response, g, request, jsonify, redirect, send_file
 from quart_schema import (
     QuartSchema,
     Info,
@@ -18,19 +27,51 @@ from quart_schema import (
 )
 from quart_rate_limiter import RateLimiter
 from quart_cors import cors
-from commonmeta import doi_from_url
-
-from api.db_client import Database, get_pool, close_pool
+from citeproc_styles import StyleNotFoundError
+from commonmeta import doi_from_url, normalize_doi
+
+from api.db_client import (
+    Database,
+    PostsQueries,
+    POST_DOCUMENT_SELECT,
+    POST_DOCUMENTS_FROM,
+    get_pool,
+    close_pool,
+)
+from api.json_provider import (
+    OrjsonProvider,
+    NDJSON_MIMETYPE,
+    ndjson_lines,
+    dumps as json_dumps,
+)
+from api.cache import (
+    posts_cache,
+    facets_cache,
+    blogs_cache,
+    feeds_cache,
+    formats_cache,
+    handle_notification,
+    INVALIDATION_CHANNEL,
+    POSTS_CACHE_MAX_PAGE,
+)
 from api.utils import (
     get_formatted_metadata,
+    format_bibliography,
+    BIBLIOGRAPHY_FORMATS,
+    negotiate_format,
     get_markdown,
     convert_to_commonmeta,
+    resolve_doi_ra,
+    load_doi_ra_registry,
     write_epub,
     write_pdf,
     write_jats,
     format_markdown,
     validate_uuid,
     format_datetime,
+    normalize_tag,
+    unix_timestamp,
+    end_of_date,
     format_authors,
     format_authors_full,
     format_authors_with_orcid,
@@ -50,8 +91,24 @@ from api.posts import (
     delete_all_draft_records,
     update_all_cited_posts,
 )
-from api.blogs import extract_single_blog, extract_all_blogs, generate_opml
+from api.blogs import (
+    extract_single_blog,
+    extract_all_blogs,
+    generate_opml,
+    close_http_client,
+)
 from api.citations import extract_all_citations, extract_all_citations_by_prefix
+from api.feeds import (
+    atom_feed,
+    compress,
+    feed_posts,
+    json_feed,
+    parse_sitemap_name,
+    sitemap_index,
+    sitemap_parts,
+    sitemap_shard,
+)
+from api.snapshots import write_snapshot, latest_snapshot, snapshot_file_path
 from api.schema import Blog, Citation, Post, PostQuery
 
 SERVICE_ROLE_KEY_ENV = "ROGUE_SCHOLAR_SERVICE_ROLE_KEY"
@@ -82,6 +139,92 @@ def _is_authorized() -> bool:
     return token == expected_key
 
 
+# public statuses as literal predicate, the one of the partial indexes in
+# migrations/0003, so the planner can use them also for generic plans
+POSTS_PUBLIC_CONDITION = "p.status IN ('active', 'archived', 'expired')"
+
+# sort keys accepted by /posts, each backed by a partial index on (key, id)
+POSTS_SORT_COLUMNS = {
+    "published_at": "p.published_at",
+    "updated_at": "p.updated_at",
+    "title": "p.title",
+    "topic_score": "p.topic_score",
+}
+POSTS_SORT_ORDERS = {"asc": "ASC", "desc": "DESC"}
+
+# maximum number of ids and DOIs per /posts/batch request
+POSTS_BATCH_MAX_IDS = 500
+
+# statuses that can be exported, and posts per chunk of the export stream
+POSTS_EXPORT_STATUSES = ["pending", "active", "archived", "expired"]
+POSTS_EXPORT_BATCH_SIZE = 500
+
+# metadata formats of posts rendered with commonmeta
+POST_METADATA_FORMATS = [
+    "bibtex",
+    "ris",
+    "csl",
+    "schema_org",
+    "datacite",
+    "crossref_xml",
+    "commonmeta",
+    "citation",
+]
+# seconds in the formats cache for metadata rendered without the registration
+# agency of its DOI, instead of the 24 hours of complete renderings
+FORMATS_UNRESOLVED_PROVIDER_TTL = 300
+
+# fields of post documents not included in post responses
+POST_DOCUMENT_INTERNAL_FIELDS = ["status", "topic", "topic_score", "subfield"]
+
+# fields accepted by facet_by on /posts
+POSTS_FACET_COLUMNS = {
+    "language": "p.language",
+    "blog_slug": "p.blog_slug",
+    "subfield": "p.subfield",
+    "topic": "p.topic",
+    "tags": "p.tags",
+}
+
+
+# text search configurations returned by posts_search_config (migrations/0002)
+POSTS_SEARCH_CONFIGS = [
+    "simple",
+    "danish",
+    "dutch",
+    "english",
+    "finnish",
+    "french",
+    "german",
+    "hungarian",
+    "italian",
+    "norwegian",
+    "portuguese",
+    "romanian",
+    "russian",
+    "spanish",
+    "swedish",
+    "turkish",
+]
+
+# full-text query matching unstemmed terms, and stemmed terms in any post
+# language, a constant that can be looked up in the search_vector index
+POSTS_SEARCH_INDEX_TSQUERY = (
+    "("
+    + " || ".join(
+        f"websearch_to_tsquery('{config}', :query)" for config in POSTS_SEARCH_CONFIGS
+    )
+    + ")"
+)
+
+# full-text query matching unstemmed terms, and stemmed terms in the language
+# of the post, as the search_vector trigger stems them
+POSTS_SEARCH_TSQUERY = """(
+    websearch_to_tsquery('simple', :query)
+    || websearch_to_tsquery(posts_search_config(p.language), :query)
+)"""
+
+
 def _typesense_like_search_response(
     *,
     items: list[dict],
@@ -89,6 +232,8 @@ def _typesense_like_search_response(
     page: int,
     per_page: int,
     include_fields: list[str] | None = None,
+    facet_counts: list[dict] | None = None,
+    included: dict | None = None,
 ) -> dict:
     if include_fields:
         include_fields_set = set(include_fields)
@@ -97,6 +242,7 @@ def _typesense_like_search_response(
         ]
 
     return {
+        "facet_counts": facet_counts or [],
         "found": found,
         "out_of": found,
         "page": page,
@@ -104,9 +250,404 @@ def _typesense_like_search_response(
         "hits": [{"document": item} for item in items],
         "total-results": found,
         "items": items,
+        **({"included": included} if included is not None else {}),
     }
 
 
+# blog column of post listings, unless blogs are returned once in "included"
+BLOG_COLUMN = "row_to_json(b.*) as blog"
+
+
+def _include_blogs() -> bool:
+    """Whether the request asks for blogs in an included map keyed by slug,
+    instead of a blog object in every post. Not supported for NDJSON."""
+    include = request.args.get("include") or ""
+    return "blogs" in [i.strip() for i in include.split(",")] and not _wants_ndjson()
+
+
+def _bool_arg(name: str) -> bool:
+    """Parse a boolean query parameter, e.g. ?content_html=false. Raises
+    ValueError for values that are not booleans."""
+    value = (request.args.get(name) or "").strip().lower()
+    if value in ("true", "1", "yes"):
+        return True
+    if value in ("", "false", "0", "no"):
+        return False
+    raise ValueError(f"Invalid value for {name}: {value}")
+
+
+def _int_arg(name: str, default: int, minimum: int | None = None) -> int:
+    """Parse an integer query parameter, e.g. ?per_page=20. Raises ValueError
+    for values that are not integers or are below minimum."""
+    value = (request.args.get(name) or "").strip()
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {value}.") from None
+    if minimum is not None and number < minimum:
+        raise ValueError(f"Invalid {name}: {value}.")
+    return number
+
+
+def _is_date(value: str) -> bool:
+    """Whether value is an ISO 8601 date, as unix_timestamp and end_of_date
+    silently return the epoch for invalid dates."""
+    try:
+        iso8601.parse_date(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _since_timestamp(value: str) -> float:
+    """Unix timestamp of a since parameter, given as unix timestamp or ISO 8601
+    date. Raises ValueError if invalid."""
+    try:
+        timestamp = float(value)
+    except ValueError:
+        if not _is_date(value):
+            raise ValueError(f"Invalid since: {value}.")
+        return unix_timestamp(value)
+    if not isfinite(timestamp):
+        raise ValueError(f"Invalid since: {value}.")
+    return timestamp
+
+
+def _vary(header: str) -> None:
+    """Add a request header to the Vary header of the response, as the
+    response depends on it (see add_cache_headers)."""
+    g.vary = g.get("vary", set()) | {header}
+
+
+def _wants_ndjson() -> bool:
+    """Whether the client prefers newline-delimited JSON over JSON."""
+    _vary("Accept")
+    best = request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+
+def _ndjson_response(items: list, total: int | None = None) -> Response:
+    """Stream a list as newline-delimited JSON, one item per line."""
+    response = Response(
+        ndjson_lines(items, sort_keys=app.json.sort_keys), mimetype=NDJSON_MIMETYPE
+    )
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
+    return response
+
+
+async def _included_blogs(items: list[dict]) -> dict:
+    """Remove the blog placeholder from the posts, and get their blogs with one
+    query, keyed by slug."""
+    for item in items:
+        item.pop("blog", None)
+    slugs = sorted({item["blog_slug"] for item in items if item.get("blog_slug")})
+    if not slugs:
+        return {"blogs": {}}
+    query = """
+        SELECT b.slug, row_to_json(b.*) as blog
+        FROM blogs b
+        WHERE b.slug = ANY(:slugs)
+    """
+    rows = await Database.fetch_all(query, {"slugs": slugs})
+    return {"blogs": {row["slug"]: row["blog"] for row in rows}}
+
+
+async def _posts_facet_counts(
+    facet_by: list[str], where_clause: str, params: dict, max_values: int
+) -> list[dict]:
+    """Count posts matching the filters by value of each facet field, with one
+    query grouping the filtered posts once per field."""
+    columns = ", ".join(
+        f"{POSTS_FACET_COLUMNS[field]} as {field}" for field in facet_by
+    )
+    selects = []
+    for field in facet_by:
+        if field == "tags":
+            value, source = "tag", "filtered, unnest(filtered.tags) as tag"
+        else:
+            value, source = field, "filtered"
+        selects.append(
+            f"""(
+                SELECT '{field}' as field, {value}::text as value, COUNT(*) as count
+                FROM {source}
+                WHERE {value} IS NOT NULL
+                GROUP BY {value}
+                ORDER BY count DESC, value
+                LIMIT :max_facet_values
+            )"""
+        )
+    query = f"""
+        WITH filtered AS (
+            SELECT {columns}
+            FROM posts p
+            {where_clause}
+        )
+        {" UNION ALL ".join(selects)}
+    """
+    rows = await Database.fetch_all(query, {**params, "max_facet_values": max_values})
+    counts = {field: [] for field in facet_by}
+    for row in rows:
+        counts[row["field"]].append(
+            {"count": row["count"], "highlighted": row["value"], "value": row["value"]}
+        )
+    return [
+        {"counts": counts[field], "field_name": field, "sampled": False}
+        for field in facet_by
+    ]
+
+
+# Cache-Control max-age in seconds, by route
+CACHE_MAX_AGE = {
+    "post": 300,
+    "post_export": 3600,
+    "blog": 600,
+    "citations": 3600,
+    "feed": 600,
+    "sitemap": 3600,
+}
+
+
+def _etag(*parts) -> str:
+    """Build an ETag from the values that determine a response."""
+    value = "|".join("" if part is None else str(part) for part in parts)
+    return hashlib.blake2b(value.encode("utf-8"), digest_size=12).hexdigest()
+
+
+def _last_modified(*values) -> datetime | None:
+    """Get the latest of unix timestamps or ISO 8601 strings as datetime."""
+    dates = []
+    for value in values:
+        if value is None or value == "":
+            continue
+        try:
+            if isinstance(value, (int, float)):
+                dates.append(datetime.fromtimestamp(value, tz=timezone.utc))
+            else:
+                date = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+                if date.tzinfo is None:
+                    date = date.replace(tzinfo=timezone.utc)
+                dates.append(date)
+        except (ValueError, OverflowError, OSError):
+            continue
+    return max(dates) if dates else None
+
+
+def _apply_cache_headers(
+    response: Response, etag: str, last_modified: datetime | None, max_age: int
+) -> Response:
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response
+
+
+def _conditional_response(
+    etag: str, last_modified: datetime | None, max_age: int
+) -> Response | None:
+    """Return a 304 response if the client already has the current representation,
+    otherwise remember the validators for the response (see add_cache_headers)."""
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified is not None:
+        not_modified = int(last_modified.timestamp()) <= int(
+            request.if_modified_since.timestamp()
+        )
+    else:
+        not_modified = False
+    if not_modified:
+        return _apply_cache_headers(
+            Response("", status=304), etag, last_modified, max_age
+        )
+    g.cache_validators = (etag, last_modified, max_age)
+    return None
+
+
+async def _post_cache_validators(
+    *, id: str | None = None, doi: str | None = None
+) -> tuple[str, datetime | None] | None:
+    """Get ETag and last modified date of a post with a key-only query. The
+    post document is refreshed whenever the post or its citations change, the
+    blog joined when reading is part of the ETag with a hash of its row."""
+    if id:
+        where_clause = "WHERE d.id = :id"
+        params = {"id": id}
+    else:
+        where_clause = "WHERE d.doi = :doi"
+        params = {"doi": doi}
+    query = f"""
+        SELECT d.id, d.refreshed_at, d.document->'updated_at' as updated_at,
+               md5(CAST(to_jsonb(b.*) AS text)) as blog_hash
+        FROM {POST_DOCUMENTS_FROM}
+        {where_clause}
+    """
+    result = await Database.fetch_one(query, params)
+    if not result:
+        return None
+    etag = _etag(
+        version, result["id"], result["refreshed_at"], result["blog_hash"]
+    )
+    return etag, _last_modified(result["updated_at"])
+
+
+async def _post_document(
+    *, id: str | None = None, doi: str | None = None
+) -> str | None:
+    """Get post with blog and citations as JSON document from the post_documents
+    read model, without the fields only used internally."""
+    if id:
+        where_clause = "WHERE d.id = :id"
+        params = {"id": id}
+    else:
+        where_clause = "WHERE d.doi = :doi"
+        params = {"doi": doi}
+    query = f"""
+        SELECT CAST(
+            ({POST_DOCUMENT_SELECT}) - CAST(:internal_fields AS text[]) AS text
+        )
+        FROM {POST_DOCUMENTS_FROM}
+        {where_clause}
+    """
+    return await Database.fetch_val(
+        query, {**params, "internal_fields": POST_DOCUMENT_INTERNAL_FIELDS}
+    )
+
+
+async def _load_blog(slug: str) -> dict | None:
+    """Get blog with post stats maintained by database triggers."""
+    query = """
+        SELECT b.id, b.slug, b.feed_url, b.current_feed_url, b.home_page_url,
+               b.archive_host, b.archive_collection, b.archive_timestamps,
+               b.feed_format, b.created_at, b.updated_at, b.registered_at,
+               b.license, b.mastodon, b.generator, b.generator_raw, b.language,
+               b.favicon, b.title, b.description, b.category, b.subfield,
+               b.status, b.user_id, b.authors, b.use_api, b.relative_url,
+               b.filter, b.secure, b.community_id, b.prefix, b.issn,
+               COALESCE(s.post_count, 0) as post_count, s.last_post_at,
+               s.posts_updated_at
+        FROM blogs b
+        LEFT JOIN blog_post_stats s ON b.slug = s.slug
+        WHERE b.slug = :slug
+    """
+    return await Database.fetch_one(query, {"slug": slug})
+
+
+# mimetypes of the blog feed formats
+FEED_MIMETYPES = {"json": "application/feed+json", "atom": "application/atom+xml"}
+
+
+def _streamed_response(chunks: AsyncIterator[bytes], mimetype: str) -> Response:
+    """Stream generated chunks, gzip compressed if the client accepts it."""
+    headers = {"Vary": "Accept-Encoding"}
+    gzip = request.accept_encodings.quality("gzip") > 0
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+
+    async def body():
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+        async for chunk in chunks:
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+        if compressor is not None:
+            yield compressor.flush()
+
+    response = Response(body(), mimetype=mimetype, headers=headers)
+    response.timeout = None
+    return response
+
+
+def _precompressed_response(document: dict, mimetype: str) -> Response:
+    """Serve a cached body, gzip compressed if the client accepts it."""
+    headers = {"Vary": "Accept-Encoding"}
+    if request.accept_encodings.quality("gzip") > 0:
+        headers["Content-Encoding"] = "gzip"
+        return Response(document["gzip"], mimetype=mimetype, headers=headers)
+    return Response(document["body"], mimetype=mimetype, headers=headers)
+
+
+def _encode_cursor(*values) -> str:
+    """Encode the sort key of the last item of a page as opaque cursor."""
+    return base64.urlsafe_b64encode(orjson.dumps(values)).decode("ascii")
+
+
+def _decode_cursor(cursor: str, length: int) -> list:
+    """Decode a cursor created by _encode_cursor, raise ValueError if invalid."""
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, orjson.JSONDecodeError, UnicodeEncodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return values
+
+
+async def _render_post_metadata(
+    *, id: str | None, doi: str | None, format_: str, style: str, locale: str
+) -> dict | None:
+    """Get post with citations and render its metadata in a worker thread,
+    for the formats cache."""
+    if id:
+        result = await PostsQueries.select_by_id(id, with_citations=True)
+    else:
+        result = await PostsQueries.select_by_doi(doi, with_citations=True)
+    if not result:
+        return None
+    metadata = py_.omit(result, POST_DOCUMENT_INTERNAL_FIELDS + ["content_html"])
+    doi = metadata.get("doi", None)
+    provider = await resolve_doi_ra(doi)
+    response = await asyncio.to_thread(
+        _format_post_metadata, metadata, format_, style, locale
+    )
+    if response and doi and provider is None:
+        # rendered without the registration agency, e.g. after a failed
+        # lookup, cached only briefly so that the lookup is retried
+        response = {**response, "provider_unresolved": True}
+    return response
+
+
+def _formats_cache_ttl(response: dict | None) -> float | None:
+    """Shorter ttl in the formats cache for metadata rendered without the
+    registration agency of its DOI."""
+    if response and response.get("provider_unresolved"):
+        return FORMATS_UNRESOLVED_PROVIDER_TTL
+    return None
+
+
+def _format_post_metadata(metadata: dict, format_: str, style: str, locale: str):
+    meta = convert_to_commonmeta(metadata)
+    if isinstance(meta, dict):
+        meta["type"] = "article"
+    return get_formatted_metadata(meta, format_, style, locale)
+
+
+def _format_posts_bibliography(
+    posts: list[dict], format_: str, style: str, locale: str
+) -> dict:
+    """Convert posts to commonmeta and render them as one bibliography.
+    Blocking, run in a worker thread."""
+    metas = []
+    for post in posts:
+        metadata = py_.omit(post, POST_DOCUMENT_INTERNAL_FIELDS + ["content_html"])
+        meta = convert_to_commonmeta(metadata)
+        if isinstance(meta, dict):
+            meta["type"] = "article"
+            metas.append(meta)
+    return format_bibliography(metas, format_, style, locale)
+
+
+def _json_document_response(document: str) -> Response:
+    """Response with a JSON document built by Postgres, passed on as is.
+    Documents are built as jsonb, so keys come out sorted, not in column
+    order."""
+    return Response(document, mimetype="application/json")
+
+
 config = Config()
 config.from_toml("hypercorn.toml")
 load_dotenv()
@@ -115,21 +656,40 @@ version = "0.16"  # TODO: importlib.metadata.version('rogue-scholar-api')
 
 app = Quart(__name__, static_folder="static", static_url_path="")
 app.config.from_prefixed_env()
+app.json = OrjsonProvider(app)
 QuartSchema(app, info=Info(title="Rogue Scholar API", version=version))
 limiter = RateLimiter(app)
 app = cors(app, allow_origin="*")
 
+# one snapshot at a time per worker
+_snapshot_lock = asyncio.Lock()
+
 
 # Database connection pool lifecycle management
 @app.before_serving
 async def startup():
     """Initialize database connection pool on application startup."""
     try:
-        await get_pool()
+        pool = await get_pool()
         logger.info("Database connection pool initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize database pool: {e}", exc_info=True)
         raise
+    try:
+        # evict cache entries when other workers write posts, blogs or citations
+        await pool.listen(INVALIDATION_CHANNEL, handle_notification)
+    except Exception as e:
+        logger.error(f"Failed to listen for cache invalidations: {e}", exc_info=True)
+    app.add_background_task(warm_doi_ra_registry)
+
+
+async def warm_doi_ra_registry():
+    """Load DOI registration agencies by prefix, so that requests don't have to."""
+    try:
+        count = await load_doi_ra_registry()
+        logger.info(f"DOI registration agency registry loaded with {count} prefixes")
+    except Exception as e:
+        logger.warning(f"Failed to load DOI registration agency registry: {e}")
 
 
 @app.after_serving
@@ -140,6 +700,19 @@ async def shutdown():
         logger.info("Database connection pool closed successfully")
     except Exception as e:
         logger.error(f"Error closing database pool: {e}", exc_info=True)
+    await close_http_client()
+
+
+@app.after_request
+async def add_cache_headers(response):
+    """Add ETag, Last-Modified and Cache-Control headers to cacheable responses,
+    and the request headers the response depends on to Vary."""
+    validators = g.get("cache_validators", None)
+    if validators is not None and response.status_code == 200:
+        _apply_cache_headers(response, *validators)
+    for header in sorted(g.get("vary", ())):
+        response.vary.add(header)
+    return response
 
 
 def run() -> None:
@@ -186,6 +759,53 @@ async def health():
         ), 503
 
 
+@app.route("/sitemap.xml")
+async def sitemap():
+    """Get sitemap index, with one sitemap per month of publication."""
+    result = await Database.fetch_one(
+        """
+        SELECT COUNT(*) as count, MAX(lastmod) as lastmod,
+               MAX(refreshed_at) as refreshed_at
+        FROM sitemap_shards
+        WHERE post_count > 0
+        """
+    )
+    etag = _etag(version, "sitemap", result["count"], result["refreshed_at"])
+    not_modified = _conditional_response(
+        etag, _last_modified(result["lastmod"]), CACHE_MAX_AGE["sitemap"]
+    )
+    if not_modified:
+        return not_modified
+    return _streamed_response(sitemap_index(), "application/xml")
+
+
+@app.route("/sitemaps/<name>.xml")
+async def sitemap_by_month(name: str):
+    """Get sitemap of the posts published in a month (YYYY-MM), months with
+    more posts than a sitemap can hold continue in YYYY-MM-2 etc."""
+    try:
+        shard, part = parse_sitemap_name(name)
+    except ValueError:
+        return {"error": "Sitemap not found"}, 404
+    result = await Database.fetch_one(
+        """
+        SELECT post_count, lastmod, refreshed_at
+        FROM sitemap_shards
+        WHERE shard = :shard
+        """,
+        {"shard": shard},
+    )
+    if not result or part > sitemap_parts(result["post_count"]):
+        return {"error": "Sitemap not found"}, 404
+    etag = _etag(version, "sitemap", name, result["refreshed_at"])
+    not_modified = _conditional_response(
+        etag, _last_modified(result["lastmod"]), CACHE_MAX_AGE["sitemap"]
+    )
+    if not_modified:
+        return not_modified
+    return _streamed_response(sitemap_shard(shard, part), "application/xml")
+
+
 @app.route("/blogs/")
 @hide
 async def blogs_redirect():
@@ -221,37 +841,43 @@ async def blogs():
     limit = 10
 
     try:
-        # Get count
-        count_query = """
-            SELECT COUNT(*) as count
-            FROM blogs
-            WHERE status = ANY(:statuses)
-            AND title ILIKE :title_pattern
-        """
-        count_result = await Database.fetch_one(
-            count_query, {"statuses": status, "title_pattern": f"%{query}%"}
-        )
-        total_count = count_result["count"] if count_result else 0
+        where_conditions = ["status = ANY(:statuses)"]
+        params = {"statuses": status, "limit": limit, "offset": offset}
+        order_by = "created_at DESC"
+        if query:
+            # substring and fuzzy title matches, both served by the trigram index
+            where_conditions.append("(title ILIKE :title_pattern OR :query <%% title)")
+            params["title_pattern"] = f"%{query}%"
+            params["query"] = query
+            order_by = "word_similarity(:query, title) DESC, created_at DESC"
+        where_clause = "WHERE " + " AND ".join(where_conditions)
 
-        # Get data
-        data_query = """
+        # Get data and total count in one query
+        data_query = f"""
             SELECT slug, title, description, language, favicon, feed_url,
-                   feed_format, home_page_url, generator, category, subfield
+                   feed_format, home_page_url, generator, category, subfield,
+                   COUNT(*) OVER () as found
             FROM blogs
-            WHERE status = ANY(:statuses)
-            AND title ILIKE :title_pattern
-            ORDER BY created_at DESC
+            {where_clause}
+            ORDER BY {order_by}
             LIMIT :limit OFFSET :offset
         """
-        items = await Database.fetch_all(
-            data_query,
-            {
-                "statuses": status,
-                "title_pattern": f"%{query}%",
-                "limit": limit,
-                "offset": offset,
-            },
-        )
+        items = await Database.fetch_all(data_query, params)
+        if items:
+            total_count = items[0]["found"]
+        elif offset > 0:
+            # page is past the last result
+            count_query = f"""
+                SELECT COUNT(*) as count
+                FROM blogs
+                {where_clause}
+            """
+            count_result = await Database.fetch_one(count_query, params)
+            total_count = count_result["count"] if count_result else 0
+        else:
+            total_count = 0
+        for item in items:
+            del item["found"]
         return jsonify({"total-results": total_count, "items": items})
     except Exception as e:
         logger.warning(e.args[0] if hasattr(e, "args") else str(e))
@@ -273,42 +899,150 @@ async def post_blogs():
 @validate_response(Blog)
 @app.route("/blogs/<slug>")
 async def blog(slug):
-    """Get blog by slug."""
-    query = """
-        SELECT b.id, b.slug, b.feed_url, b.current_feed_url, b.home_page_url,
-               b.archive_host, b.archive_collection, b.archive_timestamps,
-               b.feed_format, b.created_at, b.updated_at, b.registered_at,
-               b.license, b.mastodon, b.generator, b.generator_raw, b.language,
-               b.favicon, b.title, b.description, b.category, b.subfield,
-               b.status, b.user_id, b.authors, b.use_api, b.relative_url,
-               b.filter, b.secure, b.community_id, b.prefix, b.issn,
-               json_agg(
-                   json_build_object(
-                       'id', p.id,
-                       'guid', p.guid,
-                       'doi', p.doi,
-                       'url', p.url,
-                       'title', p.title,
-                       'summary', p.summary,
-                       'published_at', p.published_at,
-                       'updated_at', p.updated_at
-                   )
-               ) FILTER (WHERE p.id IS NOT NULL) as posts
-        FROM blogs b
-        LEFT JOIN posts p ON b.slug = p.blog_slug
-        WHERE b.slug = :slug
-        GROUP BY b.id, b.slug, b.feed_url, b.current_feed_url, b.home_page_url,
-                 b.archive_host, b.archive_collection, b.archive_timestamps,
-                 b.feed_format, b.created_at, b.updated_at, b.registered_at,
-                 b.license, b.mastodon, b.generator, b.generator_raw, b.language,
-                 b.favicon, b.title, b.description, b.category, b.subfield,
-                 b.status, b.user_id, b.authors, b.use_api, b.relative_url,
-                 b.filter, b.secure, b.community_id, b.prefix, b.issn
-    """
-    result = await Database.fetch_one(query, {"slug": slug})
+    """Get blog by slug, with post_count, last_post_at and a page of posts.
+    Use next_cursor as cursor to get the next page. Options to change per_page."""
+    try:
+        per_page = min(_int_arg("per_page", 50, minimum=1), 100)
+    except ValueError as e:
+        return {"error": e.args[0]}, 400
+    cursor = request.args.get("cursor")
+    try:
+        position = _decode_cursor(cursor, 2) if cursor else None
+    except ValueError:
+        return {"error": "Invalid cursor."}, 400
+
+    result = await blogs_cache.get(("blog", slug), lambda: _load_blog(slug))
     if not result:
         return {"error": "Blog not found"}, 404
-    return jsonify(result)
+    metadata = py_.omit(result, "posts_updated_at")
+    not_modified = _conditional_response(
+        _etag(
+            version,
+            slug,
+            result["updated_at"],
+            result["post_count"],
+            result["posts_updated_at"],
+            cursor,
+            per_page,
+        ),
+        _last_modified(result["updated_at"], result["posts_updated_at"]),
+        CACHE_MAX_AGE["blog"],
+    )
+    if not_modified:
+        return not_modified
+
+    where_conditions = ["p.blog_slug = :slug", POSTS_PUBLIC_CONDITION]
+    params = {
+        "slug": slug,
+        "blog": json_dumps(metadata).decode("utf-8"),
+        "per_page": per_page,
+        "limit": per_page + 1,
+    }
+    if position:
+        where_conditions.append("(p.published_at, p.id) < (:published_at, :id)")
+        params["published_at"], params["id"] = position
+    # the cached blog with a page of posts as jsonb document built by
+    # Postgres, with next_cursor encoded as _encode_cursor does. Only the page
+    # is read from the database
+    query = f"""
+        WITH posts_page AS (
+            SELECT p.id, p.guid, p.doi, p.url, p.title, p.summary,
+                   p.published_at, p.updated_at
+            FROM posts p
+            WHERE {" AND ".join(where_conditions)}
+            ORDER BY p.published_at DESC, p.id DESC
+            LIMIT :limit
+        ), page AS (
+            SELECT posts_page.*,
+                   ROW_NUMBER() OVER (ORDER BY published_at DESC, id DESC) as n
+            FROM posts_page
+        )
+        SELECT (
+            CAST(:blog AS jsonb) || jsonb_build_object(
+                'posts', (
+                    SELECT COALESCE(
+                        jsonb_agg(
+                            jsonb_build_object(
+                                'id', page.id,
+                                'guid', page.guid,
+                                'doi', page.doi,
+                                'url', page.url,
+                                'title', page.title,
+                                'summary', page.summary,
+                                'published_at', page.published_at,
+                                'updated_at', page.updated_at
+                            )
+                            ORDER BY page.n
+                        ),
+                        '[]'
+                    )
+                    FROM page
+                    WHERE page.n <= :per_page
+                ),
+                'next_cursor', (
+                    SELECT translate(
+                        encode(
+                            convert_to(
+                                json_build_array(page.published_at, page.id)::text,
+                                'UTF8'
+                            ),
+                            'base64'
+                        ),
+                        E'+/\\n',
+                        '-_'
+                    )
+                    FROM page
+                    WHERE page.n = :per_page
+                    AND EXISTS (SELECT 1 FROM page WHERE page.n > :per_page)
+                )
+            )
+        )::text
+    """
+    document = await Database.fetch_val(query, params)
+    return _json_document_response(document)
+
+
+@app.route("/blogs/<slug>/feed.json")
+async def blog_json_feed(slug: str):
+    """Get JSON Feed of the latest posts of a blog."""
+    return await _blog_feed(slug, "json")
+
+
+@app.route("/blogs/<slug>/feed.atom")
+async def blog_atom_feed(slug: str):
+    """Get Atom feed of the latest posts of a blog."""
+    return await _blog_feed(slug, "atom")
+
+
+async def _blog_feed(slug: str, format_: str):
+    blog = await blogs_cache.get(("blog", slug), lambda: _load_blog(slug))
+    if not blog:
+        return {"error": "Blog not found"}, 404
+    etag = _etag(
+        version,
+        "feed",
+        format_,
+        slug,
+        blog["updated_at"],
+        blog["post_count"],
+        blog["posts_updated_at"],
+    )
+    not_modified = _conditional_response(
+        etag,
+        _last_modified(blog["updated_at"], blog["posts_updated_at"]),
+        CACHE_MAX_AGE["feed"],
+    )
+    if not_modified:
+        return not_modified
+
+    async def load():
+        posts = await feed_posts(slug)
+        if format_ == "atom":
+            return compress(atom_feed(blog, posts))
+        return compress(json_feed(blog, posts))
+
+    document = await feeds_cache.get(("feed", (format_, slug), etag), load)
+    return _precompressed_response(document, FEED_MIMETYPES[format_])
 
 
 @validate_response(Blog)
@@ -408,26 +1142,29 @@ async def citations():
             "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
         )
 
-        # Get count
-        count_query = f"""
-            SELECT COUNT(*) as count
-            FROM citations c
-            {where_clause}
-        """
-        count_result = await Database.fetch_one(count_query, params)
-        total_count = count_result["count"] if count_result else 0
-
-        # Get data with DOI info
-        data_query = f"""
-            SELECT c.citation, c.unstructured, c.validated, c.updated_at, c.published_at,
-                   c.doi, c.cid, c.blog_slug, c.type
-            FROM citations c
-            {where_clause}
-            ORDER BY c.published_at DESC
-            LIMIT :limit OFFSET :offset
+        # Get count and data as jsonb document built by Postgres
+        query = f"""
+            SELECT jsonb_build_object(
+                'total-results', (
+                    SELECT COUNT(*)
+                    FROM citations c
+                    {where_clause}
+                ),
+                'items', COALESCE(
+                    jsonb_agg(to_jsonb(i.*) ORDER BY i.published_at DESC), '[]'
+                )
+            )::text
+            FROM (
+                SELECT c.citation, c.unstructured, c.validated, c.updated_at,
+                       c.published_at, c.doi, c.cid, c.blog_slug, c.type
+                FROM citations c
+                {where_clause}
+                ORDER BY c.published_at DESC
+                LIMIT :limit OFFSET :offset
+            ) i
         """
-        items = await Database.fetch_all(data_query, params)
-        return jsonify({"total-results": total_count, "items": items})
+        document = await Database.fetch_val(query, params)
+        return _json_document_response(document)
     except Exception as e:
         logger.warning(e.args[0] if hasattr(e, "args") else str(e))
         return {"error": "An error occured."}, 400
@@ -439,14 +1176,36 @@ async def citation(slug: str, suffix: str):
     """Get citation by doi."""
     if slug and suffix:
         doi = f"https://doi.org/{slug}/{suffix}"
-        query = """
-            SELECT citation, unstructured, validated, updated_at, published_at
+        validators_query = """
+            SELECT COUNT(*) as count, MAX(updated_at) as updated_at
             FROM citations
             WHERE doi = :doi
-            ORDER BY published_at ASC, updated_at DESC
         """
-        items = await Database.fetch_all(query, {"doi": doi})
-        return jsonify(items)
+        validators = await Database.fetch_one(validators_query, {"doi": doi})
+        not_modified = _conditional_response(
+            _etag(version, doi, validators["count"], validators["updated_at"]),
+            _last_modified(validators["updated_at"]),
+            CACHE_MAX_AGE["citations"],
+        )
+        if not_modified:
+            return not_modified
+
+        query = """
+            SELECT COALESCE(
+                jsonb_agg(
+                    to_jsonb(c.*) ORDER BY c.published_at ASC, c.updated_at DESC
+                ),
+                '[]'
+            )::text
+            FROM (
+                SELECT citation, unstructured, validated, updated_at, published_at
+                FROM citations
+                WHERE doi = :doi
+                ORDER BY published_at ASC, updated_at DESC
+            ) c
+        """
+        document = await Database.fetch_val(query, {"doi": doi})
+        return _json_document_response(document)
     else:
         return {"error": "An error occured."}, 400
 
@@ -454,7 +1213,8 @@ async def citation(slug: str, suffix: str):
 @validate_response(Citation)
 @app.route("/citations", methods=["POST"])
 async def post_citations():
-    """Upsert all citations."""
+    """Upsert all citations since the last sync. Option full to sync all
+    citations."""
     prefixes = [
         "10.13003",
         "10.53731",
@@ -473,7 +1233,7 @@ async def post_citations():
         return {"error": "Unauthorized."}, 401
 
     try:
-        result = await extract_all_citations()
+        result = await extract_all_citations(full=_bool_arg("full"))
         return jsonify(result)
     except Exception as e:
         logger.warning(e.args[0])
@@ -484,7 +1244,8 @@ async def post_citations():
 @app.route("/citations/<slug>", methods=["POST"])
 @app.route("/citations/<slug>/<suffix>", methods=["POST"])
 async def post_citations_by_prefix(slug: str, suffix: str | None = None):
-    """Upsert citations by prefix."""
+    """Upsert citations by prefix since the last sync. Option full to sync all
+    citations."""
     prefixes = [
         "10.13003",
         "10.53731",
@@ -509,7 +1270,7 @@ async def post_citations_by_prefix(slug: str, suffix: str | None = None):
     try:
         if suffix:
             slug = f"{slug}/{suffix}"
-        result = await extract_all_citations_by_prefix(slug)
+        result = await extract_all_citations_by_prefix(slug, full=_bool_arg("full"))
         return jsonify(result)
     except Exception as e:
         logger.warning(e.args[0])
@@ -537,10 +1298,45 @@ async def posts():
         if include_fields
         else None
     )
-    per_page = int(request.args.get("per_page") or "10")
-    per_page = min(per_page, 50)
-    page = int(request.args.get("page") or "1")
+    try:
+        per_page = min(_int_arg("per_page", 10, minimum=1), 50)
+        page = _int_arg("page", 1)
+        max_facet_values = min(_int_arg("max_facet_values", 10, minimum=1), 100)
+    except ValueError as e:
+        return {"error": e.args[0]}, 400
     blog_slug = request.args.get("blog_slug")
+    tags = request.args.get("tags")
+    tags_list = (
+        sorted({normalize_tag(t.strip()) for t in tags.split(",") if t.strip()})
+        if tags
+        else []
+    )
+    tags_match = request.args.get("tags_match") or "any"
+    published_since = request.args.get("published_since")
+    published_until = request.args.get("published_until")
+    sort = request.args.get("sort")
+    order = (request.args.get("order") or "desc").lower()
+    if sort is not None and sort not in POSTS_SORT_COLUMNS:
+        return {"error": f"Invalid sort: {sort}."}, 400
+    if order not in POSTS_SORT_ORDERS:
+        return {"error": f"Invalid order: {order}."}, 400
+    if tags_match not in ["any", "all"]:
+        return {"error": f"Invalid tags_match: {tags_match}."}, 400
+    if published_since and not _is_date(published_since):
+        return {"error": f"Invalid published_since: {published_since}."}, 400
+    if published_until and not _is_date(published_until):
+        return {"error": f"Invalid published_until: {published_until}."}, 400
+    facet_by = request.args.get("facet_by")
+    facet_by_list = (
+        py_.uniq([f.strip() for f in facet_by.split(",") if f.strip()])
+        if facet_by
+        else []
+    )
+    for field in facet_by_list:
+        if field not in POSTS_FACET_COLUMNS:
+            return {"error": f"Invalid facet_by: {field}."}, 400
+    include_blogs = _include_blogs()
+    blog_column = "NULL as blog" if include_blogs else BLOG_COLUMN
     status = ["active", "archived", "expired"]
     if preview:
         status = ["pending", "active", "archived", "expired"]
@@ -549,13 +1345,34 @@ async def posts():
 
     try:
         # Build WHERE conditions
-        where_conditions = ["p.status = ANY(:statuses)", "p.title ILIKE :title_pattern"]
+        where_conditions = [
+            "p.status = ANY(:statuses)" if preview else POSTS_PUBLIC_CONDITION
+        ]
         params = {
             "statuses": status,
-            "title_pattern": f"%{query}%",
             "limit": per_page,
             "offset": offset,
         }
+        order_by = "p.published_at DESC, p.id DESC"
+
+        if query:
+            # full-text search with trigram fallback for fuzzy title matches,
+            # ranked by relevance
+            where_conditions.append(
+                f"""(
+                    (
+                        p.search_vector @@ {POSTS_SEARCH_INDEX_TSQUERY}
+                        AND p.search_vector @@ {POSTS_SEARCH_TSQUERY}
+                    )
+                    OR :query <%% p.title
+                )"""
+            )
+            params["query"] = query
+            order_by = f"""
+                ts_rank_cd(p.search_vector, {POSTS_SEARCH_TSQUERY})
+                + word_similarity(:query, p.title) DESC,
+                p.published_at DESC, p.id DESC
+            """
 
         if blog_slug:
             where_conditions.append("p.blog_slug = :blog_slug")
@@ -565,33 +1382,127 @@ async def posts():
             where_conditions.append("p.language = :language")
             params["language"] = language
 
+        if tags_list:
+            # overlap (any-of) and containment (all-of) both use the GIN index
+            operator = "@>" if tags_match == "all" else "&&"
+            where_conditions.append(f"p.tags {operator} CAST(:tags AS text[])")
+            params["tags"] = tags_list
+
+        if published_since:
+            where_conditions.append("p.published_at >= :published_since")
+            params["published_since"] = unix_timestamp(published_since)
+
+        if published_until:
+            where_conditions.append("p.published_at <= :published_until")
+            params["published_until"] = unix_timestamp(end_of_date(published_until))
+
+        if sort:
+            # id as tiebreaker, so that pages don't repeat or skip posts
+            direction = POSTS_SORT_ORDERS[order]
+            order_by = f"{POSTS_SORT_COLUMNS[sort]} {direction}, p.id {direction}"
+
         where_clause = "WHERE " + " AND ".join(where_conditions)
 
-        # Get count
-        count_query = f"""
-            SELECT COUNT(*) as count
-            FROM posts p
-            {where_clause}
-        """
-        count_result = await Database.fetch_one(count_query, params)
-        total_count = count_result["count"] if count_result else 0
+        filters = (
+            blog_slug,
+            language,
+            tuple(tags_list),
+            tags_match,
+            published_since,
+            published_until,
+        )
 
-        # Get data with blog info
-        data_query = f"""
-            SELECT p.id, p.guid, p.doi, p.parent_doi, p.url, p.archive_url,
-                   p.title, p.summary, p.abstract, p.published_at, p.updated_at,
-                   p.registered_at, p.indexed_at, p.indexed, p.authors, p.image,
-                   p.images,p.tags, p.language, p.reference, p.relationships,
-                   p.funding_references, p.blog_name, p.blog_slug, p.content_html,
-                   p.rid, p.version, p.status,
-                   row_to_json(b.*) as blog
-            FROM posts p
-            INNER JOIN blogs b ON p.blog_slug = b.slug
-            {where_clause}
-            ORDER BY p.published_at DESC
-            LIMIT :limit OFFSET :offset
-        """
-        items = await Database.fetch_all(data_query, params)
+        async def count_posts():
+            count_query = f"""
+                SELECT COUNT(*) as count
+                FROM posts p
+                {where_clause}
+            """
+            count_result = await Database.fetch_one(count_query, params)
+            return count_result["count"] if count_result else 0
+
+        async def load_posts():
+            # Get the ids of the posts on the page in sort order, and fetch
+            # the columns only for them
+            data_query = f"""
+                SELECT p.id, p.guid, p.doi, p.parent_doi, p.url, p.archive_url,
+                       p.title, p.summary, p.abstract, p.published_at, p.updated_at,
+                       p.registered_at, p.indexed_at, p.indexed, p.authors, p.image,
+                       p.images,p.tags, p.language, p.reference, p.relationships,
+                       p.funding_references, p.blog_name, p.blog_slug, p.content_html,
+                       p.rid, p.version, p.status, p.citation_count,
+                       p.last_citation_at,
+                       {blog_column}
+                FROM unnest(ARRAY(
+                    SELECT p.id
+                    FROM posts p
+                    {where_clause}
+                    ORDER BY {order_by}
+                    LIMIT :limit OFFSET :offset
+                )) WITH ORDINALITY AS page(id, position)
+                INNER JOIN posts p ON p.id = page.id
+                INNER JOIN blogs b ON p.blog_slug = b.slug
+                ORDER BY page.position
+            """
+            items = await Database.fetch_all(data_query, params)
+            if 0 < len(items) < per_page or (not items and offset == 0):
+                # last page, the total follows from the page
+                total_count = offset + len(items)
+            elif query or preview:
+                total_count = await count_posts()
+            else:
+                # counted once for all pages and sort orders, blog_slug at
+                # index 3 as in the page keys (see _evict_posts)
+                total_count = await posts_cache.get(
+                    ("posts", "count", None, *filters), count_posts
+                )
+            return total_count, items
+
+        # serve the first pages without search query from the response cache
+        if query or preview or start_page > POSTS_CACHE_MAX_PAGE:
+            load_page = load_posts()
+        else:
+            cache_key = (
+                "posts",
+                start_page,
+                per_page,
+                *filters,
+                sort,
+                order,
+                include_blogs,
+            )
+            load_page = posts_cache.get(cache_key, load_posts)
+
+        facet_counts = None
+        if facet_by_list:
+
+            async def load_facets():
+                return await _posts_facet_counts(
+                    facet_by_list, where_clause, params, max_facet_values
+                )
+
+            # facet counts without search query are refreshed periodically
+            if query or preview:
+                load_facet_counts = load_facets()
+            else:
+                facets_key = (
+                    "facets",
+                    tuple(facet_by_list),
+                    max_facet_values,
+                    *filters,
+                )
+                load_facet_counts = facets_cache.get(facets_key, load_facets)
+            (total_count, items), facet_counts = await asyncio.gather(
+                load_page, load_facet_counts
+            )
+        else:
+            total_count, items = await load_page
+        included = await _included_blogs(items) if include_blogs else None
+
+        if _wants_ndjson():
+            if include_fields_list:
+                items = [py_.pick(item, include_fields_list) for item in items]
+            return _ndjson_response(items, total_count)
         return jsonify(
             _typesense_like_search_response(
                 items=items,
@@ -599,6 +1510,8 @@ async def posts():
                 page=start_page,
                 per_page=per_page,
                 include_fields=include_fields_list,
+                facet_counts=facet_counts,
+                included=included,
             )
         )
     except Exception as e:
@@ -606,6 +1519,309 @@ async def posts():
         return {"error": "An error occured."}, 400
 
 
+def _batch_keys(ids: list[str]) -> tuple[dict, list[str], list[str]]:
+    """Map each input to the post id or normalized DOI it refers to (None if
+    invalid), and return the post ids and DOIs to look up."""
+    keys = {}
+    for value in ids:
+        if validate_uuid(value):
+            keys[value] = value.lower()
+        else:
+            keys[value] = normalize_doi(value)
+    post_ids = sorted({key for key in keys.values() if key and "doi.org" not in key})
+    dois = sorted({key for key in keys.values() if key and "doi.org" in key})
+    return keys, post_ids, dois
+
+
+@app.route("/posts/batch", methods=["POST"])
+async def posts_batch():
+    """Get many posts by id or DOI with one query. Expects a JSON object with
+    ids, a list of post ids and DOIs (as URL or not), and optionally
+    include_fields. Returns the posts keyed by the given ids, null if not found."""
+    body = await request.get_json(silent=True)
+    ids = body.get("ids") if isinstance(body, dict) else None
+    if not isinstance(ids, list) or not all(isinstance(i, str) for i in ids):
+        return {"error": "Expected a JSON object with a list of ids."}, 400
+    if len(ids) > POSTS_BATCH_MAX_IDS:
+        return {"error": f"At most {POSTS_BATCH_MAX_IDS} ids are allowed."}, 400
+    include_fields = body.get("include_fields") or request.args.get("include_fields")
+    if isinstance(include_fields, str):
+        include_fields = [f.strip() for f in include_fields.split(",") if f.strip()]
+
+    keys, post_ids, dois = _batch_keys(ids)
+    try:
+        posts = await PostsQueries.select_by_ids_or_dois(
+            post_ids,
+            dois,
+            with_citations=not include_fields or "citations" in include_fields,
+        )
+    except Exception as e:
+        logger.warning(e.args[0] if hasattr(e, "args") else str(e))
+        return {"error": "An error occured."}, 400
+    # posts by id and by DOI, as an input may refer to either
+    found = {}
+    for post in posts:
+        projected = py_.omit(post, POST_DOCUMENT_INTERNAL_FIELDS)
+        if include_fields:
+            projected = {k: v for k, v in projected.items() if k in include_fields}
+        found[post["id"]] = projected
+        if post.get("doi"):
+            found[post["doi"]] = projected
+    items = {value: found.get(key) if key else None for value, key in keys.items()}
+    return jsonify(
+        {
+            "total-results": sum(1 for item in items.values() if item is not None),
+            "items": items,
+        }
+    )
+
+
+@app.route("/posts/bibliography", methods=["POST"])
+async def posts_bibliography():
+    """Render a bibliography of many posts. Expects a JSON object with ids, a
+    list of post ids and DOIs (as URL or not), and optionally format (citation,
+    bibtex, ris or csl), style and locale, also accepted as query parameters.
+    Entries are in the order of ids, or as sorted by the style for citation.
+    Posts that are not found are skipped."""
+    body = await request.get_json(silent=True)
+    ids = body.get("ids") if isinstance(body, dict) else None
+    if not isinstance(ids, list) or not all(isinstance(i, str) for i in ids):
+        return {"error": "Expected a JSON object with a list of ids."}, 400
+    if len(ids) > POSTS_BATCH_MAX_IDS:
+        return {"error": f"At most {POSTS_BATCH_MAX_IDS} ids are allowed."}, 400
+    format_ = body.get("format") or request.args.get("format") or "citation"
+    style = body.get("style") or request.args.get("style") or "apa"
+    locale = body.get("locale") or request.args.get("locale") or "en-US"
+    if format_ not in BIBLIOGRAPHY_FORMATS:
+        return {"error": f"Format {format_} not supported."}, 400
+
+    keys, post_ids, dois = _batch_keys(ids)
+    try:
+        posts = await PostsQueries.select_by_ids_or_dois(post_ids, dois)
+    except Exception as e:
+        logger.warning(e.args[0] if hasattr(e, "args") else str(e))
+        return {"error": "An error occured."}, 400
+    found = {}
+    for post in posts:
+        found[post["id"]] = post
+        if post.get("doi"):
+            found[post["doi"]] = post
+    # each post once, in the order of the ids
+    selected = {}
+    for key in keys.values():
+        post = found.get(key) if key else None
+        if post is not None:
+            selected[post["id"]] = post
+    if not selected:
+        return {"error": "Posts not found"}, 404
+
+    await asyncio.gather(*[resolve_doi_ra(p.get("doi")) for p in selected.values()])
+    try:
+        response = await asyncio.to_thread(
+            _format_posts_bibliography,
+            list(selected.values()),
+            format_,
+            style,
+            locale,
+        )
+    except StyleNotFoundError:
+        return {"error": f"Style {style} not found."}, 400
+    except Exception as e:
+        logger.warning(e.args[0] if hasattr(e, "args") else str(e))
+        return {"error": "An error occured."}, 400
+    return (response["data"], 200, response["options"])
+
+
+@app.route("/posts/changes")
+async def post_changes():
+    """Get changes of public posts in the order they were made, starting at
+    since (a date or unix timestamp) or at cursor. Posts that were deleted or
+    are no longer public have operation delete, other changes have operation
+    upsert and include the current post. Only the latest change of a post is
+    returned. Use next_cursor as cursor to get the following changes, also to
+    poll for new changes. Options to change per_page and filter by blog_slug."""
+    try:
+        per_page = min(_int_arg("per_page", 100, minimum=1), 1000)
+    except ValueError as e:
+        return {"error": e.args[0]}, 400
+    blog_slug = request.args.get("blog_slug")
+    since = request.args.get("since")
+    cursor = request.args.get("cursor")
+    try:
+        position = _decode_cursor(cursor, 2) if cursor else None
+        if position and not (
+            isinstance(position[0], str)
+            and position[0].isdigit()
+            and isinstance(position[1], int)
+        ):
+            raise ValueError(f"Invalid cursor: {cursor}")
+    except ValueError:
+        return {"error": "Invalid cursor."}, 400
+
+    # only changes of transactions that finished before the oldest running
+    # transaction, so that no change can later appear before the cursor
+    where_conditions = ["c.xid < pg_snapshot_xmin(pg_current_snapshot())"]
+    params = {
+        "internal_fields": POST_DOCUMENT_INTERNAL_FIELDS,
+        "limit": per_page + 1,
+    }
+    if position:
+        where_conditions.append("(c.xid, c.seq) > (CAST(:xid AS xid8), :seq)")
+        params["xid"], params["seq"] = position
+    elif since:
+        try:
+            params["since"] = _since_timestamp(since)
+        except ValueError as e:
+            return {"error": e.args[0]}, 400
+        where_conditions.append("c.changed_at >= to_timestamp(:since)")
+    if blog_slug:
+        where_conditions.append("c.blog_slug = :blog_slug")
+        params["blog_slug"] = blog_slug
+    query = f"""
+        SELECT c.xid::text as xid, c.seq, c.id, c.doi, c.blog_slug, c.operation,
+               c.changed_at,
+               CASE WHEN c.operation = 'upsert'
+                    THEN ({POST_DOCUMENT_SELECT})
+                         - CAST(:internal_fields AS text[])
+               END as post
+        FROM post_changes c
+        LEFT JOIN post_documents d ON d.id = c.id
+        LEFT JOIN blogs b ON b.slug = d.blog_slug
+        WHERE {" AND ".join(where_conditions)}
+        AND NOT EXISTS (
+            SELECT 1
+            FROM post_changes later
+            WHERE later.id = c.id AND (later.xid, later.seq) > (c.xid, c.seq)
+        )
+        ORDER BY c.xid, c.seq
+        LIMIT :limit
+    """
+    try:
+        changes = await Database.fetch_all(query, params)
+    except Exception as e:
+        logger.warning(e.args[0] if hasattr(e, "args") else str(e))
+        return {"error": "An error occured."}, 400
+    has_more = len(changes) > per_page
+    changes = changes[:per_page]
+    next_cursor = cursor
+    if changes:
+        next_cursor = _encode_cursor(changes[-1]["xid"], changes[-1]["seq"])
+    items = [py_.omit(change, "xid", "seq") for change in changes]
+    if _wants_ndjson():
+        response = _ndjson_response(items)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response
+    return jsonify({"items": items, "next_cursor": next_cursor, "has_more": has_more})
+
+
+@app.route("/posts/export")
+async def export_posts():
+    """Export all posts matching the filters as newline-delimited JSON, gzip
+    compressed if the client accepts it, ordered by updated_at and id.
+
+    To resume an interrupted export, pass the updated_at and id of the last
+    exported post as since and after."""
+    if not _is_authorized():
+        return {"error": "Unauthorized."}, 401
+
+    blog_slug = request.args.get("blog_slug")
+    language = request.args.get("language")
+    status = request.args.get("status")
+    status_list = (
+        py_.uniq([s.strip() for s in status.split(",") if s.strip()])
+        if status
+        else ["active", "archived", "expired"]
+    )
+    for value in status_list:
+        if value not in POSTS_EXPORT_STATUSES:
+            return {"error": f"Invalid status: {value}."}, 400
+    since = request.args.get("since")
+    after = request.args.get("after")
+    if after and not validate_uuid(after):
+        return {"error": f"Invalid after: {after}."}, 400
+
+    where_conditions = ["p.status = ANY(:statuses)"]
+    params = {"statuses": status_list}
+    if blog_slug:
+        where_conditions.append("p.blog_slug = :blog_slug")
+        params["blog_slug"] = blog_slug
+    if language:
+        where_conditions.append("p.language = :language")
+        params["language"] = language
+    if since or after:
+        # since is the updated_at of the last exported post, or a date
+        try:
+            params["since"] = _since_timestamp(since) if since else 0
+        except ValueError as e:
+            return {"error": e.args[0]}, 400
+        if after:
+            where_conditions.append("(p.updated_at, p.id) > (:since, :after)")
+            params["after"] = after
+        else:
+            where_conditions.append("p.updated_at >= :since")
+    query = f"""
+        SELECT p.id, p.guid, p.doi, p.parent_doi, p.url, p.archive_url,
+               p.title, p.summary, p.abstract, p.published_at, p.updated_at,
+               p.registered_at, p.indexed_at, p.indexed, p.authors, p.image,
+               p.images, p.tags, p.language, p.reference, p.relationships,
+               p.funding_references, p.blog_name, p.blog_slug, p.content_html,
+               p.rid, p.version, p.status, p.citation_count, p.last_citation_at
+        FROM posts p
+        WHERE {" AND ".join(where_conditions)}
+        ORDER BY p.updated_at, p.id
+    """
+    gzip = request.accept_encodings.quality("gzip") > 0
+    sort_keys = app.json.sort_keys
+
+    async def lines():
+        # rows are read from a server-side cursor and written in batches, so
+        # memory use is independent of the size of the export
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+        batch = []
+        try:
+            async for row in Database.stream(query, params):
+                batch.append(json_dumps(row, sort_keys=sort_keys) + b"\n")
+                if len(batch) < POSTS_EXPORT_BATCH_SIZE:
+                    continue
+                chunk = b"".join(batch)
+                batch = []
+                if compressor is not None:
+                    chunk = compressor.compress(chunk)
+                if chunk:
+                    yield chunk
+        except Exception as e:
+            # the status has already been sent, so the transfer is aborted
+            # without the end of the gzip stream, after writing the complete
+            # lines read so far. The client sees a broken transfer and can
+            # resume from the last complete line
+            logger.warning(f"Export of posts failed: {e}")
+            chunk = b"".join(batch)
+            if compressor is not None:
+                chunk = compressor.compress(chunk) + compressor.flush(
+                    zlib.Z_SYNC_FLUSH
+                )
+            if chunk:
+                yield chunk
+            raise
+        chunk = b"".join(batch)
+        if compressor is not None:
+            chunk = compressor.compress(chunk) + compressor.flush()
+        if chunk:
+            yield chunk
+
+    headers = {
+        "Content-Disposition": "attachment; filename=posts.ndjson",
+        "Vary": "Accept-Encoding",
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    response = Response(lines(), mimetype=NDJSON_MIMETYPE, headers=headers)
+    # a full export takes longer than the default response timeout
+    response.timeout = None
+    return response
+
+
 @app.route("/posts", methods=["POST"])
 async def post_posts():
     """Update posts."""
@@ -715,6 +1931,8 @@ async def post(slug: str, suffix: str | None = None, relation: str | None = None
     style = request.args.get("style") or "apa"
     page = int(request.args.get("page") or "1")
     per_page = int(request.args.get("per_page") or "50")
+    include_blogs = _include_blogs()
+    blog_column = "NULL as blog" if include_blogs else BLOG_COLUMN
     if slug == "unregistered":
         query = """
             SELECT COUNT(*) as count
@@ -728,13 +1946,14 @@ async def post(slug: str, suffix: str | None = None, relation: str | None = None
         count_result = await Database.fetch_one(query, {"statuses": status})
         total_count = count_result["count"] if count_result else 0
 
-        data_query = """
+        data_query = f"""
             SELECT p.id, p.guid, p.doi, p.url, p.archive_url, p.title, p.summary,
                    p.abstract, p.content_html, p.published_at, p.updated_at,
                    p.registered_at, p.indexed_at, p.authors, p.image, p.images, p.tags,
                    p.language, p.reference, p.relationships, p.funding_references,
-                   p.blog_name, p.blog_slug, p.rid,
-                   row_to_json(b.*) as blog
+                   p.blog_name, p.blog_slug, p.rid, p.citation_count,
+                   p.last_citation_at,
+                   {blog_column}
             FROM posts p
             INNER JOIN blogs b ON p.blog_slug = b.slug
             WHERE b.prefix IS NOT NULL
@@ -747,6 +1966,13 @@ async def post(slug: str, suffix: str | None = None, relation: str | None = None
         items = await Database.fetch_all(
             data_query, {"statuses": status, "limit": min(per_page, 50)}
         )
+        if _wants_ndjson():
+            return _ndjson_response(items, total_count)
+        if include_blogs:
+            included = await _included_blogs(items)
+            return jsonify(
+                {"total-results": total_count, "items": items, "included": included}
+            )
         return jsonify(items)
     elif slug == "updated":
         query = """
@@ -761,13 +1987,14 @@ async def post(slug: str, suffix: str | None = None, relation: str | None = None
         count_result = await Database.fetch_one(query, {"statuses": status})
         total_count = count_result["count"] if count_result else 0
 
-        data_query = """
+        data_query = f"""
             SELECT p.id, p.guid, p.doi, p.url, p.archive_url, p.title, p.summary,
                    p.abstract, p.content_html, p.published_at, p.updated_at,
                    p.registered_at, p.indexed_at, p.authors, p.image, p.images, p.tags,
                    p.language, p.reference, p.relationships, p.funding_references,
-                   p.blog_name, p.blog_slug, p.rid,
-                   row_to_json(b.*) as blog
+                   p.blog_name, p.blog_slug, p.rid, p.citation_count,
+                   p.last_citation_at,
+                   {blog_column}
             FROM posts p
             INNER JOIN blogs b ON p.blog_slug = b.slug
             WHERE b.prefix IS NOT NULL
@@ -780,6 +2007,13 @@ async def post(slug: str, suffix: str | None = None, relation: str | None = None
         items = await Database.fetch_all(
             data_query, {"statuses": status, "limit": min(per_page, 50)}
         )
+        if _wants_ndjson():
+            return _ndjson_response(items, total_count)
+        if include_blogs:
+            included = await _included_blogs(items)
+            return jsonify(
+                {"total-results": total_count, "items": items, "included": included}
+            )
         return jsonify(items)
     elif slug == "waiting":
         query = """
@@ -793,13 +2027,14 @@ async def post(slug: str, suffix: str | None = None, relation: str | None = None
         count_result = await Database.fetch_one(query, {"statuses": status})
         total_count = count_result["count"] if count_result else 0
 
-        data_query = """
+        data_query = f"""
             SELECT p.id, p.guid, p.doi, p.url, p.archive_url, p.title, p.summary,
                    p.abstract, p.content_html, p.published_at, p.updated_at,
                    p.registered_at, p.indexed_at, p.authors, p.image, p.images, p.tags,
                    p.language, p.reference, p.relationships, p.funding_references,
-                   p.blog_name, p.blog_slug, p.rid,
-                   row_to_json(b.*) as blog
+                   p.blog_name, p.blog_slug, p.rid, p.citation_count,
+                   p.last_citation_at,
+                   {blog_column}
             FROM posts p
             INNER JOIN blogs b ON p.blog_slug = b.slug
             WHERE b.prefix IS NOT NULL
@@ -811,14 +2046,24 @@ async def post(slug: str, suffix: str | None = None, relation: str | None = None
         items = await Database.fetch_all(
             data_query, {"statuses": status, "limit": min(per_page, 50)}
         )
+        if _wants_ndjson():
+            return _ndjson_response(items, total_count)
+        if include_blogs:
+            included = await _included_blogs(items)
+            return jsonify(
+                {"total-results": total_count, "items": items, "included": included}
+            )
         return jsonify({"total-results": total_count, "items": items})
     elif slug == "cited":
-        # Get total count first
+        # Get total count first, citation_count is maintained by triggers
+        # on citations, and backed by a partial index
         count_query = """
-            SELECT COUNT(DISTINCT p.id) as count
+            SELECT COUNT(*) as count
             FROM posts p
-            INNER JOIN citations c ON p.doi = c.doi
-            WHERE p.doi IS NOT NULL
+            INNER JOIN blogs b ON p.blog_slug = b.slug
+            WHERE b.prefix IS NOT NULL
+            AND p.doi IS NOT NULL
+            AND p.citation_count > 0
         """
         count_result = await Database.fetch_one(count_query)
         total = count_result["count"] if count_result else 0
@@ -826,14 +2071,14 @@ async def post(slug: str, suffix: str | None = None, relation: str | None = None
         page = min(page, total_pages)
         start_page = (page - 1) * 50 if page > 0 else 0
 
-        data_query = """
+        data_query = f"""
             SELECT p.id, p.guid, p.doi, p.parent_doi, p.url, p.archive_url,
                    p.title, p.summary, p.abstract, p.published_at, p.updated_at,
                    p.registered_at, p.indexed_at, p.indexed, p.authors, p.image, p.images,
                    p.tags, p.language, p.reference, p.relationships,
                    p.funding_references, p.blog_name, p.blog_slug, p.content_html,
-                   p.rid, p.version,
-                   row_to_json(b.*) as blog,
+                   p.rid, p.version, p.citation_count, p.last_citation_at,
+                   {blog_column},
                    (
                        SELECT json_agg(row_to_json(c.*))
                        FROM citations c
@@ -843,14 +2088,32 @@ async def post(slug: str, suffix: str | None = None, relation: str | None = None
             INNER JOIN blogs b ON p.blog_slug = b.slug
             WHERE b.prefix IS NOT NULL
             AND p.doi IS NOT NULL
+            AND p.citation_count > 0
             ORDER BY p.updated_at DESC
             LIMIT :limit OFFSET :offset
         """
         items = await Database.fetch_all(
             data_query, {"limit": min(per_page, 100), "offset": start_page}
         )
+        if _wants_ndjson():
+            return _ndjson_response(items, total)
+        if include_blogs:
+            included = await _included_blogs(items)
+            return jsonify(
+                {"total-results": total, "items": items, "included": included}
+            )
         return jsonify({"total-results": total, "items": items})
     elif slug in prefixes and suffix and relation:
+        validators = await _post_cache_validators(
+            doi=f"https://doi.org/{slug}/{suffix.lower()}"
+        )
+        if validators is not None:
+            etag, last_modified = validators
+            not_modified = _conditional_response(
+                _etag(etag, relation), last_modified, CACHE_MAX_AGE["post"]
+            )
+            if not_modified:
+                return not_modified
         if validate_uuid(slug):
             query = """
                 SELECT reference
@@ -913,87 +2176,69 @@ async def post(slug: str, suffix: str | None = None, relation: str | None = None
             format_ = "bibtex"
         elif format_ == "jsonld":
             format_ = "schema_org"
+    # without format or file extension, use the format preferred in Accept
+    if format_ == "json" and not request.args.get("format"):
+        _vary("Accept")
+        format_, options = negotiate_format(request.accept_mimetypes)
+        style = request.args.get("style") or options.get("style") or style
+        locale = request.args.get("locale") or options.get("locale") or locale
     try:
+        validators = await _post_cache_validators(
+            id=slug if validate_uuid(slug) else None,
+            doi=f"https://doi.org/{slug}/{suffix}",
+        )
+        if validators is None:
+            return {"error": "Post not found"}, 404
+        etag, last_modified = validators
+        not_modified = _conditional_response(
+            _etag(etag, format_, style, locale),
+            last_modified,
+            CACHE_MAX_AGE["post"]
+            if format_ == "json"
+            else CACHE_MAX_AGE["post_export"],
+        )
+        if not_modified:
+            return not_modified
+
+        if format_ == "json":
+            document = await _post_document(
+                id=slug if validate_uuid(slug) else None,
+                doi=f"https://doi.org/{slug}/{suffix}",
+            )
+            if not document:
+                return {"error": "Post not found"}, 404
+            return _json_document_response(document)
+
+        if format_ in POST_METADATA_FORMATS:
+            response = await formats_cache.get(
+                (etag, format_, style, locale),
+                lambda: _render_post_metadata(
+                    id=slug if validate_uuid(slug) else None,
+                    doi=f"https://doi.org/{slug}/{suffix}",
+                    format_=format_,
+                    style=style,
+                    locale=locale,
+                ),
+                ttl=_formats_cache_ttl,
+            )
+            if not response:
+                logger.warning("Metadata not found")
+                return {"error": "Metadata not found."}, 404
+            return (response["data"], 200, response["options"])
+
         if validate_uuid(slug):
-            # Try with citations first
-            query = """
-                SELECT p.id, p.guid, p.doi, p.parent_doi, p.url, p.archive_url,
-                       p.title, p.summary, p.abstract, p.published_at, p.updated_at,
-                       p.registered_at, p.indexed_at, p.indexed, p.authors, p.image,
-                       p.images, p.tags, p.language, p.reference, p.relationships,
-                       p.funding_references, p.blog_name, p.blog_slug, p.content_html,
-                       p.rid, p.version,
-                       row_to_json(b.*) as blog,
-                       (
-                           SELECT json_agg(row_to_json(c.*))
-                           FROM citations c
-                           WHERE c.doi = p.doi AND c.cid IS NOT NULL
-                       ) as citations
-                FROM posts p
-                INNER JOIN blogs b ON p.blog_slug = b.slug
-                WHERE p.id = :id
-            """
-            result = await Database.fetch_one(query, {"id": slug})
-            if not result:
-                # Fallback without citations
-                query = """
-                    SELECT p.id, p.guid, p.doi, p.parent_doi, p.url, p.archive_url,
-                           p.title, p.summary, p.abstract, p.published_at, p.updated_at,
-                           p.registered_at, p.indexed_at, p.indexed, p.authors, p.image,
-                           p.images, p.tags, p.language, p.reference, p.relationships,
-                           p.funding_references, p.blog_name, p.blog_slug, p.content_html,
-                           p.rid, p.version,
-                           row_to_json(b.*) as blog
-                    FROM posts p
-                    INNER JOIN blogs b ON p.blog_slug = b.slug
-                    WHERE p.id = :id
-                """
-                result = await Database.fetch_one(query, {"id": slug})
+            result = await PostsQueries.select_by_id(slug, with_citations=True)
             basename = slug
         else:
             doi = f"https://doi.org/{slug}/{suffix}"
-            # Try with citations first
-            query = """
-                SELECT p.id, p.guid, p.doi, p.parent_doi, p.url, p.archive_url,
-                       p.title, p.summary, p.abstract, p.published_at, p.updated_at,
-                       p.registered_at, p.indexed_at, p.indexed, p.authors, p.image,
-                       p.images, p.tags, p.language, p.reference, p.relationships,
-                       p.funding_references, p.blog_name, p.blog_slug, p.content_html,
-                       p.rid, p.version,
-                       row_to_json(b.*) as blog,
-                       (
-                           SELECT json_agg(row_to_json(c.*))
-                           FROM citations c
-                           WHERE c.doi = p.doi AND c.cid IS NOT NULL
-                       ) as citations
-                FROM posts p
-                INNER JOIN blogs b ON p.blog_slug = b.slug
-                WHERE p.doi = :doi
-            """
-            result = await Database.fetch_one(query, {"doi": doi})
-            if not result:
-                # Fallback without citations
-                query = """
-                    SELECT p.id, p.guid, p.doi, p.parent_doi, p.url, p.archive_url,
-                           p.title, p.summary, p.abstract, p.published_at, p.updated_at,
-                           p.registered_at, p.indexed_at, p.indexed, p.authors, p.image,
-                           p.images, p.tags, p.language, p.reference, p.relationships,
-                           p.funding_references, p.blog_name, p.blog_slug, p.content_html,
-                           p.rid, p.version,
-                           row_to_json(b.*) as blog
-                    FROM posts p
-                    INNER JOIN blogs b ON p.blog_slug = b.slug
-                    WHERE p.doi = :doi
-                """
-                result = await Database.fetch_one(query, {"doi": doi})
+            result = await PostsQueries.select_by_doi(doi, with_citations=True)
             basename = doi_from_url(doi).replace("/", "-")
-
         if not result:
             return {"error": "Post not found"}, 404
+        result = py_.omit(result, POST_DOCUMENT_INTERNAL_FIELDS)
         content = result.get("content_html", None) if result else None
-        if format_ == "json":
-            return jsonify(result)
         metadata = py_.omit(result, ["content_html"]) if result else None
+        await resolve_doi_ra(metadata.get("doi", None))
         meta = convert_to_commonmeta(metadata)
         if isinstance(meta, dict):
             meta["type"] = "article"
@@ -1122,25 +2367,74 @@ async def post(slug: str, suffix: str | None = None, relation: str | None = None
                     "Content-Disposition": f"attachment; filename={basename}.md",
                 },
             )
-    elif format_ in [
-        "bibtex",
-        "ris",
-        "csl",
-        "schema_org",
-        "datacite",
-        "crossref_xml",
-        "commonmeta",
-        "citation",
-    ]:
-        response = get_formatted_metadata(meta, format_, style, locale)
-        if not response:
-            logger.warning("Metadata not found")
-            return {"error": "Metadata not found."}, 404
-        return (response["data"], 200, response["options"])
     else:
         return {"error": "Post not found"}, 404
 
 
+@app.route("/snapshots", methods=["POST"])
+async def post_snapshots():
+    """Start writing a Parquet snapshot of posts, blogs and citations in the
+    background, see /snapshots/latest for the result. Option to include
+    content_html."""
+    if not _is_authorized():
+        return {"error": "Unauthorized."}, 401
+    try:
+        include_content_html = _bool_arg("content_html")
+    except ValueError as e:
+        logger.warning(e.args[0])
+        return {"error": "An error occured."}, 400
+    if _snapshot_lock.locked():
+        return {"error": "Snapshot already running."}, 409
+    await _snapshot_lock.acquire()
+    app.add_background_task(_write_snapshot, include_content_html)
+    return {"message": "Snapshot started."}, 202
+
+
+async def _write_snapshot(include_content_html: bool) -> None:
+    """Write a snapshot outside of the request, holding the snapshot lock
+    until it is written."""
+    try:
+        await write_snapshot(include_content_html=include_content_html)
+    except Exception as e:
+        logger.warning(f"Failed to write snapshot: {e}")
+    finally:
+        _snapshot_lock.release()
+
+
+@app.route("/snapshots/latest")
+async def latest_snapshot_manifest():
+    """Get the manifest of the latest snapshot, listing its files."""
+    if not _is_authorized():
+        return {"error": "Unauthorized."}, 401
+    manifest = latest_snapshot()
+    if not manifest:
+        return {"error": "Snapshot not found"}, 404
+    return jsonify(manifest)
+
+
+@app.route("/snapshots/latest/<path:filename>")
+async def latest_snapshot_file(filename: str):
+    """Download a file of the latest snapshot, with support for range
+    requests, e.g. to read Parquet files remotely."""
+    if not _is_authorized():
+        return {"error": "Unauthorized."}, 401
+    manifest = latest_snapshot()
+    file_path = snapshot_file_path(manifest, filename) if manifest else None
+    if not file_path:
+        return {"error": "File not found"}, 404
+    response = await send_file(
+        file_path,
+        mimetype="application/vnd.apache.parquet"
+        if filename.endswith(".parquet")
+        else "application/json",
+        conditional=True,
+    )
+    response.headers["Content-Disposition"] = (
+        f"attachment; filename={manifest['name']}-{filename.replace('/', '-')}"
+    )
+    return response
+
+
 @app.route("/records", methods=["DELETE"])
 async def delete_all_records():
     """Delete all_InvenioRDM draft records."""
@@ -1,6 +1,5 @@
 """Blogs module."""
 
-import socket
 import asyncio
 import time
 from os import environ
@@ -22,6 +21,8 @@ from commonmeta import (
 from commonmeta.writers.crossref_xml_writer import push_crossref_xml
 
 from api.db_client import Database, BlogsQueries
+from api.cache import publish_invalidation, subscribe
+from api.posts import HTTP_HEADERS
 from api.utils import (
     start_case,
     get_date,
@@ -32,12 +33,47 @@ from api.utils import (
     OPENALEX_SUBFIELD_MAPPINGS,
 )
 
+# blogs extracted at the same time by extract_all_blogs, and InvenioRDM
+# community upserts at the same time, as InvenioRDM is rate limited
+BLOG_CONCURRENCY = 5
+COMMUNITY_CONCURRENCY = 2
+FEED_TIMEOUT = 60
+
+_community_semaphore = asyncio.Semaphore(COMMUNITY_CONCURRENCY)
+_http_client: httpx.AsyncClient | None = None
+_http_client_loop: asyncio.AbstractEventLoop | None = None
+
+
+def http_client() -> httpx.AsyncClient:
+    """Async HTTP client shared by all blog extractions, created on first use
+    (and again when used from another event loop)."""
+    global _http_client, _http_client_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client.is_closed or _http_client_loop is not loop:
+        _http_client = httpx.AsyncClient(
+            headers=HTTP_HEADERS,
+            timeout=10,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=4 * BLOG_CONCURRENCY),
+        )
+        _http_client_loop = loop
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared async HTTP client."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 
 async def find_feed(url: str) -> str | None:
     """Find RSS feed in homepage. Based on https://gist.github.com/alexmill/9bc634240531d81c3abe
     Prefer JSON Feed over Atom over RSS"""
     url = normalize_url(url) or url
-    raw = httpx.get(url, follow_redirects=True).text
+    response = await http_client().get(url)
+    raw = response.text
     html = bs4(raw, features="lxml")
     feeds = html.findAll("link", rel="alternate")
     if len(feeds) == 0:
@@ -82,7 +118,7 @@ async def extract_all_blogs():
     blogs_data = await BlogsQueries.select_all(
         statuses=["active", "expired", "archived"], order_by="slug"
     )
-    semaphore = asyncio.Semaphore(5)  # Max 5 concurrent blog extractions
+    semaphore = asyncio.Semaphore(BLOG_CONCURRENCY)
 
     async def extract_with_semaphore(slug: str):
         async with semaphore:
@@ -102,9 +138,10 @@ async def extract_single_blog(slug: str):
     print(f"Extracting {slug} from {feed_url}")
     if feed_url is None:
         feed_url = await find_feed(config["home_page_url"])
-    socket.setdefaulttimeout(60)
+    description = config["description"]
+    doi = config["doi"]
     try:
-        parsed = feedparser.parse(config.get("feed_url", None) or feed_url)
+        parsed = await fetch_feed(config.get("feed_url", None) or feed_url)
         feed = parsed.feed
         home_page_url = config["home_page_url"] or feed.get("link", None)
         updated_at = get_date(feed.get("updated", None))
@@ -118,7 +155,7 @@ async def extract_single_blog(slug: str):
             or "Other"
         )
         generator = re.split(" ", generator_raw)[0]
-        description = feed.get("subtitle", None) or config["description"]
+        description = feed.get("subtitle", None) or description
         if description is not None:
             description = bs4(description, "html.parser").get_text()
         favicon = config["favicon"] or feed.get("icon", None)
@@ -130,7 +167,6 @@ async def extract_single_blog(slug: str):
         if language:
             language = language.split("-")[0]
         prefix = config["prefix"]
-        doi = config["doi"]
         if prefix:
             doi = f"https://doi.org/{prefix}/{slug}"
     except Exception as error:
@@ -185,7 +221,8 @@ async def extract_single_blog(slug: str):
 
     # update InvenioRDM blog community if blog is active, expired or archived
     if config["status"] in ["active", "expired", "archived"]:
-        r = upsert_blog_community(blog)
+        async with _community_semaphore:
+            r = await upsert_blog_community(blog)
         if r:
             result = py_.pick(
                 r.json(),
@@ -198,7 +235,8 @@ async def extract_single_blog(slug: str):
             # fetch community id and store it in the blog
             community_id = blog.get("community_id", None)
             if blog.get("community_id", None) is None:
-                community_id = await push_blog_community_id(slug)
+                async with _community_semaphore:
+                    community_id = await push_blog_community_id(slug)
 
             result["community_id"] = community_id
         else:
@@ -207,6 +245,19 @@ async def extract_single_blog(slug: str):
     return blog
 
 
+async def fetch_feed(url: str) -> feedparser.FeedParserDict:
+    """Fetch a feed with the shared async client, and parse it in a worker
+    thread."""
+    response = await http_client().get(url, timeout=FEED_TIMEOUT)
+    response_headers = {
+        "content-type": response.headers.get("content-type", ""),
+        "content-location": str(response.url),
+    }
+    return await asyncio.to_thread(
+        feedparser.parse, response.content, response_headers=response_headers
+    )
+
+
 def parse_generator(generator):
     """Parse blog generator."""
     if not generator:
@@ -293,6 +344,7 @@ async def update_single_blog(blog):
             "secure": blog.get("secure", None),
         }
         await BlogsQueries.update_blog(blog.get("slug"), updates)
+        await publish_invalidation("blog", blog_slug=blog.get("slug"))
         return blog
     except Exception as error:
         print(error)
@@ -304,7 +356,7 @@ async def push_blog_community_id(slug):
     try:
         url = f"{environ.get('QUART_INVENIORDM_API', 'https://rogue-scholar.org')}/api/communities?q=slug:{slug}"
         headers = {"Authorization": f"Bearer {environ['QUART_INVENIORDM_TOKEN']}"}
-        response = httpx.get(url, headers=headers, timeout=10)
+        response = await http_client().get(url, headers=headers)
         result = response.json()
         if py_.get(result, "hits.total") != 1:
             return result
@@ -318,19 +370,21 @@ async def push_blog_community_id(slug):
         return None
 
 
-def upsert_blog_community(blog):
+async def upsert_blog_community(blog):
     """Upsert an InvenioRDM blog community."""
 
-    # upsert blog DOI with Crossref
+    # upsert blog DOI with Crossref, blocking, so in a worker thread
     login_id = environ.get("QUART_CROSSREF_USERNAME_WITH_ROLE", None)
     login_passwd = environ.get("QUART_CROSSREF_PASSWORD", None)
     if login_id is not None and login_passwd is not None:
-        upsert_blog_doi(blog, login_id=login_id, login_passwd=login_passwd)
+        await asyncio.to_thread(
+            upsert_blog_doi, blog, login_id=login_id, login_passwd=login_passwd
+        )
 
     if blog.get("community_id", None) is None:
-        response = create_blog_community(blog)
+        response = await create_blog_community(blog)
     else:
-        response = update_blog_community(blog)
+        response = await update_blog_community(blog)
     return response
 
 
@@ -358,7 +412,7 @@ def upsert_blog_doi(blog, login_id, login_passwd):
         return None
 
 
-def create_blog_community(blog):
+async def create_blog_community(blog):
     """Create an InvenioRDM blog community."""
     try:
         url = f"{environ.get('QUART_INVENIORDM_API', 'https://rogue-scholar.org')}/api/communities"
@@ -402,14 +456,14 @@ def create_blog_community(blog):
             "metadata": metadata,
             "custom_fields": custom_fields,
         }
-        response = httpx.post(url, headers=headers, json=data, timeout=10)
+        response = await http_client().post(url, headers=headers, json=data)
         return response
     except Exception as error:
         print(error)
         return None
 
 
-def update_blog_community(blog):
+async def update_blog_community(blog):
     """Update an InvenioRDM blog community."""
     slug = blog.get("slug")
     try:
@@ -457,7 +511,7 @@ def update_blog_community(blog):
             "metadata": metadata,
             "custom_fields": custom_fields,
         }
-        response = httpx.put(url, headers=headers, json=data, timeout=10)
+        response = await http_client().put(url, headers=headers, json=data)
         if response.status_code >= 400:
             print(f"Error updating community {blog.get('slug')}: {response.text}")
             print(f"Request data: {data}")
@@ -563,6 +617,14 @@ _opml_cache: tuple[float, str] | None = None
 _OPML_TTL = 3600  # 60 minutes
 
 
+def _evict_opml(event: dict) -> None:
+    global _opml_cache
+    _opml_cache = None
+
+
+subscribe("blog", _evict_opml)
+
+
 async def generate_opml(*, force: bool = False) -> str:
     """Generate OPML export for all active blogs, grouped by subfield name.
 
@@ -0,0 +1,233 @@
+"""In-process caches for API responses."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+import orjson
+
+from api.db_client import Database
+
+logger = logging.getLogger(__name__)
+
+# Postgres channel for cache invalidation events shared by all API workers
+INVALIDATION_CHANNEL = "rogue_scholar_cache"
+INVALIDATION_EVENTS = ("post", "blog", "citation")
+
+# identifies this worker, to skip notifications it sent itself
+WORKER_ID = uuid.uuid4().hex
+
+_subscribers: dict[str, list[Callable[[dict], None]]] = {}
+
+
+class ResponseCache:
+    """In-process cache for responses, keyed by normalized query parameters.
+
+    Entries are fresh for ``ttl`` seconds, and are served stale for another
+    ``stale_ttl`` seconds while a single background task refreshes them.
+    Concurrent requests for a missing key share one load (single flight).
+    ``get()`` accepts a function that returns a shorter ttl for some loaded
+    values, e.g. for results that were built from incomplete data.
+    ``invalidate()`` drops all or all matching entries, loads started before
+    the invalidation are returned to their callers but not stored.
+    """
+
+    def __init__(self, ttl: float = 60, stale_ttl: float = 300, max_size: int = 256):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Callable[[Any], float | None] | None = None,
+    ) -> Any:
+        """Get cached value for key, calling loader when missing or expired.
+        ttl(value) can return a shorter ttl for the loaded value, or None to
+        keep the ttl of the cache."""
+        entry = self._entries.get(key, None)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.ttl:
+                self._entries.move_to_end(key)
+                return entry[1]
+            if age < self.ttl + self.stale_ttl:
+                self._refresh(key, loader, ttl)
+                return entry[1]
+        return await asyncio.shield(self._refresh(key, loader, ttl))
+
+    def invalidate(self, match: Callable[[Hashable], bool] | None = None) -> None:
+        """Drop cached entries, or only those whose key matches."""
+        self._generation += 1
+        if match is None:
+            self._entries.clear()
+            self._inflight.clear()
+            return
+        for key in [key for key in self._entries if match(key)]:
+            del self._entries[key]
+        for key in [key for key in self._inflight if match(key)]:
+            del self._inflight[key]
+
+    def _refresh(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Callable[[Any], float | None] | None = None,
+    ) -> asyncio.Task:
+        task = self._inflight.get(key, None)
+        if task is None:
+            task = asyncio.create_task(self._load(key, loader, self._generation, ttl))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return task
+
+    async def _load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        generation: int,
+        ttl: Callable[[Any], float | None] | None = None,
+    ) -> Any:
+        value = await loader()
+        if generation == self._generation:
+            loaded_at = time.monotonic()
+            entry_ttl = ttl(value) if ttl is not None else None
+            if entry_ttl is not None and entry_ttl < self.ttl:
+                # a shorter ttl is stored as an older entry
+                loaded_at -= self.ttl - entry_ttl
+            self._entries[key] = (loaded_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return value
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key, None) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Cache refresh failed for {key}: {task.exception()}")
+
+
+def subscribe(event_type: str, callback: Callable[[dict], None]) -> None:
+    """Call callback(event) for every invalidation event of the given type."""
+    if event_type not in INVALIDATION_EVENTS:
+        raise ValueError(f"Unknown invalidation event: {event_type}")
+    _subscribers.setdefault(event_type, []).append(callback)
+
+
+def dispatch(event: dict) -> None:
+    """Evict cache entries matching an invalidation event in this worker.
+    Events of type "*" are sent to all subscribers and evict everything."""
+    event_type = event.get("type", None)
+    if event_type == "*":
+        callbacks = [c for callbacks in _subscribers.values() for c in callbacks]
+    else:
+        callbacks = _subscribers.get(event_type, [])
+    for callback in callbacks:
+        try:
+            callback(event)
+        except Exception as e:
+            logger.warning(f"Cache invalidation failed for {event}: {e}")
+
+
+async def publish_invalidation(event_type: str, **fields) -> None:
+    """Evict matching cache entries in this worker, and notify all other workers."""
+    if event_type not in INVALIDATION_EVENTS:
+        raise ValueError(f"Unknown invalidation event: {event_type}")
+    event = {"type": event_type, **fields}
+    dispatch(event)
+    payload = orjson.dumps({**event, "worker": WORKER_ID}).decode("utf-8")
+    try:
+        await Database.execute(
+            "SELECT pg_notify(:channel, :payload)",
+            {"channel": INVALIDATION_CHANNEL, "payload": payload},
+        )
+    except Exception as e:
+        logger.warning(f"Failed to publish cache invalidation {event}: {e}")
+
+
+def handle_notification(payload: str | None) -> None:
+    """Evict cache entries for an invalidation event sent by another worker.
+    A missing payload means notifications may have been missed, e.g. after the
+    listener reconnected, and evicts everything."""
+    if payload is None:
+        dispatch({"type": "*"})
+        return
+    try:
+        event = orjson.loads(payload)
+    except orjson.JSONDecodeError:
+        logger.warning(f"Invalid cache invalidation payload: {payload}")
+        return
+    if event.pop("worker", None) == WORKER_ID:
+        return
+    dispatch(event)
+
+
+# first pages of /posts without a search query, keyed by
+# ("posts", page, per_page, blog_slug, language, tags, tags_match,
+#  published_since, published_until, sort, order), and their total counts,
+# keyed by ("posts", "count", None, blog_slug, language, tags, tags_match,
+#  published_since, published_until)
+posts_cache = ResponseCache(ttl=60, stale_ttl=300)
+POSTS_CACHE_MAX_PAGE = 5
+
+# facet counts of /posts without a search query, keyed by
+# ("facets", facet_by, max_facet_values, blog_slug, language, tags, tags_match,
+#  published_since, published_until). Not evicted on updates, but refreshed
+# in the background once older than ttl.
+facets_cache = ResponseCache(ttl=300, stale_ttl=3600)
+
+
+def _evict_posts(event: dict) -> None:
+    blog_slug = event.get("blog_slug", None)
+    if blog_slug is None:
+        posts_cache.invalidate()
+    else:
+        posts_cache.invalidate(lambda key: key[3] in (None, blog_slug))
+
+
+subscribe("post", _evict_posts)
+subscribe("blog", _evict_posts)
+# citation counts are part of the posts
+subscribe("citation", _evict_posts)
+
+
+# blog metadata with post stats for /blogs/<slug> and the blog feeds, keyed
+# by ("blog", slug)
+blogs_cache = ResponseCache(ttl=600, stale_ttl=3600)
+
+
+def _evict_blogs(event: dict) -> None:
+    blog_slug = event.get("blog_slug", None)
+    if blog_slug is None:
+        blogs_cache.invalidate()
+    else:
+        blogs_cache.invalidate(lambda key: key[1] == blog_slug)
+
+
+subscribe("post", _evict_blogs)
+subscribe("blog", _evict_blogs)
+
+
+# generated blog feeds with their gzip compressed version, keyed by
+# (kind, key, etag). The etag changes with the underlying posts, so entries
+# are never stale and are only dropped when unused.
+feeds_cache = ResponseCache(ttl=86400, stale_ttl=0, max_size=1024)
+
+
+# rendered metadata formats of posts, keyed by (etag, format, style, locale).
+# The etag changes whenever the post document or its blog change, so entries are
+# never stale and are only dropped when unused.
+formats_cache = ResponseCache(ttl=86400, stale_ttl=0, max_size=2048)
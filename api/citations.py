@@ -1,44 +1,183 @@
 """Citations module."""
 
+import logging
 from os import environ, path
 import yaml
 import httpx
 import xmltodict
 import asyncio
 import pydash as py_
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Iterator
+from lxml import etree
 from commonmeta import (
     validate_doi,
     normalize_doi,
-    wrap,
     Metadata,
     compact,
 )
 
 from api.db_client import Database, CitationsQueries
+from api.cache import publish_invalidation
 
+logger = logging.getLogger(__name__)
 
-async def extract_all_citations_by_prefix(slug: str) -> list:
-    """Extract all citations from Crossref cited-by service by slug (prefix or doi). Needs username and password for account
-    managing the prefix."""
+CROSSREF_FORWARD_LINKS_URL = "https://doi.crossref.org/servlet/getForwardLinks"
+
+# start date of a full cited-by sync, and how long before the last successful
+# sync an incremental sync starts, as forward links are deposited with a delay
+CITATION_SYNC_START_DATE = "2000-01-01"
+CITATION_SYNC_SAFETY_WINDOW = timedelta(days=7)
+
+# citing dois looked up at the same time, each in a worker thread, shared by
+# all prefixes and batches synced at the same time
+CITATION_LOOKUP_CONCURRENCY = 8
+
+# forward links upserted together while the getForwardLinks response is parsed,
+# and batches parsed ahead of the upserts before the download waits
+CITATION_BATCH_SIZE = 500
+CITATION_QUEUE_BATCHES = 100
+
+_lookup_semaphore = asyncio.Semaphore(CITATION_LOOKUP_CONCURRENCY)
+
+
+async def extract_all_citations_by_prefix(slug: str, full: bool = False) -> list:
+    """Extract citations from Crossref cited-by service by slug (prefix or doi),
+    since the last successful sync of the slug minus a safety window, or all
+    citations if full or never synced. Citations already stored are not looked
+    up again. Needs username and password for account managing the prefix."""
     username = environ.get("QUART_CROSSREF_USERNAME_WITH_ROLE", None)
     password = environ.get("QUART_CROSSREF_PASSWORD", None)
     if not username or not password or not slug:
         return []
-    url = f"https://doi.crossref.org/servlet/getForwardLinks?usr={username}&pwd={password}&doi={slug}&startDate=2000-01-01&include_postedcontent=true"
-    response = httpx.get(url, headers={"Accept": "text/xml;charset=utf-8"}, timeout=10)
-    response.raise_for_status()
-    crossref_result = xmltodict.parse(response.text)
-    citations = py_.get(
-        crossref_result, "crossref_result.query_result.body.forward_link", []
+    synced_at = datetime.now(timezone.utc)
+    start_date = (
+        CITATION_SYNC_START_DATE if full else await citation_sync_start_date(slug)
     )
-    print(f"Upserting {len(wrap(citations))} citations for {slug}")
-    return await upsert_citations(wrap(citations))
-
+    params = {
+        "usr": username,
+        "pwd": password,
+        "doi": slug,
+        "startDate": start_date,
+        "include_postedcontent": "true",
+    }
+    print(f"Upserting citations for {slug} since {start_date}")
+
+    # the response is read in one task and the forward links are upserted in
+    # batches in another, so that the connection isn't idle during the upserts
+    queue: asyncio.Queue[list | None] = asyncio.Queue(maxsize=CITATION_QUEUE_BATCHES)
+    result, count, failed = [], 0, 0
+
+    async def download():
+        batch = []
+        async with httpx.AsyncClient(timeout=60) as client:
+            async with client.stream(
+                "GET",
+                CROSSREF_FORWARD_LINKS_URL,
+                params=params,
+                headers={"Accept": "text/xml;charset=utf-8"},
+            ) as response:
+                response.raise_for_status()
+                async for citation in stream_forward_links(response.aiter_bytes()):
+                    batch.append(citation)
+                    if len(batch) >= CITATION_BATCH_SIZE:
+                        await queue.put(batch)
+                        batch = []
+        if batch:
+            await queue.put(batch)
+        await queue.put(None)
+
+    async def upsert():
+        nonlocal count, failed
+        while (batch := await queue.get()) is not None:
+            upserted, batch_failed = await upsert_citations(batch)
+            result.extend(upserted)
+            failed += batch_failed
+            count += len(batch)
 
-async def extract_all_citations() -> list:
-    """Extract all citations from Crossref cited-by service. Needs username and password for account
-    managing the prefix."""
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(download())
+            tg.create_task(upsert())
+    except ExceptionGroup as e:
+        raise e.exceptions[0]
+    print(f"Upserted {count} citations for {slug}, {failed} failed")
+
+    # only move the watermark if all citations were stored
+    if not failed:
+        await CitationsQueries.update_sync_watermark(slug, synced_at.isoformat(), count)
+    return result
+
+
+async def stream_forward_links(chunks: AsyncIterator[bytes]) -> AsyncIterator[dict]:
+    """Parse the forward_link elements of a getForwardLinks response while it is
+    downloaded, as dicts in the shape of xmltodict. Elements are cleared once
+    converted, so memory use doesn't grow with the size of the response."""
+    parser = etree.XMLPullParser(
+        events=("end",),
+        tag="{*}forward_link",
+        resolve_entities=False,
+        no_network=True,
+        huge_tree=True,
+    )
+    async for chunk in chunks:
+        parser.feed(chunk)
+        for citation in _read_forward_links(parser):
+            yield citation
+    parser.close()
+    for citation in _read_forward_links(parser):
+        yield citation
+
+
+def _read_forward_links(parser: etree.XMLPullParser) -> Iterator[dict]:
+    for _, element in parser.read_events():
+        citation = _element_to_dict(element)
+        element.clear(keep_tail=False)
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+        yield citation
+
+
+def _element_to_dict(element) -> dict | str | None:
+    """Convert an element as xmltodict does, without namespaces: attributes
+    prefixed with @, text as #text (or as value, if there are no attributes or
+    children), and repeated children as list."""
+    result = {
+        f"@{etree.QName(key).localname}": value for key, value in element.attrib.items()
+    }
+    for child in element:
+        if not isinstance(child.tag, str):
+            continue
+        key = etree.QName(child).localname
+        value = _element_to_dict(child)
+        if key not in result:
+            result[key] = value
+        elif isinstance(result[key], list):
+            result[key].append(value)
+        else:
+            result[key] = [result[key], value]
+    text = (element.text or "").strip()
+    if not result:
+        return text or None
+    if text:
+        result["#text"] = text
+    return result
+
+
+async def citation_sync_start_date(slug: str) -> str:
+    """Start date for the next cited-by sync of a prefix or doi, the day of the
+    last successful sync minus the safety window."""
+    synced_at = await CitationsQueries.select_sync_watermark(slug)
+    if not synced_at:
+        return CITATION_SYNC_START_DATE
+    start = datetime.fromisoformat(synced_at) - CITATION_SYNC_SAFETY_WINDOW
+    return start.date().isoformat()
+
+
+async def extract_all_citations(full: bool = False) -> list:
+    """Extract all citations from Crossref cited-by service, incrementally per
+    prefix unless full. Needs username and password for account managing the
+    prefix."""
     username = environ.get("QUART_CROSSREF_USERNAME_WITH_ROLE", None)
     password = environ.get("QUART_CROSSREF_PASSWORD", None)
     if not username or not password:
@@ -57,11 +196,12 @@ async def extract_all_citations() -> list:
         "10.64000",
         "10.65527",
     ]
-    citations = await asyncio.gather(
-        *[extract_all_citations_by_prefix(prefix) for prefix in prefixes]
+    results = await asyncio.gather(
+        *[extract_all_citations_by_prefix(prefix, full=full) for prefix in prefixes]
     )
-    print(f"Upserting {len(wrap(citations))} citations.")
-    return await upsert_citations(wrap(citations))
+    citations = [citation for result in results for citation in result]
+    print(f"Upserted {len(citations)} citations.")
+    return citations
 
 
 def parse_crossref_xml(xml: str | None, **kwargs) -> list:
@@ -83,11 +223,10 @@ def parse_crossref_xml(xml: str | None, **kwargs) -> list:
     return xmltodict.parse(xml, **kwargs)
 
 
-async def format_crossref_citation(citation: dict, redirects: dict) -> dict:
-    """Format Crossref citation from Crossref cited-by service.
+def crossref_citation_dois(citation: dict, redirects: dict) -> tuple[str, str] | None:
+    """Cited and citing doi (lowercase, without resolver) of a Crossref forward link.
     Citing doi is embedded in different metadata, depending on the content type, e.g. journal_cite, book_cite, etc.
     Some Rogue Scholar DOIs are redirected to new DOIs, which are stored in the redirects.yaml file."""
-
     cited_doi = validate_doi(citation.get("@doi", None))
     cited_doi = redirects.get(cited_doi, cited_doi)
 
@@ -99,24 +238,30 @@ async def format_crossref_citation(citation: dict, redirects: dict) -> dict:
     )
 
     if cited_doi is None or citing_doi is None:
-        return {}
-    cited_doi = cited_doi.lower()
-    citing_doi = citing_doi.lower()
+        return None
+    return cited_doi.lower(), citing_doi.lower()
+
 
-    # generate unique identifier using cited_doi and citing_doi
+def crossref_citation_id(citation: dict, redirects: dict) -> str | None:
+    """Unique identifier of a citation, using cited doi and citing doi."""
     # TODO: align with OpenCitations OCI identifier
+    dois = crossref_citation_dois(citation, redirects)
+    return f"{dois[0]}::{dois[1]}" if dois else None
 
-    cid = f"{cited_doi.lower()}::{citing_doi.lower()}"
 
-    # lookup blog_slug for cited doi
-    query = """
-        SELECT blog_slug
-        FROM posts
-        WHERE doi = :doi
-        LIMIT 1
-    """
-    result = await Database.fetch_one(query, {"doi": normalize_doi(cited_doi)})
-    blog_slug = result.get("blog_slug") if result else None
+def format_crossref_citation(
+    citation: dict, redirects: dict, blog_slugs: dict | None = None
+) -> dict:
+    """Format Crossref citation from Crossref cited-by service, with the
+    blog_slug of the cited doi from blog_slugs. Looks up the citing doi, so
+    blocking, run in a worker thread."""
+
+    dois = crossref_citation_dois(citation, redirects)
+    if dois is None:
+        return {}
+    cited_doi, citing_doi = dois
+    cid = f"{cited_doi}::{citing_doi}"
+    blog_slug = (blog_slugs or {}).get(normalize_doi(cited_doi), None)
 
     # lookup metadata via API call, as we need the publication date to order the citations
     subject = Metadata(citing_doi)
@@ -142,63 +287,92 @@ async def format_crossref_citation(citation: dict, redirects: dict) -> dict:
     )
 
 
-async def upsert_citations(citations: list) -> list:
-    """Upsert multiple citations."""
+async def lookup_blog_slugs(dois: list) -> dict:
+    """Get the blog_slug of the posts with these dois with one query."""
+    if not dois:
+        return {}
+    query = """
+        SELECT doi, blog_slug
+        FROM posts
+        WHERE doi = ANY(:dois)
+    """
+    rows = await Database.fetch_all(query, {"dois": dois})
+    return {row["doi"]: row["blog_slug"] for row in rows}
+
+
+async def upsert_citations(citations: list) -> tuple[list, int]:
+    """Upsert multiple citations in three stages: look up the blogs of the cited
+    dois with one query, look up the citing dois in worker threads with bounded
+    concurrency, and upsert the citations with one statement. Citations already
+    stored are returned as stored, without looking up the citing doi again.
+    Returns the citations and the number of citations that failed."""
 
     # load redirected dois
     redirects = load_redirects()
 
-    data = [
-        await format_crossref_citation(citation, redirects) for citation in citations
-    ]
-    return [await upsert_single_citation(citation) for citation in data]
+    new_citations = {}
+    for citation in citations:
+        cid = crossref_citation_id(citation, redirects)
+        if cid is not None:
+            new_citations.setdefault(cid, citation)
+    known = await CitationsQueries.select_by_cids(list(new_citations.keys()))
+    for row in known:
+        new_citations.pop(row["cid"], None)
+    print(f"Skipping {len(known)} known citations")
+    if not new_citations:
+        return known, 0
+
+    cited_dois = {normalize_doi(cid.split("::", 1)[0]) for cid in new_citations}
+    blog_slugs = await lookup_blog_slugs(sorted(cited_dois))
+
+    async def format_citation(citation: dict) -> dict | None:
+        async with _lookup_semaphore:
+            try:
+                return await asyncio.to_thread(
+                    format_crossref_citation, citation, redirects, blog_slugs
+                )
+            except Exception as e:
+                logger.warning(f"Failed to format citation: {e}")
+                return None
+
+    data = await asyncio.gather(
+        *[format_citation(citation) for citation in new_citations.values()]
+    )
+    formatted = [citation for citation in data if citation is not None]
+    failed = len(data) - len(formatted)
+    upserted = await upsert_formatted_citations(formatted)
+    if upserted is None:
+        return known, failed + len(formatted)
+    return known + upserted, failed
 
 
-async def upsert_single_citation(citation):
-    """Upsert single citation."""
+async def upsert_formatted_citations(citations: list) -> list | None:
+    """Upsert formatted citations with one statement, and notify other workers
+    once per cited doi. Returns None if the upsert failed."""
 
     # missing doi, citation or oci
     # oci is used as unique identifier for the citation record
-    if not citation.get("doi", None) or not citation.get("citation", None):
-        return {}
-
+    citations = [
+        citation
+        for citation in citations
+        if citation and citation.get("doi", None) and citation.get("citation", None)
+    ]
     try:
-        # UPSERT citation using PostgreSQL ON CONFLICT via helper
-        data = await CitationsQueries.upsert_citation(
-            {
-                "cid": citation.get("cid"),
-                "doi": citation.get("doi"),
-                "citation": citation.get("citation"),
-                "unstructured": citation.get("unstructured", None),
-                "published_at": citation.get("published_at", None),
-                "type": citation.get("type", None),
-                "blog_slug": citation.get("blog_slug", None),
-            }
-        )
-        print(
-            f"Upserted citation {citation.get('citation')} for doi {citation.get('doi')}"
-        )
-        if not data:
-            return None
-        today = datetime.now(timezone.utc).date()
-        updated_at_value = data.get("updated_at", None)
-        updated_at_dt: datetime | None
-        if isinstance(updated_at_value, datetime):
-            updated_at_dt = updated_at_value
-        elif isinstance(updated_at_value, str):
-            updated_at_dt = datetime.fromisoformat(
-                updated_at_value.replace("Z", "+00:00")
-            )
-        else:
-            updated_at_dt = None
-
-        # NOTE: We intentionally don't call `update_single_post()` here.
-        # The citations endpoint should return citation records, and post-updates
-        # can introduce external coupling (and currently still contain legacy code).
-        return data
+        data = await CitationsQueries.upsert_citations(citations)
     except Exception as e:
-        print(e)
+        logger.warning(f"Failed to upsert citations: {e}")
         return None
+    print(f"Upserted {len(data)} citations")
+    cited = dict.fromkeys(
+        (row.get("doi", None), row.get("blog_slug", None)) for row in data
+    )
+    for doi, blog_slug in cited:
+        await publish_invalidation("citation", doi=doi, blog_slug=blog_slug)
+
+    # NOTE: We intentionally don't call `update_single_post()` here.
+    # The citations endpoint should return citation records, and post-updates
+    # can introduce external coupling (and currently still contain legacy code).
+    return data
 
 
 def load_redirects():
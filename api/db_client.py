@@ -9,14 +9,17 @@ import asyncio
 import logging
 import os
 from contextlib import asynccontextmanager
-from datetime import date, datetime
-from decimal import Decimal
-from typing import Any, AsyncIterator, Dict, List, Optional
-from uuid import UUID
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from uuid import uuid4
 
+import orjson
 import psycopg
-from psycopg.rows import dict_row
-from psycopg.types.json import Jsonb
+from psycopg import sql
+from psycopg.abc import AdaptContext, Buffer
+from psycopg.adapt import Loader
+from psycopg.rows import dict_row, tuple_row
+from psycopg.types.datetime import DateLoader, TimestampLoader, TimestamptzLoader
+from psycopg.types.json import Jsonb, set_json_loads
 from psycopg_pool import AsyncConnectionPool
 from psycopg_pool.errors import PoolTimeout
 
@@ -43,6 +46,61 @@ class DatabaseConfig:
         return f"postgresql://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}"
 
 
+class NumericLoader(Loader):
+    """Load numeric as int if integral, otherwise as float, instead of Decimal."""
+
+    def load(self, data: Buffer) -> int | float:
+        value = bytes(data)
+        integral, _, fraction = value.partition(b".")
+        if integral.lstrip(b"-").isdigit() and not fraction.strip(b"0"):
+            return int(integral)
+        return float(value)
+
+
+class IsoTimestamptzLoader(TimestamptzLoader):
+    """Load timestamptz as ISO 8601 string."""
+
+    def load(self, data: Buffer) -> str:
+        return super().load(data).isoformat()
+
+
+class IsoTimestampLoader(TimestampLoader):
+    """Load timestamp as ISO 8601 string."""
+
+    def load(self, data: Buffer) -> str:
+        return super().load(data).isoformat()
+
+
+class IsoDateLoader(DateLoader):
+    """Load date as ISO 8601 string."""
+
+    def load(self, data: Buffer) -> str:
+        return super().load(data).isoformat()
+
+
+class UUIDStrLoader(Loader):
+    """Load uuid as string, Postgres already returns the canonical form."""
+
+    def load(self, data: Buffer) -> str:
+        return bytes(data).decode("ascii")
+
+
+def register_loaders(context: AdaptContext) -> None:
+    """Load values as JSON-serializable primitives, so that rows can be
+    returned without further conversion. JSON is parsed with orjson."""
+    adapters = context.adapters
+    adapters.register_loader("numeric", NumericLoader)
+    adapters.register_loader("timestamptz", IsoTimestamptzLoader)
+    adapters.register_loader("timestamp", IsoTimestampLoader)
+    adapters.register_loader("date", IsoDateLoader)
+    adapters.register_loader("uuid", UUIDStrLoader)
+    set_json_loads(orjson.loads, context)
+
+
+async def _configure_connection(conn: psycopg.AsyncConnection) -> None:
+    register_loaders(conn)
+
+
 class DatabasePool:
     """Single unified connection pool for all database operations."""
 
@@ -51,6 +109,8 @@ class DatabasePool:
         self._pool: AsyncConnectionPool | None = None
         self._pool_lock = asyncio.Lock()
         self._health_check_task: asyncio.Task | None = None
+        self._url: str | None = None
+        self._listen_tasks: list[asyncio.Task] = []
 
     async def initialize(self) -> None:
         """Initialize connection pool."""
@@ -82,6 +142,7 @@ class DatabasePool:
                 else:
                     pool_url = self.config.url
                     open_min_size = self.config.min_connections
+                self._url = pool_url
 
                 self._pool = AsyncConnectionPool(
                     pool_url,
@@ -92,6 +153,7 @@ class DatabasePool:
                     max_lifetime=1800.0,  # Recycle connections after 30 min
                     reconnect_timeout=10.0,  # Quick reconnect attempts
                     check=AsyncConnectionPool.check_connection,  # Validate connections on checkout
+                    configure=_configure_connection,  # JSON-ready type loaders
                     kwargs={
                         "autocommit": True,  # Autocommit for most operations (use transaction() for multi-statement)
                         "row_factory": dict_row,
@@ -120,6 +182,11 @@ class DatabasePool:
 
     async def close(self) -> None:
         """Close the connection pool gracefully."""
+        for task in self._listen_tasks:
+            task.cancel()
+        await asyncio.gather(*self._listen_tasks, return_exceptions=True)
+        self._listen_tasks = []
+
         if self._health_check_task:
             self._health_check_task.cancel()
             try:
@@ -154,6 +221,55 @@ class DatabasePool:
             if conn is not None:
                 await self._pool.putconn(conn)
 
+    async def listen(
+        self, channel: str, callback: Callable[[str | None], None]
+    ) -> None:
+        """Call callback(payload) for every NOTIFY on channel.
+
+        Uses a dedicated connection outside the pool, as a listening connection
+        can't be shared. The connection is re-established after errors, and
+        callback(None) is called whenever listening (re)starts, as notifications
+        sent in between are lost.
+        """
+        if self._url is None:
+            raise ConnectionError("Database pool not initialized")
+        task = asyncio.create_task(self._listen_loop(channel, callback))
+        self._listen_tasks.append(task)
+
+    async def _listen_loop(
+        self, channel: str, callback: Callable[[str | None], None]
+    ) -> None:
+        retry_delay = 1.0
+        while True:
+            try:
+                conn = await psycopg.AsyncConnection.connect(
+                    self._url,
+                    autocommit=True,
+                    keepalives=1,
+                    keepalives_idle=30,
+                    keepalives_interval=10,
+                    keepalives_count=5,
+                    connect_timeout=10,
+                )
+                async with conn:
+                    await conn.execute(
+                        sql.SQL("LISTEN {}").format(sql.Identifier(channel))
+                    )
+                    logger.info(f"Listening for notifications on {channel}")
+                    retry_delay = 1.0
+                    callback(None)
+                    async for notify in conn.notifies():
+                        callback(notify.payload)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.warning(
+                    f"Listener on {channel} failed: {e}. "
+                    f"Reconnecting in {retry_delay:.0f}s..."
+                )
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 60.0)
+
     async def _health_check_loop(self) -> None:
         """Periodic health check to detect connection issues early."""
         while True:
@@ -249,31 +365,6 @@ def _convert_query_syntax(query: str) -> str:
     return re.sub(r"(?<!:):(\w+)(?!:)", r"%(\1)s", query)
 
 
-def _normalize_value(value: Any) -> Any:
-    """Normalize DB-returned types to JSON-serializable primitives."""
-    if value is None:
-        return None
-    if isinstance(value, UUID):
-        return str(value)
-    if isinstance(value, (datetime, date)):
-        return value.isoformat()
-    if isinstance(value, Decimal):
-        try:
-            integral = value.to_integral_value()
-            if value == integral:
-                return int(integral)
-        except Exception:
-            pass
-        return float(value)
-    if isinstance(value, dict):
-        return {k: _normalize_value(v) for k, v in value.items()}
-    if isinstance(value, list):
-        return [_normalize_value(v) for v in value]
-    if isinstance(value, tuple):
-        return tuple(_normalize_value(v) for v in value)
-    return value
-
-
 async def execute_with_retry(
     func,
     max_retries: int = 3,
@@ -334,7 +425,7 @@ class Database:
                 async with conn.cursor() as cursor:
                     await cursor.execute(query_converted, _adapt_params(params))
                     row = await cursor.fetchone()
-                    return _normalize_value(dict(row)) if row else None
+                    return row
 
         return await execute_with_retry(_execute)
 
@@ -349,10 +440,64 @@ class Database:
                 async with conn.cursor() as cursor:
                     await cursor.execute(query_converted, _adapt_params(params))
                     rows = await cursor.fetchall()
-                    return [_normalize_value(dict(row)) for row in rows]
+                    return rows
 
         return await execute_with_retry(_execute)
 
+    @staticmethod
+    async def fetch_val(query: str, params: Optional[Dict] = None) -> Any:
+        """Fetch first column of the first row, e.g. a JSON document built by
+        Postgres and cast to text, to pass on without parsing it."""
+
+        async def _execute():
+            pool = await get_pool()
+            query_converted = _convert_query_syntax(query)
+            async with pool.acquire() as conn:
+                async with conn.cursor(row_factory=tuple_row) as cursor:
+                    await cursor.execute(query_converted, _adapt_params(params))
+                    row = await cursor.fetchone()
+                    return row[0] if row else None
+
+        return await execute_with_retry(_execute)
+
+    @staticmethod
+    async def stream(
+        query: str, params: Optional[Dict] = None, batch_size: int = 1000
+    ) -> AsyncIterator[Dict]:
+        """Stream rows as dictionaries from a server-side cursor, fetching
+        batch_size rows at a time, so memory use doesn't grow with the result.
+
+        Not retried, as rows may already have been consumed. The connection is
+        held until the iteration is finished or closed.
+        """
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            # named cursors need a transaction, the connection is in autocommit
+            async with conn.transaction():
+                # the transaction is idle while the consumer processes a batch
+                await conn.execute(
+                    "SET LOCAL idle_in_transaction_session_timeout = '10min'"
+                )
+                async for row in _stream_rows(conn, query, params, batch_size):
+                    yield row
+
+    @staticmethod
+    @asynccontextmanager
+    async def snapshot() -> AsyncIterator["Snapshot"]:
+        """Context manager for a read-only REPEATABLE READ transaction, so
+        that several queries streamed from it see the same state of the
+        database, e.g. for exports of more than one table."""
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY"
+                )
+                await conn.execute(
+                    "SET LOCAL idle_in_transaction_session_timeout = '10min'"
+                )
+                yield Snapshot(conn)
+
     @staticmethod
     async def execute(query: str, params: Optional[Dict] = None) -> None:
         """Execute query (INSERT/UPDATE/DELETE) without returning results."""
@@ -408,6 +553,37 @@ class Database:
                 await conn.set_autocommit(True)
 
 
+class Snapshot:
+    """Queries of a Database.snapshot() transaction."""
+
+    def __init__(self, conn: psycopg.AsyncConnection):
+        self._conn = conn
+
+    async def stream(
+        self, query: str, params: Optional[Dict] = None, batch_size: int = 1000
+    ) -> AsyncIterator[Dict]:
+        """Stream rows as dictionaries from a server-side cursor, like
+        Database.stream."""
+        async for row in _stream_rows(self._conn, query, params, batch_size):
+            yield row
+
+
+async def _stream_rows(
+    conn: psycopg.AsyncConnection,
+    query: str,
+    params: Optional[Dict],
+    batch_size: int,
+) -> AsyncIterator[Dict]:
+    """Rows of a query from a named cursor, the connection must be in a
+    transaction."""
+    query_converted = _convert_query_syntax(query)
+    async with conn.cursor(name=f"stream_{uuid4().hex}") as cursor:
+        cursor.itersize = batch_size
+        await cursor.execute(query_converted, _adapt_params(params))
+        async for row in cursor:
+            yield row
+
+
 # Common select field sets
 BLOGS_SELECT = """
     slug, title, description, language, favicon, feed_url, 
@@ -435,6 +611,16 @@ CITATIONS_SELECT = """
     citation, unstructured, validated, updated_at, published_at
 """
 
+# Post documents don't embed the blog, it is joined when reading
+POST_DOCUMENT_SELECT = """
+    d.document || jsonb_build_object('blog', to_jsonb(b.*))
+"""
+
+POST_DOCUMENTS_FROM = """
+    post_documents d
+    LEFT JOIN blogs b ON b.slug = d.blog_slug
+"""
+
 
 # Query builder helpers for common patterns
 class BlogsQueries:
@@ -515,50 +701,56 @@ class PostsQueries:
         post_id: str, with_citations: bool = False
     ) -> Optional[Dict]:
         """Select single post by ID with blog data, optionally including citations."""
-        if with_citations:
-            query = f"""
-                SELECT {POSTS_WITH_BLOG_SELECT},
-                       (
-                           SELECT json_agg(row_to_json(c.*))
-                           FROM citations c
-                           WHERE c.doi = p.doi AND c.cid IS NOT NULL
-                       ) as citations
-                FROM posts p
-                LEFT JOIN blogs b ON p.blog_slug = b.slug
-                WHERE p.id = %(post_id)s
-            """
-        else:
-            query = f"""
-                SELECT {POSTS_WITH_BLOG_SELECT}
-                FROM posts p
-                LEFT JOIN blogs b ON p.blog_slug = b.slug
-                WHERE p.id = %(post_id)s
-            """
-        return await Database.fetch_one(query, {"post_id": post_id})
+        query = f"""
+            SELECT {POST_DOCUMENT_SELECT} as document
+            FROM {POST_DOCUMENTS_FROM}
+            WHERE d.id = %(post_id)s
+        """
+        result = await Database.fetch_one(query, {"post_id": post_id})
+        return _post_from_document(result, with_citations)
 
     @staticmethod
     async def select_by_doi(doi: str, with_citations: bool = False) -> Optional[Dict]:
         """Select single post by DOI with blog data, optionally including citations."""
-        if with_citations:
-            query = f"""
-                SELECT {POSTS_WITH_BLOG_SELECT},
-                       (
-                           SELECT json_agg(row_to_json(c.*))
-                           FROM citations c
-                           WHERE c.doi = p.doi AND c.cid IS NOT NULL
-                       ) as citations
-                FROM posts p
-                LEFT JOIN blogs b ON p.blog_slug = b.slug
-                WHERE p.doi = %(doi)s
-            """
-        else:
-            query = f"""
-                SELECT {POSTS_WITH_BLOG_SELECT}
-                FROM posts p
-                LEFT JOIN blogs b ON p.blog_slug = b.slug
-                WHERE p.doi = %(doi)s
-            """
-        return await Database.fetch_one(query, {"doi": doi})
+        query = f"""
+            SELECT {POST_DOCUMENT_SELECT} as document
+            FROM {POST_DOCUMENTS_FROM}
+            WHERE d.doi = %(doi)s
+        """
+        result = await Database.fetch_one(query, {"doi": doi})
+        return _post_from_document(result, with_citations)
+
+    @staticmethod
+    async def select_by_ids_or_dois(
+        post_ids: List[str], dois: List[str], with_citations: bool = False
+    ) -> List[Dict]:
+        """Select posts by IDs and DOIs with one query on the indexed id and
+        doi columns of post documents, optionally including citations."""
+        if not post_ids and not dois:
+            return []
+        query = f"""
+            SELECT {POST_DOCUMENT_SELECT} as document
+            FROM {POST_DOCUMENTS_FROM}
+            WHERE d.id = ANY(CAST(%(post_ids)s AS uuid[]))
+            OR d.doi = ANY(CAST(%(dois)s AS text[]))
+        """
+        results = await Database.fetch_all(
+            query, {"post_ids": post_ids, "dois": dois}
+        )
+        return [_post_from_document(result, with_citations) for result in results]
+
+
+def _post_from_document(
+    result: Optional[Dict], with_citations: bool = False
+) -> Optional[Dict]:
+    """Get post from a post_documents row, the read model of posts with their
+    citations maintained by database triggers, joined with the blog."""
+    if not result:
+        return None
+    post = result["document"]
+    if not with_citations:
+        post.pop("citations", None)
+    return post
 
 
 class CitationsQueries:
@@ -579,11 +771,21 @@ class CitationsQueries:
         return await Database.fetch_all(query, {"doi": doi})
 
     @staticmethod
-    async def upsert_citation(citation: Dict) -> Optional[Dict]:
-        """Upsert a single citation using ON CONFLICT."""
+    async def upsert_citations(citations: List[Dict]) -> List[Dict]:
+        """Upsert citations (with unique cids) in one statement using ON CONFLICT.
+        The citation counts of the cited posts (and of the previously cited
+        posts, if citations moved) are updated by triggers in the same
+        statement, see migrations/0005."""
+        if not citations:
+            return []
         query = """
+            WITH input AS (
+                SELECT *
+                FROM jsonb_populate_recordset(NULL::citations, %(citations)s)
+            )
             INSERT INTO citations (cid, doi, citation, unstructured, published_at, type, blog_slug)
-            VALUES (%(cid)s, %(doi)s, %(citation)s, %(unstructured)s, %(published_at)s, %(type)s, %(blog_slug)s)
+            SELECT cid, doi, citation, unstructured, published_at, type, blog_slug
+            FROM input
             ON CONFLICT (cid) DO UPDATE SET
                 doi = EXCLUDED.doi,
                 citation = EXCLUDED.citation,
@@ -594,7 +796,58 @@ class CitationsQueries:
                 updated_at = CURRENT_TIMESTAMP
             RETURNING *
         """
-        return await Database.fetch_one(query, citation)
+        columns = [
+            "cid",
+            "doi",
+            "citation",
+            "unstructured",
+            "published_at",
+            "type",
+            "blog_slug",
+        ]
+        rows = [{column: c.get(column) for column in columns} for c in citations]
+        return await Database.fetch_all(query, {"citations": Jsonb(rows)})
+
+    @staticmethod
+    async def select_by_cids(cids: List[str]) -> List[Dict]:
+        """Select the citations with these cids."""
+        if not cids:
+            return []
+        query = """
+            SELECT *
+            FROM citations
+            WHERE cid = ANY(CAST(%(cids)s AS text[]))
+        """
+        return await Database.fetch_all(query, {"cids": cids})
+
+    @staticmethod
+    async def select_sync_watermark(slug: str) -> Optional[str]:
+        """Select the start of the last successful cited-by sync of a prefix or
+        DOI, as ISO 8601 string."""
+        query = """
+            SELECT synced_at
+            FROM citation_sync_watermarks
+            WHERE slug = %(slug)s
+        """
+        return await Database.fetch_val(query, {"slug": slug})
+
+    @staticmethod
+    async def update_sync_watermark(
+        slug: str, synced_at: str, citation_count: int
+    ) -> None:
+        """Store the start of a successful cited-by sync of a prefix or DOI."""
+        query = """
+            INSERT INTO citation_sync_watermarks (slug, synced_at, citation_count, updated_at)
+            VALUES (%(slug)s, CAST(%(synced_at)s AS timestamptz), %(citation_count)s, NOW())
+            ON CONFLICT (slug) DO UPDATE SET
+                synced_at = EXCLUDED.synced_at,
+                citation_count = EXCLUDED.citation_count,
+                updated_at = EXCLUDED.updated_at
+        """
+        await Database.execute(
+            query,
+            {"slug": slug, "synced_at": synced_at, "citation_count": citation_count},
+        )
 
 
 # Export commonly used functions
@@ -0,0 +1,267 @@
+"""Sitemaps, JSON Feeds and Atom feeds generated from the database.
+
+Sitemaps are sharded by month of publication, see migrations/0009. Months
+with more posts than a sitemap can hold are split into parts of
+SITEMAP_MAX_URLS posts. Sitemaps are streamed from a server-side cursor,
+and the index lists the shards with their latest update, so crawlers only
+fetch shards that changed.
+"""
+
+from __future__ import annotations
+
+import gzip
+from datetime import datetime, timezone
+from os import environ
+from xml.etree.ElementTree import Element, SubElement, tostring
+from xml.sax.saxutils import escape
+
+from collections.abc import AsyncIterator
+from math import ceil
+
+import orjson
+
+from api.db_client import Database
+
+SITEMAP_NAMESPACE = "http://www.sitemaps.org/schemas/sitemap/0.9"
+ATOM_NAMESPACE = "http://www.w3.org/2005/Atom"
+JSON_FEED_VERSION = "https://jsonfeed.org/version/1.1"
+
+# sitemap protocol limit of URLs per sitemap
+SITEMAP_MAX_URLS = 50000
+# number of URLs written per streamed chunk of a sitemap
+SITEMAP_CHUNK_URLS = 1000
+FEED_MAX_ITEMS = 50
+
+
+def api_url() -> str:
+    """Base URL of the API, used for the URLs in sitemaps and feeds."""
+    return environ.get("QUART_API_URL", "https://api.rogue-scholar.org").rstrip("/")
+
+
+def shard_range(shard: str) -> tuple[float, float]:
+    """Unix timestamps of the start and end of a YYYY-MM shard, raise
+    ValueError if the shard is invalid."""
+    if len(shard) != 7 or shard[4] != "-":
+        raise ValueError(f"Invalid shard: {shard}")
+    start = datetime.strptime(shard, "%Y-%m").replace(tzinfo=timezone.utc)
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start.timestamp(), end.timestamp()
+
+
+def _iso_date(timestamp: float | None) -> str | None:
+    """Unix timestamp as RFC 3339 date (W3C datetime)."""
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime(
+        "%Y-%m-%dT%H:%M:%SZ"
+    )
+
+
+def compress(body: bytes) -> dict:
+    """Body and its gzip compressed version, to serve either without
+    compressing per request."""
+    return {"body": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+
+
+def sitemap_parts(post_count: int) -> int:
+    """Number of sitemaps needed for the posts of a shard."""
+    return ceil(post_count / SITEMAP_MAX_URLS)
+
+
+def sitemap_name(shard: str, part: int = 1) -> str:
+    """Name of a part of a shard, YYYY-MM for the first part and YYYY-MM-N
+    for the following parts."""
+    return shard if part == 1 else f"{shard}-{part}"
+
+
+def parse_sitemap_name(name: str) -> tuple[str, int]:
+    """Shard and part of a sitemap name created by sitemap_name, raise
+    ValueError if the name is invalid."""
+    shard, suffix = name[:7], name[7:]
+    shard_range(shard)
+    if not suffix:
+        return shard, 1
+    part = suffix[1:]
+    if suffix[0] != "-" or not part.isascii() or not part.isdigit():
+        raise ValueError(f"Invalid sitemap: {name}")
+    if int(part) < 2 or part[0] == "0":
+        raise ValueError(f"Invalid sitemap: {name}")
+    return shard, int(part)
+
+
+async def sitemap_index() -> AsyncIterator[bytes]:
+    """Sitemap index with one sitemap per month with public posts, or
+    several for months with more than SITEMAP_MAX_URLS posts."""
+    base_url = api_url()
+    query = """
+        SELECT shard, post_count, lastmod
+        FROM sitemap_shards
+        WHERE post_count > 0
+        ORDER BY shard
+    """
+    chunks = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n',
+        f'<sitemapindex xmlns="{SITEMAP_NAMESPACE}">\n',
+    ]
+    async for row in Database.stream(query):
+        lastmod = _iso_date(row["lastmod"])
+        for part in range(1, sitemap_parts(row["post_count"]) + 1):
+            chunks.append(
+                f"<sitemap><loc>{base_url}/sitemaps/"
+                f"{sitemap_name(row['shard'], part)}.xml</loc>"
+                f"<lastmod>{lastmod}</lastmod></sitemap>\n"
+            )
+        if len(chunks) >= SITEMAP_CHUNK_URLS:
+            yield "".join(chunks).encode("utf-8")
+            chunks = []
+    chunks.append("</sitemapindex>\n")
+    yield "".join(chunks).encode("utf-8")
+
+
+async def sitemap_shard(shard: str, part: int = 1) -> AsyncIterator[bytes]:
+    """Sitemap of a part of the public posts published in a month."""
+    base_url = api_url()
+    start, end = shard_range(shard)
+    query = """
+        SELECT p.id, COALESCE(p.updated_at, p.published_at) as lastmod
+        FROM posts p
+        WHERE p.status IN ('active', 'archived', 'expired')
+        AND p.published_at >= :start AND p.published_at < :end
+        ORDER BY p.published_at, p.id
+        LIMIT :limit OFFSET :offset
+    """
+    params = {
+        "start": start,
+        "end": end,
+        "limit": SITEMAP_MAX_URLS,
+        "offset": (part - 1) * SITEMAP_MAX_URLS,
+    }
+    chunks = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n',
+        f'<urlset xmlns="{SITEMAP_NAMESPACE}">\n',
+    ]
+    async for row in Database.stream(query, params):
+        lastmod = _iso_date(row["lastmod"])
+        chunks.append(
+            f"<url><loc>{base_url}/posts/{escape(row['id'])}</loc>"
+            + (f"<lastmod>{lastmod}</lastmod>" if lastmod else "")
+            + "</url>\n"
+        )
+        if len(chunks) >= SITEMAP_CHUNK_URLS:
+            yield "".join(chunks).encode("utf-8")
+            chunks = []
+    chunks.append("</urlset>\n")
+    yield "".join(chunks).encode("utf-8")
+
+
+async def feed_posts(slug: str, limit: int = FEED_MAX_ITEMS) -> list[dict]:
+    """Latest public posts of a blog."""
+    query = """
+        SELECT p.id, p.doi, p.url, p.title, p.summary, p.content_html,
+               p.published_at, p.updated_at, p.authors, p.tags, p.language,
+               p.image
+        FROM posts p
+        WHERE p.blog_slug = :slug
+        AND p.status IN ('active', 'archived', 'expired')
+        ORDER BY p.published_at DESC, p.id DESC
+        LIMIT :limit
+    """
+    return await Database.fetch_all(query, {"slug": slug, "limit": limit})
+
+
+def _authors(authors) -> list[dict]:
+    return [
+        {k: v for k, v in {"name": a.get("name"), "url": a.get("url")}.items() if v}
+        for a in authors or []
+        if isinstance(a, dict) and a.get("name")
+    ]
+
+
+def json_feed(blog: dict, posts: list[dict]) -> bytes:
+    """JSON Feed 1.1 of a blog."""
+    base_url = api_url()
+    feed = {
+        "version": JSON_FEED_VERSION,
+        "title": blog.get("title"),
+        "home_page_url": blog.get("home_page_url"),
+        "feed_url": f"{base_url}/blogs/{blog['slug']}/feed.json",
+        "description": blog.get("description"),
+        "favicon": blog.get("favicon"),
+        "language": blog.get("language"),
+        "authors": _authors(blog.get("authors")),
+        "items": [
+            {
+                k: v
+                for k, v in {
+                    "id": post.get("doi") or post["id"],
+                    "url": post.get("url"),
+                    "title": post.get("title"),
+                    "content_html": post.get("content_html"),
+                    "summary": post.get("summary"),
+                    "image": post.get("image"),
+                    "date_published": _iso_date(post.get("published_at")),
+                    "date_modified": _iso_date(post.get("updated_at")),
+                    "authors": _authors(post.get("authors")),
+                    "tags": post.get("tags"),
+                    "language": post.get("language"),
+                }.items()
+                if v
+            }
+            for post in posts
+        ],
+    }
+    return orjson.dumps({k: v for k, v in feed.items() if v or k == "items"})
+
+
+def atom_feed(blog: dict, posts: list[dict]) -> bytes:
+    """Atom feed of a blog."""
+    base_url = api_url()
+    feed_url = f"{base_url}/blogs/{blog['slug']}/feed.atom"
+    updated = max(
+        [post.get("updated_at") or post.get("published_at") or 0 for post in posts]
+        + [blog.get("updated_at") or 0]
+    )
+    feed = Element("feed", xmlns=ATOM_NAMESPACE)
+    if blog.get("language"):
+        feed.set("xml:lang", blog["language"])
+    SubElement(feed, "id").text = feed_url
+    SubElement(feed, "title").text = blog.get("title") or blog["slug"]
+    if blog.get("description"):
+        SubElement(feed, "subtitle").text = blog["description"]
+    SubElement(feed, "updated").text = _iso_date(updated)
+    SubElement(feed, "link", rel="self", href=feed_url)
+    if blog.get("home_page_url"):
+        SubElement(feed, "link", rel="alternate", href=blog["home_page_url"])
+    if blog.get("favicon"):
+        SubElement(feed, "icon").text = blog["favicon"]
+    for author in _authors(blog.get("authors")):
+        _atom_author(feed, author)
+    for post in posts:
+        entry = SubElement(feed, "entry")
+        SubElement(entry, "id").text = post.get("doi") or f"urn:uuid:{post['id']}"
+        SubElement(entry, "title").text = post.get("title") or ""
+        if post.get("url"):
+            SubElement(entry, "link", rel="alternate", href=post["url"])
+        SubElement(entry, "published").text = _iso_date(post.get("published_at"))
+        SubElement(entry, "updated").text = _iso_date(
+            post.get("updated_at") or post.get("published_at")
+        )
+        for author in _authors(post.get("authors")):
+            _atom_author(entry, author)
+        for tag in post.get("tags") or []:
+            SubElement(entry, "category", term=tag)
+        if post.get("summary"):
+            SubElement(entry, "summary").text = post["summary"]
+        if post.get("content_html"):
+            SubElement(entry, "content", type="html").text = post["content_html"]
+    return tostring(feed, encoding="utf-8", xml_declaration=True)
+
+
+def _atom_author(parent: Element, author: dict) -> None:
+    element = SubElement(parent, "author")
+    SubElement(element, "name").text = author["name"]
+    if author.get("url"):
+        SubElement(element, "uri").text = author["url"]
@@ -0,0 +1,68 @@
+"""JSON provider for Quart using orjson."""
+
+from __future__ import annotations
+
+from decimal import Decimal
+from typing import Any, AsyncIterator, Iterable
+
+import orjson
+from psycopg.types.json import Jsonb
+from quart.json.provider import DefaultJSONProvider
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def _default(value: Any) -> Any:
+    """Serialize types orjson doesn't support natively."""
+    if isinstance(value, Decimal):
+        integral = value.to_integral_value()
+        return int(integral) if value == integral else float(value)
+    if isinstance(value, Jsonb):
+        return value.obj
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, "__html__"):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any, *, sort_keys: bool = False, indent: bool = False) -> bytes:
+    """Serialize to JSON bytes. UUID, datetime, date and dataclasses are
+    supported natively by orjson, Decimal and Jsonb by _default."""
+    option = orjson.OPT_NON_STR_KEYS
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(obj, default=_default, option=option)
+
+
+async def ndjson_lines(
+    items: Iterable[Any], *, sort_keys: bool = False
+) -> AsyncIterator[bytes]:
+    """Serialize items as newline-delimited JSON, one line per item."""
+    for item in items:
+        yield dumps(item, sort_keys=sort_keys) + b"\n"
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider serializing with orjson, keeping the sort_keys and compact
+    settings of the default provider."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return self._dumps(obj, **kwargs).decode("utf-8")
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(
+            self._dumps(obj, indent=indent) + b"\n", mimetype=self.mimetype
+        )
+
+    def _dumps(self, obj: Any, indent: bool = False, **kwargs: Any) -> bytes:
+        return dumps(
+            obj, sort_keys=kwargs.get("sort_keys", self.sort_keys), indent=indent
+        )
@@ -59,6 +59,7 @@ from api.utils import (
     EXCLUDED_TAGS,
 )
 from api.db_client import Database, BlogsQueries, PostsQueries, CitationsQueries
+from api.cache import publish_invalidation
 
 logger = logging.getLogger(__name__)
 
@@ -169,9 +170,9 @@ async def update_all_cited_posts(
 
     # Get count of posts with citations
     count_query = """
-        SELECT COUNT(DISTINCT p.id)
+        SELECT COUNT(*)
         FROM posts p
-        INNER JOIN citations c ON p.doi = c.doi
+        WHERE p.citation_count > 0
     """
     result = await Database.fetch_one(count_query)
     total = result.get("count", 0) if result else 0
@@ -194,6 +195,7 @@ async def update_all_cited_posts(
         FROM posts p
         INNER JOIN blogs b ON p.blog_slug = b.slug
         WHERE p.status = ANY(:status)
+        AND p.citation_count > 0
         ORDER BY p.updated_at
         LIMIT :limit OFFSET :offset
     """
@@ -2377,6 +2379,12 @@ async def upsert_single_post(post, previous: str | None = None):
         if data is None:
             print("Error upserting post")
             return None
+        await publish_invalidation(
+            "post",
+            id=str(data["id"]),
+            doi=data.get("doi", None),
+            blog_slug=data.get("blog_slug", None),
+        )
 
         # Update indexed flag
         update_query = """
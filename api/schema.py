@@ -8,7 +8,10 @@ class PostQuery:
 
     query: str | None = None
     tags: str | None = None
+    tags_match: str | None = "any"
     language: str | None = None
+    published_since: str | None = None
+    published_until: str | None = None
     page: int | None = 1
     per_page: int | None = 10
     sort: str | None = None
@@ -121,6 +124,8 @@ class Post:
     topic_validated: bool | None = None
     status: str = "active"
     version: str | None = None
+    citation_count: int = 0
+    last_citation_at: float | None = None
     id: str | None = None
     blog: dict | None = None
 
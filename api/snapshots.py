@@ -0,0 +1,347 @@
+"""Columnar snapshots of posts, blogs and citations as Parquet files.
+
+A snapshot is a directory named by its creation time, with a manifest and
+one Parquet file per table, posts partitioned by year of publication:
+
+    <QUART_SNAPSHOT_DIR>/20240102T030405Z/
+        manifest.json
+        blogs.parquet
+        citations.parquet
+        posts/year=2023/part-0.parquet
+        posts/year=2024/part-0.parquet
+
+Tables are read from server-side cursors in one REPEATABLE READ transaction,
+so they are consistent with each other, and written in batches, so memory
+use doesn't depend on the size of the archive. Timestamps are unix seconds
+and JSON columns are JSON strings. Requires pyarrow (the snapshots extra).
+
+Snapshots are written in the background by POST /snapshots, or from the
+command line, e.g. by a scheduled job:
+
+    python scripts/write_snapshot.py [--content-html]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import shutil
+from datetime import datetime, timezone
+from os import environ
+from typing import Any
+
+import orjson
+
+from api.db_client import Database, Snapshot
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_BATCH_SIZE = 10000
+MANIFEST = "manifest.json"
+
+# Hive partition value for posts without publication date
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+# (column, SQL expression, Arrow type) per table, the SQL expressions are cast
+# to match the Arrow types
+POSTS_COLUMNS = [
+    ("id", "p.id::text", "string"),
+    ("guid", "p.guid", "string"),
+    ("doi", "p.doi", "string"),
+    ("parent_doi", "p.parent_doi", "string"),
+    ("url", "p.url", "string"),
+    ("archive_url", "p.archive_url", "string"),
+    ("title", "p.title", "string"),
+    ("summary", "p.summary", "string"),
+    ("abstract", "p.abstract", "string"),
+    ("published_at", "p.published_at::float8", "float64"),
+    ("updated_at", "p.updated_at::float8", "float64"),
+    ("registered_at", "p.registered_at::float8", "float64"),
+    ("indexed_at", "p.indexed_at::float8", "float64"),
+    ("indexed", "p.indexed", "bool"),
+    ("authors", "p.authors::text", "string"),
+    ("image", "p.image", "string"),
+    ("images", "p.images::text", "string"),
+    ("tags", "p.tags::text[]", "list<string>"),
+    ("language", "p.language", "string"),
+    ("reference", "p.reference::text", "string"),
+    ("relationships", "p.relationships::text", "string"),
+    ("funding_references", "p.funding_references::text", "string"),
+    ("blog_name", "p.blog_name", "string"),
+    ("blog_slug", "p.blog_slug", "string"),
+    ("rid", "p.rid", "string"),
+    ("version", "p.version::text", "string"),
+    ("status", "p.status", "string"),
+    ("topic", "p.topic", "string"),
+    ("topic_score", "p.topic_score::float8", "float64"),
+    ("subfield", "p.subfield", "string"),
+    ("citation_count", "p.citation_count::int8", "int64"),
+    ("last_citation_at", "p.last_citation_at::float8", "float64"),
+]
+CONTENT_HTML_COLUMN = ("content_html", "p.content_html", "string")
+
+BLOGS_COLUMNS = [
+    ("slug", "b.slug", "string"),
+    ("title", "b.title", "string"),
+    ("description", "b.description", "string"),
+    ("language", "b.language", "string"),
+    ("favicon", "b.favicon", "string"),
+    ("feed_url", "b.feed_url", "string"),
+    ("feed_format", "b.feed_format", "string"),
+    ("home_page_url", "b.home_page_url", "string"),
+    ("generator", "b.generator", "string"),
+    ("category", "b.category", "string"),
+    ("subfield", "b.subfield", "string"),
+    ("prefix", "b.prefix", "string"),
+    ("status", "b.status", "string"),
+    ("license", "b.license", "string"),
+    ("issn", "b.issn", "string"),
+    ("doi", "b.doi", "string"),
+    ("authors", "b.authors::text", "string"),
+    ("funding", "b.funding::text", "string"),
+    ("community_id", "b.community_id::text", "string"),
+    ("ror", "b.ror", "string"),
+    ("mastodon", "b.mastodon", "string"),
+    ("archive_collection", "b.archive_collection::int8", "int64"),
+    ("registered_at", "b.registered_at::float8", "float64"),
+    ("created_at", "b.created_at::float8", "float64"),
+    ("updated_at", "b.updated_at::float8", "float64"),
+]
+
+CITATIONS_COLUMNS = [
+    ("cid", "c.cid", "string"),
+    ("doi", "c.doi", "string"),
+    ("citation", "c.citation", "string"),
+    ("unstructured", "c.unstructured", "string"),
+    ("validated", "c.validated", "bool"),
+    ("type", "c.type", "string"),
+    ("cito", "c.cito::text", "string"),
+    ("blog_slug", "c.blog_slug", "string"),
+    ("published_at", "c.published_at::text", "string"),
+    ("updated_at", "EXTRACT(EPOCH FROM c.updated_at)::float8", "float64"),
+]
+
+
+def _snapshot_dir() -> str:
+    return environ.get("QUART_SNAPSHOT_DIR", "snapshots")
+
+
+def _import_pyarrow():
+    """Import pyarrow, an optional dependency only needed for snapshots."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError(
+            "Snapshots require pyarrow, install rogue-scholar-api[snapshots]."
+        ) from e
+    return pyarrow, pyarrow.parquet
+
+
+def _arrow_schema(pa, columns: list[tuple[str, str, str]]):
+    types = {
+        "string": pa.string(),
+        "float64": pa.float64(),
+        "int64": pa.int64(),
+        "bool": pa.bool_(),
+        "list<string>": pa.list_(pa.string()),
+    }
+    return pa.schema([(name, types[type_]) for name, _, type_ in columns])
+
+
+def _select(columns: list[tuple[str, str, str]]) -> str:
+    return ", ".join(f"{expression} as {name}" for name, expression, _ in columns)
+
+
+class _ParquetFile:
+    """Parquet file written one record batch at a time, in a thread."""
+
+    def __init__(self, pa, pq, schema, path: str):
+        self.pa = pa
+        self.schema = schema
+        self.path = path
+        self.rows = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._writer = pq.ParquetWriter(path, schema, compression="zstd")
+
+    async def write(self, rows: list[dict]) -> None:
+        def _write():
+            batch = self.pa.RecordBatch.from_pylist(rows, schema=self.schema)
+            self._writer.write_batch(batch)
+
+        await asyncio.to_thread(_write)
+        self.rows += len(rows)
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self._writer.close)
+
+
+async def _write_table(
+    db: Snapshot, pa, pq, root: str, name: str, columns: list, query: str
+) -> list[dict]:
+    """Write a table to a single Parquet file."""
+    output = _ParquetFile(
+        pa, pq, _arrow_schema(pa, columns), os.path.join(root, f"{name}.parquet")
+    )
+    batch = []
+    try:
+        async for row in db.stream(query, batch_size=SNAPSHOT_BATCH_SIZE):
+            batch.append(row)
+            if len(batch) >= SNAPSHOT_BATCH_SIZE:
+                await output.write(batch)
+                batch = []
+        if batch:
+            await output.write(batch)
+    finally:
+        await output.close()
+    return [_file_entry(root, output)]
+
+
+async def _write_posts(
+    db: Snapshot, pa, pq, root: str, include_content_html: bool
+) -> list[dict]:
+    """Write public posts to one Parquet file per year of publication. Posts
+    are read ordered by year, so only one file is open at a time."""
+    columns = POSTS_COLUMNS + ([CONTENT_HTML_COLUMN] if include_content_html else [])
+    schema = _arrow_schema(pa, columns)
+    query = f"""
+        SELECT {_select(columns)},
+               EXTRACT(YEAR FROM to_timestamp(p.published_at) AT TIME ZONE 'UTC')::int
+                   as year
+        FROM posts p
+        WHERE p.status IN ('active', 'archived', 'expired')
+        ORDER BY year NULLS LAST, p.published_at, p.id
+    """
+    files = []
+    output = None
+    year = None
+    batch = []
+    try:
+        async for row in db.stream(query, batch_size=SNAPSHOT_BATCH_SIZE):
+            row_year = row.pop("year")
+            if output is None or row_year != year:
+                if output is not None:
+                    if batch:
+                        await output.write(batch)
+                    await output.close()
+                    files.append(_file_entry(root, output))
+                    batch = []
+                year = row_year
+                partition = f"year={NULL_PARTITION if year is None else year}"
+                output = _ParquetFile(
+                    pa,
+                    pq,
+                    schema,
+                    os.path.join(root, "posts", partition, "part-0.parquet"),
+                )
+            batch.append(row)
+            if len(batch) >= SNAPSHOT_BATCH_SIZE:
+                await output.write(batch)
+                batch = []
+        if output is not None:
+            if batch:
+                await output.write(batch)
+            await output.close()
+            files.append(_file_entry(root, output))
+            output = None
+    finally:
+        if output is not None:
+            await output.close()
+    return files
+
+
+def _file_entry(root: str, output: _ParquetFile) -> dict:
+    return {
+        "path": os.path.relpath(output.path, root),
+        "rows": output.rows,
+        "bytes": os.path.getsize(output.path),
+    }
+
+
+async def write_snapshot(include_content_html: bool = False) -> dict:
+    """Write a snapshot of posts, blogs and citations, and remove all but the
+    QUART_SNAPSHOT_KEEP (default 2) latest snapshots. The snapshot is written
+    to a temporary directory and renamed when complete, so incomplete
+    snapshots are never served. Returns the manifest."""
+    pa, pq = _import_pyarrow()
+    created_at = datetime.now(timezone.utc)
+    name = created_at.strftime("%Y%m%dT%H%M%SZ")
+    snapshot_dir = _snapshot_dir()
+    root = os.path.join(snapshot_dir, name)
+    tmp = os.path.join(snapshot_dir, f".{name}")
+    os.makedirs(tmp, exist_ok=True)
+    try:
+        async with Database.snapshot() as db:
+            files = await _write_posts(db, pa, pq, tmp, include_content_html)
+            files += await _write_table(
+                db,
+                pa,
+                pq,
+                tmp,
+                "blogs",
+                BLOGS_COLUMNS,
+                f"SELECT {_select(BLOGS_COLUMNS)} FROM blogs b ORDER BY b.slug",
+            )
+            files += await _write_table(
+                db,
+                pa,
+                pq,
+                tmp,
+                "citations",
+                CITATIONS_COLUMNS,
+                f"""
+                    SELECT {_select(CITATIONS_COLUMNS)}
+                    FROM citations c
+                    ORDER BY c.doi, c.cid
+                """,
+            )
+        manifest = {
+            "name": name,
+            "created_at": created_at.isoformat(),
+            "content_html": include_content_html,
+            "files": files,
+        }
+        with open(os.path.join(tmp, MANIFEST), "wb") as f:
+            f.write(orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
+        os.rename(tmp, root)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    keep = int(environ.get("QUART_SNAPSHOT_KEEP", "2"))
+    for old in _snapshot_names()[keep:]:
+        shutil.rmtree(os.path.join(snapshot_dir, old), ignore_errors=True)
+    logger.info(f"Wrote snapshot {name} with {len(files)} files")
+    return manifest
+
+
+def _snapshot_names() -> list[str]:
+    """Names of the complete snapshots, latest first."""
+    snapshot_dir = _snapshot_dir()
+    if not os.path.isdir(snapshot_dir):
+        return []
+    return sorted(
+        (
+            entry.name
+            for entry in os.scandir(snapshot_dir)
+            if entry.is_dir() and not entry.name.startswith(".")
+        ),
+        reverse=True,
+    )
+
+
+def latest_snapshot() -> dict | None:
+    """Manifest of the latest snapshot, or None if there is none."""
+    names = _snapshot_names()
+    if not names:
+        return None
+    with open(os.path.join(_snapshot_dir(), names[0], MANIFEST), "rb") as f:
+        return orjson.loads(f.read())
+
+
+def snapshot_file_path(manifest: dict[str, Any], path: str) -> str | None:
+    """Path of a file listed in the manifest of a snapshot, or None, so that
+    only snapshot files can be downloaded."""
+    if path != MANIFEST and path not in {f["path"] for f in manifest["files"]}:
+        return None
+    return os.path.join(_snapshot_dir(), manifest["name"], path)
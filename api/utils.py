@@ -6,8 +6,10 @@ from os import environ, path
 from urllib.parse import urlparse
 import os
 import re
+import asyncio
 import shutil
 import tempfile
+import threading
 import time
 import logging
 from babel.dates import format_date
@@ -24,6 +26,8 @@ from langdetect import detect_langs
 from bs4 import BeautifulSoup
 import httpx
 from lxml import etree
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_options_header
 from commonmeta import (
     Metadata,
     get_one_author,
@@ -35,6 +39,15 @@ from commonmeta import (
     extract_url,
     replace_curie,
 )
+from citeproc import (
+    Citation,
+    CitationItem,
+    CitationStylesBibliography,
+    CitationStylesStyle,
+    formatter,
+)
+from citeproc.source.json import CiteProcJSON
+from citeproc_styles import get_style_filepath
 from commonmeta.constants import Commonmeta
 from commonmeta.date_utils import get_date_from_unix_timestamp
 from commonmeta.doi_utils import validate_prefix, get_doi_ra
@@ -44,6 +57,8 @@ from nameparser import HumanName
 import frontmatter
 import pypandoc
 
+from api.db_client import Database
+
 logger = logging.getLogger(__name__)
 
 
@@ -6622,7 +6637,8 @@ def convert_to_commonmeta(meta: dict) -> Commonmeta:
     identifier_type = "ISSN" if identifier else None
     subjects = py_.human_case(py_.get(meta, "blog.category"))
     publisher = py_.get(meta, "blog.title")
-    provider = get_known_doi_ra(doi) or get_doi_ra(doi)
+    # resolved by the caller with resolve_doi_ra, no network access here
+    provider = get_known_doi_ra(doi)
     alternate_identifiers = [
         {"alternateIdentifier": meta.get("id"), "alternateIdentifierType": "UUID"}
     ]
@@ -6788,6 +6804,78 @@ def get_formatted_metadata(
     return {"doi": doi, "data": result_str.strip(), "options": options}
 
 
+# formats of /posts/bibliography, with content type and file extension
+BIBLIOGRAPHY_FORMATS = {
+    "citation": ("text/x-bibliography", "txt"),
+    "bibtex": ("application/x-bibtex", "bib"),
+    "ris": ("application/x-research-info-systems", "ris"),
+    "csl": ("application/vnd.citationstyles.csl+json", "json"),
+}
+
+# citeproc styles are not meant to be rendered from several threads at once
+_csl_style_lock = threading.Lock()
+
+
+@lru_cache(maxsize=32)
+def get_csl_style(style: str = "apa", locale: str = "en-US") -> CitationStylesStyle:
+    """Parse a CSL style and locale once, raise StyleNotFoundError if the
+    style is unknown."""
+    return CitationStylesStyle(get_style_filepath(style), locale=locale)
+
+
+def format_bibliography(
+    metas: list[dict],
+    format_: str = "citation",
+    style: str = "apa",
+    locale: str = "en-US",
+) -> dict:
+    """Render a list of commonmeta metadata as one bibliography, formatted as
+    citation (sorted as defined by the style), bibtex, ris or csl (a JSON
+    array). Entries that can't be rendered are skipped. Blocking, run in a
+    worker thread."""
+    content_type, ext = BIBLIOGRAPHY_FORMATS[format_]
+    if format_ == "citation":
+        content_type = f"{content_type}; style={style}; locale={locale}"
+    options = {
+        "Content-Type": content_type,
+        "Content-Disposition": f"attachment; filename=bibliography.{ext}",
+    }
+    if format_ in ["bibtex", "ris"]:
+        entries = [get_formatted_metadata(meta, format_)["data"] for meta in metas]
+        return {"data": "\n\n".join(entries), "options": options}
+
+    items = []
+    for meta in metas:
+        subject = Metadata(meta, via="commonmeta")
+        csl = subject.write(to="csl") if subject.write_errors is None else None
+        if not csl:
+            continue
+        item = JSON.loads(csl)
+        item["type"] = "article"
+        items.append(item)
+    if format_ == "csl":
+        return {"data": JSON.dumps(items, ensure_ascii=False), "options": options}
+
+    # one bibliography with all entries, so the style is applied only once.
+    # Keys not supported by citeproc-py are removed.
+    keys = list(dict.fromkeys(str(item["id"]) for item in items))
+    source = CiteProcJSON([py_.omit(item, "copyright", "categories") for item in items])
+    with _csl_style_lock:
+        bib = CitationStylesBibliography(
+            get_csl_style(style, locale), source, formatter.html
+        )
+        for key in keys:
+            bib.register(Citation([CitationItem(key)]))
+        entries = [_clean_citation(str(entry)) for entry in bib.bibliography()]
+    return {"data": "\n\n".join(entries), "options": options}
+
+
+def _clean_citation(text: str) -> str:
+    """Remove double spaces and punctuation, as the commonmeta citation writer."""
+    text = re.sub(r"\s\s+", " ", text)
+    return re.sub(r"\.\. ", ". ", text)
+
+
 def normalize_url(url: str | None, secure=False, lower=False) -> str | None:
     """Normalize URL"""
     if url is None or not isinstance(url, str):
@@ -7100,31 +7188,119 @@ def format_markdown(content: str, metadata) -> frontmatter.Post:
     return post
 
 
+# DOI registration agencies by prefix, seeded with the prefixes used in Rogue Scholar.
+# Other prefixes are looked up once via the DOI RA API and persisted in the
+# doi_prefixes table, so that the lookup is not repeated for every request.
+DOI_RA_REGISTRY = {
+    "10.53731": "Crossref",
+    "10.54900": "Crossref",
+    "10.59348": "Crossref",
+    "10.59349": "Crossref",
+    "10.59350": "Crossref",
+    "10.34732": "DataCite",
+    "10.57689": "DataCite",
+    "10.58079": "DataCite",
+    "10.71938": "DataCite",
+}
+DOI_RA_TTL = 90 * 24 * 60 * 60  # 90 days
+# DOI RA API lookups at the same time when warming the registry
+DOI_RA_LOOKUP_CONCURRENCY = 4
+
+_doi_ra_lookups: dict[str, asyncio.Task] = {}
+
+
 def get_known_doi_ra(doi: str) -> str | None:
-    """Get DOI registration agency from prefixes used in Rogue Scholar"""
-    crossref_prefixes = [
-        "10.53731",
-        "10.54900",
-        "10.59348",
-        "10.59349",
-        "10.59350",
-    ]
-    datacite_prefixes = [
-        "10.34732",
-        "10.57689",
-        "10.58079",
-        "10.71938",
-    ]
+    """Get DOI registration agency from the prefix registry, without network access"""
     if doi is None:
         return None
     prefix = validate_prefix(doi)
     if prefix is None:
         return None
-    if prefix in crossref_prefixes:
-        return "Crossref"
-    if prefix in datacite_prefixes:
-        return "DataCite"
-    return None
+    return DOI_RA_REGISTRY.get(prefix, None)
+
+
+def lookup_doi_ra(doi: str) -> str | None:
+    """Get DOI registration agency via the DOI RA API and remember it for the prefix"""
+    prefix = validate_prefix(doi) if doi else None
+    if prefix is None:
+        return None
+    ra = get_doi_ra(prefix)
+    if ra is not None:
+        DOI_RA_REGISTRY[prefix] = ra
+    return ra
+
+
+async def resolve_doi_ra(doi: str | None) -> str | None:
+    """Get DOI registration agency, looking up unknown prefixes only once.
+    The DOI RA API call runs in a worker thread, concurrent requests for the
+    same prefix share the lookup, and the result is persisted for other workers."""
+    prefix = validate_prefix(doi) if doi else None
+    if prefix is None:
+        return None
+    ra = DOI_RA_REGISTRY.get(prefix, None)
+    if ra is not None:
+        return ra
+    task = _doi_ra_lookups.get(prefix, None)
+    if task is None:
+        task = asyncio.create_task(_lookup_and_store_doi_ra(prefix))
+        _doi_ra_lookups[prefix] = task
+        task.add_done_callback(lambda _: _doi_ra_lookups.pop(prefix, None))
+    return await asyncio.shield(task)
+
+
+async def _lookup_and_store_doi_ra(prefix: str) -> str | None:
+    """Look up DOI registration agency for a prefix and persist it."""
+    try:
+        ra = await asyncio.to_thread(lookup_doi_ra, prefix)
+    except Exception as error:
+        logger.warning(f"DOI RA lookup failed for {prefix}: {error}")
+        return None
+    if ra is None:
+        return None
+    query = """
+        INSERT INTO doi_prefixes (prefix, ra, updated_at)
+        VALUES (:prefix, :ra, NOW())
+        ON CONFLICT (prefix) DO UPDATE SET
+            ra = EXCLUDED.ra,
+            updated_at = EXCLUDED.updated_at
+    """
+    try:
+        await Database.execute(query, {"prefix": prefix, "ra": ra})
+    except Exception as error:
+        logger.warning(f"Could not persist DOI RA for {prefix}: {error}")
+    return ra
+
+
+async def load_doi_ra_registry() -> int:
+    """Load persisted DOI registration agencies into the registry, then resolve
+    the prefixes of all blogs not seen before. Entries older than DOI_RA_TTL
+    are ignored and looked up again."""
+    query = """
+        SELECT prefix, ra
+        FROM doi_prefixes
+        WHERE updated_at > NOW() - make_interval(secs => :ttl)
+    """
+    rows = await Database.fetch_all(query, {"ttl": DOI_RA_TTL})
+    for row in rows:
+        DOI_RA_REGISTRY[row["prefix"]] = row["ra"]
+
+    query = """
+        SELECT DISTINCT prefix
+        FROM blogs
+        WHERE prefix IS NOT NULL
+    """
+    blogs = await Database.fetch_all(query)
+    prefixes = [
+        blog["prefix"] for blog in blogs if blog["prefix"] not in DOI_RA_REGISTRY
+    ]
+    semaphore = asyncio.Semaphore(DOI_RA_LOOKUP_CONCURRENCY)
+
+    async def resolve_with_semaphore(prefix: str) -> str | None:
+        async with semaphore:
+            return await resolve_doi_ra(prefix)
+
+    await asyncio.gather(*[resolve_with_semaphore(prefix) for prefix in prefixes])
+    return len(DOI_RA_REGISTRY)
 
 
 def translate_titles(markdown):
@@ -7195,6 +7371,35 @@ SUPPORTED_ACCEPT_HEADERS = [
     "text/x-bibliography",
 ]
 
+# formats of post metadata by media type, for content negotiation
+ACCEPT_HEADER_FORMATS = {
+    "application/json": "json",
+    "application/vnd.commonmeta+json": "commonmeta",
+    "application/x-bibtex": "bibtex",
+    "application/x-research-info-systems": "ris",
+    "application/vnd.citationstyles.csl+json": "csl",
+    "application/vnd.schemaorg.ld+json": "schema_org",
+    "application/vnd.datacite.datacite+json": "datacite",
+    "application/vnd.crossref.unixref+xml": "crossref_xml",
+    "text/x-bibliography": "citation",
+}
+
+
+def negotiate_format(accept: list[tuple[str, float]]) -> tuple[str, dict]:
+    """Get the format of post metadata preferred in an Accept header, by
+    q-value and specificity, with the parameters of its media type, e.g. style
+    and locale of text/x-bibliography. Defaults to json."""
+    media_types, params = [], {}
+    for value, quality in accept:
+        mimetype, options = parse_options_header(value)
+        mimetype = mimetype.lower()
+        media_types.append((mimetype, quality))
+        params.setdefault(mimetype, options)
+    best = MIMEAccept(media_types).best_match(
+        list(ACCEPT_HEADER_FORMATS), "application/json"
+    )
+    return ACCEPT_HEADER_FORMATS[best], params.get(best, {})
+
 
 async def get_single_work(string: str) -> dict | None:
     """Get single work from in commonmeta format."""
@@ -7211,17 +7416,9 @@ def get_formatted_work(
     subject, accept_header: str, style: str = "apa", locale: str = "en-US"
 ):
     """Get formatted work."""
-    accept_headers = {
-        "application/vnd.commonmeta+json": "commonmeta",
-        "application/x-bibtex": "bibtex",
-        "application/x-research-info-systems": "ris",
-        "application/vnd.citationstyles.csl+json": "csl",
-        "application/vnd.schemaorg.ld+json": "schema_org",
-        "application/vnd.datacite.datacite+json": "datacite",
-        "application/vnd.crossref.unixref+xml": "crossref_xml",
-        "text/x-bibliography": "citation",
-    }
-    content_type = accept_headers.get(accept_header, "commonmeta")
+    content_type = ACCEPT_HEADER_FORMATS.get(accept_header, "commonmeta")
+    if content_type == "json":
+        content_type = "commonmeta"
     if content_type == "citation":
         return subject.write(to="citation", style=style, locale=locale)
     else:
@@ -0,0 +1,7 @@
+-- DOI registration agency by prefix, looked up once via the DOI RA API
+-- and shared by all API workers (see api.utils.resolve_doi_ra).
+CREATE TABLE IF NOT EXISTS doi_prefixes (
+    prefix text PRIMARY KEY,
+    ra text NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT NOW()
+);
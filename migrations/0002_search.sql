@@ -0,0 +1,91 @@
+-- Indexed search for /posts and /blogs: a weighted tsvector over title,
+-- abstract, tags and author names with a GIN index, built with the text
+-- search configuration matching the post language, plus trigram indexes
+-- for fuzzy title matches.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE OR REPLACE FUNCTION posts_search_config(language text)
+RETURNS regconfig
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT CASE language
+        WHEN 'da' THEN 'danish'
+        WHEN 'de' THEN 'german'
+        WHEN 'en' THEN 'english'
+        WHEN 'es' THEN 'spanish'
+        WHEN 'fi' THEN 'finnish'
+        WHEN 'fr' THEN 'french'
+        WHEN 'hu' THEN 'hungarian'
+        WHEN 'it' THEN 'italian'
+        WHEN 'nl' THEN 'dutch'
+        WHEN 'no' THEN 'norwegian'
+        WHEN 'pt' THEN 'portuguese'
+        WHEN 'ro' THEN 'romanian'
+        WHEN 'ru' THEN 'russian'
+        WHEN 'sv' THEN 'swedish'
+        WHEN 'tr' THEN 'turkish'
+        ELSE 'simple'
+    END::regconfig
+$$;
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+-- Unstemmed ('simple') lexemes match exact terms in any language, stemmed
+-- lexemes in the post language match inflected forms.
+CREATE OR REPLACE FUNCTION posts_search_vector_update()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    config regconfig := posts_search_config(NEW.language);
+    keywords text := COALESCE(array_to_string(NEW.tags, ' '), '');
+    authors text := '';
+    body text := COALESCE(NEW.abstract, NEW.summary, '');
+BEGIN
+    IF jsonb_typeof(NEW.authors) = 'array' THEN
+        SELECT COALESCE(string_agg(author->>'name', ' '), '')
+        INTO authors
+        FROM jsonb_array_elements(NEW.authors) AS author;
+    END IF;
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', COALESCE(NEW.title, '')), 'A') ||
+        setweight(to_tsvector(config, COALESCE(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('simple', keywords || ' ' || authors), 'B') ||
+        setweight(to_tsvector('simple', body), 'C') ||
+        setweight(to_tsvector(config, body), 'C');
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS posts_search_vector_trigger ON posts;
+CREATE TRIGGER posts_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, abstract, summary, tags, authors, language
+    ON posts
+    FOR EACH ROW EXECUTE FUNCTION posts_search_vector_update();
+
+-- backfill existing posts in batches of 1000, committing after each batch
+-- instead of rewriting all posts in one transaction, so this file has to run
+-- outside of a transaction block
+DO $$
+DECLARE
+    last_id uuid := '00000000-0000-0000-0000-000000000000';
+    batch uuid[];
+BEGIN
+    LOOP
+        SELECT array_agg(id ORDER BY id) INTO batch
+        FROM (
+            SELECT id FROM posts WHERE id > last_id ORDER BY id LIMIT 1000
+        ) p;
+        EXIT WHEN batch IS NULL;
+        UPDATE posts SET title = title
+        WHERE id = ANY(batch) AND search_vector IS NULL;
+        last_id := batch[array_length(batch, 1)];
+        COMMIT;
+    END LOOP;
+END
+$$;
+
+CREATE INDEX IF NOT EXISTS posts_search_vector_idx
+    ON posts USING gin (search_vector);
+CREATE INDEX IF NOT EXISTS posts_title_trgm_idx
+    ON posts USING gin (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS blogs_title_trgm_idx
+    ON blogs USING gin (title gin_trgm_ops);
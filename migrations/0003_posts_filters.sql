@@ -0,0 +1,35 @@
+-- Indexes for the /posts filters: tags (any-of with &&, all-of with @>),
+-- and the sort keys published_at, updated_at, title and topic_score, alone
+-- and combined with the blog_slug filter. The sort indexes are partial on
+-- the public statuses and end with id, the tiebreaker of every sort, so
+-- they return rows in sort order in both directions. Queries must use the
+-- same literal status predicate for the planner to pick them.
+CREATE INDEX IF NOT EXISTS posts_tags_idx
+    ON posts USING gin (tags);
+
+DROP INDEX IF EXISTS posts_status_published_at_idx;
+DROP INDEX IF EXISTS posts_status_updated_at_idx;
+DROP INDEX IF EXISTS posts_status_title_idx;
+DROP INDEX IF EXISTS posts_status_topic_score_idx;
+DROP INDEX IF EXISTS posts_blog_slug_status_published_at_idx;
+DROP INDEX IF EXISTS posts_blog_slug_status_updated_at_idx;
+
+CREATE INDEX IF NOT EXISTS posts_public_published_at_idx
+    ON posts (published_at, id)
+    WHERE status IN ('active', 'archived', 'expired');
+CREATE INDEX IF NOT EXISTS posts_public_updated_at_idx
+    ON posts (updated_at, id)
+    WHERE status IN ('active', 'archived', 'expired');
+CREATE INDEX IF NOT EXISTS posts_public_title_idx
+    ON posts (title, id)
+    WHERE status IN ('active', 'archived', 'expired');
+CREATE INDEX IF NOT EXISTS posts_public_topic_score_idx
+    ON posts (topic_score, id)
+    WHERE status IN ('active', 'archived', 'expired');
+
+CREATE INDEX IF NOT EXISTS posts_blog_slug_public_published_at_idx
+    ON posts (blog_slug, published_at, id)
+    WHERE status IN ('active', 'archived', 'expired');
+CREATE INDEX IF NOT EXISTS posts_blog_slug_public_updated_at_idx
+    ON posts (blog_slug, updated_at, id)
+    WHERE status IN ('active', 'archived', 'expired');
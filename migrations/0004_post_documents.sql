@@ -0,0 +1,145 @@
+-- Read model for single-post lookups: the post with its citations,
+-- assembled once and kept up to date by triggers on posts and citations, so
+-- that reads are a primary key (or DOI) lookup. The blog isn't embedded but
+-- joined when reading (see api.db_client), so that a blog update doesn't
+-- rebuild the documents of all its posts.
+CREATE TABLE IF NOT EXISTS post_documents (
+    id uuid PRIMARY KEY REFERENCES posts (id) ON DELETE CASCADE,
+    doi text,
+    blog_slug text,
+    document jsonb NOT NULL,
+    refreshed_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS post_documents_doi_idx
+    ON post_documents (doi);
+
+-- (re)build the documents of the given posts, rows whose document did not
+-- change are left alone, so refreshed_at can be used as version
+CREATE OR REPLACE FUNCTION refresh_post_documents(post_ids uuid[])
+RETURNS void
+LANGUAGE sql AS $$
+    INSERT INTO post_documents (id, doi, blog_slug, document, refreshed_at)
+    SELECT d.id, d.doi, d.blog_slug, to_jsonb(d), now()
+    FROM (
+        SELECT p.id, p.guid, p.doi, p.parent_doi, p.url, p.archive_url,
+               p.title, p.summary, p.abstract, p.published_at, p.updated_at,
+               p.registered_at, p.indexed_at, p.indexed, p.authors, p.image,
+               p.images, p.tags, p.language, p.reference, p.relationships,
+               p.funding_references, p.blog_name, p.blog_slug, p.content_html,
+               p.rid, p.version, p.status, p.topic, p.topic_score, p.subfield,
+               (
+                   SELECT json_agg(row_to_json(c.*))
+                   FROM citations c
+                   WHERE c.doi = p.doi AND c.cid IS NOT NULL
+               ) as citations
+        FROM posts p
+        WHERE p.id = ANY(post_ids)
+    ) d
+    ON CONFLICT (id) DO UPDATE
+    SET doi = EXCLUDED.doi,
+        blog_slug = EXCLUDED.blog_slug,
+        document = EXCLUDED.document,
+        refreshed_at = EXCLUDED.refreshed_at
+    WHERE post_documents.document IS DISTINCT FROM EXCLUDED.document;
+$$;
+
+-- statement-level triggers, so bulk upserts refresh their posts in one pass,
+-- updates only rebuild the documents of posts that actually changed
+
+CREATE OR REPLACE FUNCTION post_documents_posts_changed()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM refresh_post_documents(ARRAY(
+            SELECT n.id
+            FROM changed_rows n
+            JOIN previous_rows o ON o.id = n.id
+            WHERE n IS DISTINCT FROM o
+        ));
+    ELSE
+        PERFORM refresh_post_documents(ARRAY(SELECT id FROM changed_rows));
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS post_documents_posts_insert ON posts;
+CREATE TRIGGER post_documents_posts_insert
+    AFTER INSERT ON posts
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION post_documents_posts_changed();
+
+DROP TRIGGER IF EXISTS post_documents_posts_update ON posts;
+CREATE TRIGGER post_documents_posts_update
+    AFTER UPDATE ON posts
+    REFERENCING NEW TABLE AS changed_rows OLD TABLE AS previous_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION post_documents_posts_changed();
+
+CREATE OR REPLACE FUNCTION post_documents_citations_changed()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM refresh_post_documents(ARRAY(
+            SELECT p.id
+            FROM posts p
+            WHERE p.doi IN (
+                SELECT doi FROM changed_rows
+                UNION
+                SELECT doi FROM previous_rows
+            )
+        ));
+    ELSE
+        PERFORM refresh_post_documents(ARRAY(
+            SELECT p.id
+            FROM posts p
+            WHERE p.doi IN (SELECT doi FROM changed_rows)
+        ));
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS post_documents_citations_insert ON citations;
+CREATE TRIGGER post_documents_citations_insert
+    AFTER INSERT ON citations
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION post_documents_citations_changed();
+
+DROP TRIGGER IF EXISTS post_documents_citations_update ON citations;
+CREATE TRIGGER post_documents_citations_update
+    AFTER UPDATE ON citations
+    REFERENCING NEW TABLE AS changed_rows OLD TABLE AS previous_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION post_documents_citations_changed();
+
+DROP TRIGGER IF EXISTS post_documents_citations_delete ON citations;
+CREATE TRIGGER post_documents_citations_delete
+    AFTER DELETE ON citations
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION post_documents_citations_changed();
+
+-- backfill posts without document in batches of 1000, committing after each
+-- batch instead of rebuilding all documents in one transaction, so this file
+-- has to run outside of a transaction block
+DO $$
+DECLARE
+    last_id uuid := '00000000-0000-0000-0000-000000000000';
+    batch uuid[];
+BEGIN
+    LOOP
+        SELECT array_agg(id ORDER BY id) INTO batch
+        FROM (
+            SELECT id FROM posts WHERE id > last_id ORDER BY id LIMIT 1000
+        ) p;
+        EXIT WHEN batch IS NULL;
+        PERFORM refresh_post_documents(ARRAY(
+            SELECT id FROM unnest(batch) AS b(id)
+            WHERE NOT EXISTS (SELECT 1 FROM post_documents d WHERE d.id = b.id)
+        ));
+        last_id := batch[array_length(batch, 1)];
+        COMMIT;
+    END LOOP;
+END
+$$;
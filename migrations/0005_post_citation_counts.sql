@@ -0,0 +1,137 @@
+-- Number of citations and time of the latest citation per post (as unix
+-- timestamp, like the other post times), maintained by statement triggers on
+-- citations in the same statement that writes them, so that cited posts can
+-- be listed and counted with an index scan instead of joining and
+-- aggregating citations.
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS citation_count integer NOT NULL DEFAULT 0;
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS last_citation_at double precision;
+
+-- include the citation count in post documents
+CREATE OR REPLACE FUNCTION refresh_post_documents(post_ids uuid[])
+RETURNS void
+LANGUAGE sql AS $$
+    INSERT INTO post_documents (id, doi, blog_slug, document, refreshed_at)
+    SELECT d.id, d.doi, d.blog_slug, to_jsonb(d), now()
+    FROM (
+        SELECT p.id, p.guid, p.doi, p.parent_doi, p.url, p.archive_url,
+               p.title, p.summary, p.abstract, p.published_at, p.updated_at,
+               p.registered_at, p.indexed_at, p.indexed, p.authors, p.image,
+               p.images, p.tags, p.language, p.reference, p.relationships,
+               p.funding_references, p.blog_name, p.blog_slug, p.content_html,
+               p.rid, p.version, p.status, p.topic, p.topic_score, p.subfield,
+               p.citation_count, p.last_citation_at,
+               (
+                   SELECT json_agg(row_to_json(c.*))
+                   FROM citations c
+                   WHERE c.doi = p.doi AND c.cid IS NOT NULL
+               ) as citations
+        FROM posts p
+        WHERE p.id = ANY(post_ids)
+    ) d
+    ON CONFLICT (id) DO UPDATE
+    SET doi = EXCLUDED.doi,
+        blog_slug = EXCLUDED.blog_slug,
+        document = EXCLUDED.document,
+        refreshed_at = EXCLUDED.refreshed_at
+    WHERE post_documents.document IS DISTINCT FROM EXCLUDED.document;
+$$;
+
+CREATE OR REPLACE FUNCTION refresh_post_citation_counts(dois text[])
+RETURNS void
+LANGUAGE sql AS $$
+    UPDATE posts p
+    SET citation_count = c.citation_count,
+        last_citation_at = c.last_citation_at
+    FROM (
+        SELECT d.doi, COUNT(c.cid)::integer as citation_count,
+               EXTRACT(EPOCH FROM MAX(c.updated_at))::float8 as last_citation_at
+        FROM unnest(dois) AS d(doi)
+        LEFT JOIN citations c ON c.doi = d.doi
+        GROUP BY d.doi
+    ) c
+    WHERE p.doi = c.doi
+    AND (p.citation_count, p.last_citation_at)
+        IS DISTINCT FROM (c.citation_count, c.last_citation_at);
+$$;
+
+-- refresh the posts cited before and after the change, updates that leave
+-- doi and updated_at unchanged don't affect the counts
+CREATE OR REPLACE FUNCTION post_citation_counts_citations_changed()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM refresh_post_citation_counts(ARRAY(
+            SELECT n.doi
+            FROM changed_rows n
+            JOIN previous_rows o ON o.cid = n.cid
+            WHERE n.doi IS NOT NULL
+            AND (n.doi, n.updated_at) IS DISTINCT FROM (o.doi, o.updated_at)
+            UNION
+            SELECT o.doi
+            FROM changed_rows n
+            JOIN previous_rows o ON o.cid = n.cid
+            WHERE o.doi IS NOT NULL AND n.doi IS DISTINCT FROM o.doi
+        ));
+    ELSE
+        PERFORM refresh_post_citation_counts(ARRAY(
+            SELECT DISTINCT doi FROM changed_rows WHERE doi IS NOT NULL
+        ));
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS post_citation_counts_citations_insert ON citations;
+CREATE TRIGGER post_citation_counts_citations_insert
+    AFTER INSERT ON citations
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION post_citation_counts_citations_changed();
+
+DROP TRIGGER IF EXISTS post_citation_counts_citations_update ON citations;
+CREATE TRIGGER post_citation_counts_citations_update
+    AFTER UPDATE ON citations
+    REFERENCING NEW TABLE AS changed_rows OLD TABLE AS previous_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION post_citation_counts_citations_changed();
+
+DROP TRIGGER IF EXISTS post_citation_counts_citations_delete ON citations;
+CREATE TRIGGER post_citation_counts_citations_delete
+    AFTER DELETE ON citations
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION post_citation_counts_citations_changed();
+
+DROP FUNCTION IF EXISTS post_citation_counts_citations_deleted();
+
+-- backfill posts with citations, this also refreshes their documents
+SELECT refresh_post_citation_counts(ARRAY(SELECT DISTINCT doi FROM citations));
+
+CREATE INDEX IF NOT EXISTS posts_cited_updated_at_idx
+    ON posts (updated_at DESC)
+    WHERE citation_count > 0 AND doi IS NOT NULL;
+
+-- add the citation count to the remaining post documents in batches of 1000,
+-- committing after each batch, so this file has to run outside of a
+-- transaction block
+DO $$
+DECLARE
+    last_id uuid := '00000000-0000-0000-0000-000000000000';
+    batch uuid[];
+BEGIN
+    LOOP
+        SELECT array_agg(id ORDER BY id) INTO batch
+        FROM (
+            SELECT id FROM post_documents
+            WHERE id > last_id
+            ORDER BY id
+            LIMIT 1000
+        ) d;
+        EXIT WHEN batch IS NULL;
+        PERFORM refresh_post_documents(ARRAY(
+            SELECT d.id FROM post_documents d
+            WHERE d.id = ANY(batch) AND NOT d.document ? 'citation_count'
+        ));
+        last_id := batch[array_length(batch, 1)];
+        COMMIT;
+    END LOOP;
+END
+$$;
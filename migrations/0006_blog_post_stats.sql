@@ -0,0 +1,78 @@
+-- Number of public posts, latest publication and latest post update per
+-- blog, maintained by triggers on posts. Kept in its own table, so that post
+-- changes don't update blogs (and the post documents of all their posts).
+CREATE TABLE IF NOT EXISTS blog_post_stats (
+    slug text PRIMARY KEY,
+    post_count integer NOT NULL DEFAULT 0,
+    last_post_at double precision,
+    posts_updated_at double precision
+);
+
+CREATE OR REPLACE FUNCTION refresh_blog_post_stats(slugs text[])
+RETURNS void
+LANGUAGE sql AS $$
+    INSERT INTO blog_post_stats (slug, post_count, last_post_at, posts_updated_at)
+    SELECT s.slug, COUNT(p.id), MAX(p.published_at), MAX(p.updated_at)
+    FROM unnest(slugs) AS s(slug)
+    LEFT JOIN posts p
+        ON p.blog_slug = s.slug
+        AND p.status IN ('active', 'archived', 'expired')
+    GROUP BY s.slug
+    ON CONFLICT (slug) DO UPDATE
+    SET post_count = EXCLUDED.post_count,
+        last_post_at = EXCLUDED.last_post_at,
+        posts_updated_at = EXCLUDED.posts_updated_at
+    WHERE (blog_post_stats.post_count, blog_post_stats.last_post_at,
+           blog_post_stats.posts_updated_at)
+        IS DISTINCT FROM (EXCLUDED.post_count, EXCLUDED.last_post_at,
+                          EXCLUDED.posts_updated_at);
+$$;
+
+CREATE OR REPLACE FUNCTION blog_post_stats_posts_changed()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        -- only updates of the columns the stats are computed from
+        PERFORM refresh_blog_post_stats(ARRAY(
+            SELECT s.blog_slug
+            FROM changed_rows n
+            JOIN previous_rows o ON o.id = n.id
+            CROSS JOIN LATERAL (VALUES (n.blog_slug), (o.blog_slug)) s(blog_slug)
+            WHERE (n.blog_slug, n.status, n.published_at, n.updated_at)
+                IS DISTINCT FROM (o.blog_slug, o.status, o.published_at, o.updated_at)
+            GROUP BY s.blog_slug
+        ));
+    ELSE
+        PERFORM refresh_blog_post_stats(ARRAY(
+            SELECT DISTINCT blog_slug FROM changed_rows
+        ));
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS blog_post_stats_posts_insert ON posts;
+CREATE TRIGGER blog_post_stats_posts_insert
+    AFTER INSERT ON posts
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION blog_post_stats_posts_changed();
+
+DROP TRIGGER IF EXISTS blog_post_stats_posts_update ON posts;
+CREATE TRIGGER blog_post_stats_posts_update
+    AFTER UPDATE ON posts
+    REFERENCING NEW TABLE AS changed_rows OLD TABLE AS previous_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION blog_post_stats_posts_changed();
+
+DROP TRIGGER IF EXISTS blog_post_stats_posts_delete ON posts;
+CREATE TRIGGER blog_post_stats_posts_delete
+    AFTER DELETE ON posts
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION blog_post_stats_posts_changed();
+
+-- backfill existing blogs
+SELECT refresh_blog_post_stats(ARRAY(SELECT slug FROM blogs));
+
+-- keyset pagination of the posts of a blog
+CREATE INDEX IF NOT EXISTS posts_blog_slug_published_at_id_idx
+    ON posts (blog_slug, published_at DESC, id DESC);
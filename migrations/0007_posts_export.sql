@@ -0,0 +1,4 @@
+-- Keyset order of the bulk export of posts, so that an export (or its
+-- resumption after the last exported post) reads the index in order.
+CREATE INDEX IF NOT EXISTS posts_updated_at_id_idx
+    ON posts (updated_at, id);
@@ -0,0 +1,123 @@
+-- Change log of public posts for the /posts/changes feed, maintained by
+-- triggers on posts. A post is logged as upsert when it is inserted or
+-- updated with a public status, and as delete when it is deleted or its
+-- status changes from public to non-public (updated_at doesn't change then).
+-- Updates that only change derived columns (citation counts, search vector)
+-- are not logged.
+--
+-- The feed only returns the latest change of a post, so older entries of a
+-- post are removed when a new one is logged, and the log holds at most one
+-- entry per post.
+--
+-- Entries are ordered by the id of the writing transaction and a sequence
+-- number. The feed only returns entries of transactions older than the
+-- oldest running transaction, so an entry committed later can't be ordered
+-- before entries already returned. Only transactions that write hold back
+-- the feed: read-only transactions, e.g. the named cursors of /posts/export
+-- and snapshots, have no transaction id. Long writing transactions, e.g.
+-- bulk backfills, stall the feed until they finish, so commit them in
+-- batches.
+CREATE TABLE IF NOT EXISTS post_changes (
+    seq bigserial PRIMARY KEY,
+    xid xid8 NOT NULL DEFAULT pg_current_xact_id(),
+    id uuid NOT NULL,
+    doi text,
+    blog_slug text,
+    operation text NOT NULL CHECK (operation IN ('upsert', 'delete')),
+    changed_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS post_changes_xid_seq_idx
+    ON post_changes (xid, seq);
+CREATE INDEX IF NOT EXISTS post_changes_id_xid_seq_idx
+    ON post_changes (id, xid, seq);
+CREATE INDEX IF NOT EXISTS post_changes_changed_at_idx
+    ON post_changes (changed_at);
+
+-- post columns whose changes are logged, all but the derived columns
+CREATE OR REPLACE FUNCTION post_changes_logged_columns(post posts)
+RETURNS jsonb
+LANGUAGE sql STABLE AS $$
+    SELECT to_jsonb(post)
+        - ARRAY['citation_count', 'last_citation_at', 'search_vector']
+$$;
+
+-- log the changed posts and remove their previous entries in one statement
+CREATE OR REPLACE FUNCTION post_changes_posts_changed()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        WITH entries AS (
+            SELECT n.id, n.doi, n.blog_slug, 'upsert' as operation, n.updated_at
+            FROM changed_rows n
+            WHERE n.status IN ('active', 'archived', 'expired')
+        ), removed AS (
+            DELETE FROM post_changes c USING entries e WHERE c.id = e.id
+        )
+        INSERT INTO post_changes (id, doi, blog_slug, operation)
+        SELECT id, doi, blog_slug, operation
+        FROM entries
+        ORDER BY updated_at, id;
+    ELSIF TG_OP = 'UPDATE' THEN
+        WITH entries AS (
+            SELECT n.id, n.doi, n.blog_slug,
+                   CASE WHEN n.status IN ('active', 'archived', 'expired')
+                        THEN 'upsert' ELSE 'delete' END as operation,
+                   n.updated_at
+            FROM changed_rows n
+            JOIN previous_rows o ON o.id = n.id
+            WHERE (n.status IN ('active', 'archived', 'expired')
+                   OR o.status IN ('active', 'archived', 'expired'))
+            AND post_changes_logged_columns(n)
+                IS DISTINCT FROM post_changes_logged_columns(o)
+        ), removed AS (
+            DELETE FROM post_changes c USING entries e WHERE c.id = e.id
+        )
+        INSERT INTO post_changes (id, doi, blog_slug, operation)
+        SELECT id, doi, blog_slug, operation
+        FROM entries
+        ORDER BY updated_at, id;
+    ELSE
+        WITH entries AS (
+            SELECT o.id, o.doi, o.blog_slug, 'delete' as operation, o.updated_at
+            FROM changed_rows o
+            WHERE o.status IN ('active', 'archived', 'expired')
+        ), removed AS (
+            DELETE FROM post_changes c USING entries e WHERE c.id = e.id
+        )
+        INSERT INTO post_changes (id, doi, blog_slug, operation)
+        SELECT id, doi, blog_slug, operation
+        FROM entries
+        ORDER BY updated_at, id;
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS post_changes_posts_insert ON posts;
+CREATE TRIGGER post_changes_posts_insert
+    AFTER INSERT ON posts
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION post_changes_posts_changed();
+
+DROP TRIGGER IF EXISTS post_changes_posts_update ON posts;
+CREATE TRIGGER post_changes_posts_update
+    AFTER UPDATE ON posts
+    REFERENCING NEW TABLE AS changed_rows OLD TABLE AS previous_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION post_changes_posts_changed();
+
+DROP TRIGGER IF EXISTS post_changes_posts_delete ON posts;
+CREATE TRIGGER post_changes_posts_delete
+    AFTER DELETE ON posts
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION post_changes_posts_changed();
+
+-- backfill existing public posts, in the order of their last update
+INSERT INTO post_changes (id, doi, blog_slug, operation, changed_at)
+SELECT p.id, p.doi, p.blog_slug, 'upsert',
+       COALESCE(to_timestamp(p.updated_at), now())
+FROM posts p
+WHERE p.status IN ('active', 'archived', 'expired')
+AND NOT EXISTS (SELECT 1 FROM post_changes c WHERE c.id = p.id)
+ORDER BY p.updated_at, p.id;
@@ -0,0 +1,168 @@
+-- Sitemap shards: public posts grouped by month of publication (UTC), with
+-- the number of posts and the latest update per shard, maintained
+-- incrementally by statement triggers on posts from the changed rows only.
+-- refreshed_at only changes when the sitemap of a shard changes, so it can
+-- be used as version. refresh_sitemap_shards recounts shards from posts,
+-- for the backfill and to repair counts after triggers were disabled.
+CREATE TABLE IF NOT EXISTS sitemap_shards (
+    shard text PRIMARY KEY,
+    post_count integer NOT NULL DEFAULT 0,
+    lastmod double precision,
+    refreshed_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION posts_sitemap_shard(published_at double precision)
+RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT to_char(to_timestamp(published_at) AT TIME ZONE 'UTC', 'YYYY-MM')
+$$;
+
+CREATE OR REPLACE FUNCTION refresh_sitemap_shards(shards text[])
+RETURNS void
+LANGUAGE sql AS $$
+    INSERT INTO sitemap_shards (shard, post_count, lastmod, refreshed_at)
+    SELECT s.shard, COUNT(p.id),
+           MAX(COALESCE(p.updated_at, p.published_at)),
+           now()
+    FROM unnest(shards) AS s(shard)
+    CROSS JOIN LATERAL (
+        SELECT (s.shard || '-01')::timestamp AS start_at
+    ) r
+    LEFT JOIN posts p
+        ON p.published_at >= EXTRACT(EPOCH FROM r.start_at AT TIME ZONE 'UTC')
+        AND p.published_at < EXTRACT(
+            EPOCH FROM (r.start_at + interval '1 month') AT TIME ZONE 'UTC'
+        )
+        AND p.status IN ('active', 'archived', 'expired')
+    WHERE s.shard IS NOT NULL
+    GROUP BY s.shard
+    ON CONFLICT (shard) DO UPDATE
+    SET post_count = EXCLUDED.post_count,
+        lastmod = EXCLUDED.lastmod,
+        refreshed_at = EXCLUDED.refreshed_at
+    WHERE (sitemap_shards.post_count, sitemap_shards.lastmod)
+        IS DISTINCT FROM (EXCLUDED.post_count, EXCLUDED.lastmod);
+$$;
+
+-- Apply the changes of a statement: one entry per post with its shard, +1
+-- for a post added to the shard, -1 for a post removed from it and 0 for a
+-- post updated in place, and its lastmod. Removing a post changes the
+-- sitemap at the time of the statement.
+CREATE OR REPLACE FUNCTION apply_sitemap_shard_changes(
+    shards text[], deltas integer[], lastmods double precision[]
+)
+RETURNS void
+LANGUAGE sql AS $$
+    INSERT INTO sitemap_shards AS s (shard, post_count, lastmod, refreshed_at)
+    SELECT c.shard, SUM(c.delta),
+           MAX(CASE WHEN c.delta < 0 THEN EXTRACT(EPOCH FROM now())::float8
+                    ELSE c.lastmod END),
+           now()
+    FROM unnest(shards, deltas, lastmods) AS c(shard, delta, lastmod)
+    WHERE c.shard IS NOT NULL
+    GROUP BY c.shard
+    ON CONFLICT (shard) DO UPDATE
+    SET post_count = s.post_count + EXCLUDED.post_count,
+        lastmod = GREATEST(s.lastmod, EXCLUDED.lastmod),
+        refreshed_at = EXCLUDED.refreshed_at;
+$$;
+
+CREATE OR REPLACE FUNCTION sitemap_shards_posts_changed()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    shards text[];
+    deltas integer[];
+    lastmods double precision[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(posts_sitemap_shard(n.published_at)),
+               array_agg(1),
+               array_agg(COALESCE(n.updated_at, n.published_at))
+        INTO shards, deltas, lastmods
+        FROM changed_rows n
+        WHERE n.status IN ('active', 'archived', 'expired');
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(posts_sitemap_shard(o.published_at)),
+               array_agg(-1),
+               array_agg(NULL::float8)
+        INTO shards, deltas, lastmods
+        FROM changed_rows o
+        WHERE o.status IN ('active', 'archived', 'expired');
+    ELSE
+        -- only rows where the columns of the sitemap changed, a post that
+        -- moved to another shard or stopped being public is removed from
+        -- its old shard and added to the new one
+        WITH changed AS (
+            SELECT posts_sitemap_shard(o.published_at) AS old_shard,
+                   o.status IN ('active', 'archived', 'expired') AS old_public,
+                   posts_sitemap_shard(n.published_at) AS new_shard,
+                   n.status IN ('active', 'archived', 'expired') AS new_public,
+                   COALESCE(n.updated_at, n.published_at) AS lastmod
+            FROM changed_rows n
+            JOIN previous_rows o ON o.id = n.id
+            WHERE (n.status, n.published_at, n.updated_at)
+                IS DISTINCT FROM (o.status, o.published_at, o.updated_at)
+        ), entries AS (
+            SELECT new_shard AS shard, 0 AS delta, lastmod
+            FROM changed
+            WHERE old_public AND new_public AND old_shard = new_shard
+            UNION ALL
+            SELECT old_shard, -1, NULL
+            FROM changed
+            WHERE old_public
+            AND NOT (new_public AND old_shard IS NOT DISTINCT FROM new_shard)
+            UNION ALL
+            SELECT new_shard, 1, lastmod
+            FROM changed
+            WHERE new_public
+            AND NOT (old_public AND old_shard IS NOT DISTINCT FROM new_shard)
+        )
+        SELECT array_agg(shard), array_agg(delta), array_agg(lastmod)
+        INTO shards, deltas, lastmods
+        FROM entries;
+    END IF;
+    IF shards IS NOT NULL THEN
+        PERFORM apply_sitemap_shard_changes(shards, deltas, lastmods);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS sitemap_shards_posts_insert ON posts;
+CREATE TRIGGER sitemap_shards_posts_insert
+    AFTER INSERT ON posts
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sitemap_shards_posts_changed();
+
+DROP TRIGGER IF EXISTS sitemap_shards_posts_update ON posts;
+CREATE TRIGGER sitemap_shards_posts_update
+    AFTER UPDATE ON posts
+    REFERENCING NEW TABLE AS changed_rows OLD TABLE AS previous_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sitemap_shards_posts_changed();
+
+DROP TRIGGER IF EXISTS sitemap_shards_posts_delete ON posts;
+CREATE TRIGGER sitemap_shards_posts_delete
+    AFTER DELETE ON posts
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sitemap_shards_posts_changed();
+
+-- backfill all months with posts, one month per transaction so no
+-- statement holds locks on sitemap_shards for the whole table scan. Posts
+-- written during the backfill are counted by the triggers, and their month
+-- is recounted when its turn comes. Run outside of a transaction block.
+DO $$
+DECLARE
+    month text;
+BEGIN
+    FOR month IN
+        SELECT DISTINCT posts_sitemap_shard(published_at)
+        FROM posts
+        WHERE status IN ('active', 'archived', 'expired')
+        ORDER BY 1
+    LOOP
+        PERFORM refresh_sitemap_shards(ARRAY[month]);
+        COMMIT;
+    END LOOP;
+END
+$$;
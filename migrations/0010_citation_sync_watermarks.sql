@@ -0,0 +1,9 @@
+-- Crossref cited-by sync watermarks: the start of the last successful
+-- getForwardLinks sync per prefix (or DOI), so that the next sync only asks
+-- for forward links since then (see api.citations).
+CREATE TABLE IF NOT EXISTS citation_sync_watermarks (
+    slug text PRIMARY KEY,
+    synced_at timestamptz NOT NULL,
+    citation_count integer NOT NULL DEFAULT 0,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
@@ -0,0 +1,142 @@
+"""Compare loading wide post rows with the default psycopg loaders plus the
+previous recursive normalization, and with the JSON-ready loaders registered
+on the pool. Runs offline on synthetic rows in Postgres text format.
+
+    uv run python scripts/bench_row_loading.py [rows]
+"""
+
+import sys
+import time
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+from uuid import UUID
+
+import orjson
+import psycopg
+from psycopg.adapt import AdaptersMap, Transformer
+from psycopg.pq import Format
+
+from api.db_client import register_loaders
+
+RUNS = 5
+
+
+class LoaderContext:
+    def __init__(self):
+        self.adapters = AdaptersMap(psycopg.adapters)
+        self.connection = None
+
+
+def _normalize_value(value: Any) -> Any:
+    """Previous normalization of every fetched row."""
+    if value is None:
+        return None
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        try:
+            integral = value.to_integral_value()
+            if value == integral:
+                return int(integral)
+        except Exception:
+            pass
+        return float(value)
+    if isinstance(value, dict):
+        return {k: _normalize_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize_value(v) for v in value]
+    if isinstance(value, tuple):
+        return tuple(_normalize_value(v) for v in value)
+    return value
+
+
+def wide_post_row(i: int) -> list[tuple[str, str, bytes]]:
+    """A post row with blog and citations, as (column, type, text value)."""
+    authors = [
+        {"name": f"Author {n}", "url": f"https://orcid.org/0000-0002-{n:04d}-000X"}
+        for n in range(4)
+    ]
+    reference = [
+        {
+            "key": f"ref{n}",
+            "id": f"https://doi.org/10.5555/{n}",
+            "unstructured": "Doe, J. (2020). A reference title. Journal, 1(2), 3.",
+        }
+        for n in range(30)
+    ]
+    blog = {
+        "slug": "blog",
+        "title": "A Blog",
+        "authors": authors,
+        "archive_timestamps": [20230101000000 + n for n in range(20)],
+        "funding": {"funder": "A Funder", "award": "1234"},
+        "created_at": 1672531200.0,
+        "updated_at": 1700000000.0,
+    }
+    citations = [
+        {
+            "cid": str(uuid.uuid4()),
+            "citation": "Doe, J. (2024). A citing work.",
+            "updated_at": "2024-01-02T03:04:05.123456+00:00",
+        }
+        for _ in range(5)
+    ]
+    return [
+        ("id", "uuid", str(uuid.uuid4()).encode()),
+        ("doi", "text", f"https://doi.org/10.59350/{i}".encode()),
+        ("title", "text", b"A title of a post"),
+        ("summary", "text", b"A summary " * 30),
+        ("content_html", "text", b"<p>Some content</p>" * 500),
+        ("published_at", "float8", b"1700000000"),
+        ("updated_at", "float8", b"1700000001.5"),
+        ("topic_score", "numeric", b"0.875"),
+        ("registered_at", "numeric", b"1700000002"),
+        ("indexed_at", "timestamptz", b"2024-01-02 03:04:05.123456+00"),
+        ("tags", "text[]", b'{"Open Access","Open Science",Citations}'),
+        ("authors", "jsonb", orjson.dumps(authors)),
+        ("reference", "jsonb", orjson.dumps(reference)),
+        ("blog", "json", orjson.dumps(blog)),
+        ("citations", "json", orjson.dumps(citations)),
+    ]
+
+
+def load_rows(context, rows, normalize: bool) -> float:
+    transformer = Transformer(context)
+    columns = rows[0]
+    loaders = []
+    for name, type_name, _ in columns:
+        if type_name.endswith("[]"):
+            oid = psycopg.adapters.types[type_name[:-2]].array_oid
+        else:
+            oid = psycopg.adapters.types[type_name].oid
+        loaders.append((name, transformer.get_loader(oid, Format.TEXT).load))
+    start = time.perf_counter()
+    for row in rows:
+        record = {
+            name: load(value) for (name, load), (_, _, value) in zip(loaders, row)
+        }
+        if normalize:
+            record = _normalize_value(dict(record))
+    return time.perf_counter() - start
+
+
+def main(count: int) -> None:
+    rows = [wide_post_row(i) for i in range(count)]
+    default_context = LoaderContext()
+    json_ready_context = LoaderContext()
+    register_loaders(json_ready_context)
+
+    before = min(load_rows(default_context, rows, True) for _ in range(RUNS))
+    after = min(load_rows(json_ready_context, rows, False) for _ in range(RUNS))
+    print(f"{count} wide post rows, best of {RUNS} runs")
+    print(f"default loaders + normalization: {before * 1000:8.1f} ms")
+    print(f"JSON-ready loaders:              {after * 1000:8.1f} ms")
+    print(f"speedup:                         {before / after:8.2f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,93 @@
+"""Compare the /posts search before and after the full-text search indexes.
+
+Runs EXPLAIN ANALYZE for the previous ILIKE query (data and count query),
+and for the full-text and trigram query with the count folded into the page
+query, and prints the execution times in milliseconds.
+
+    uv run python scripts/bench_search.py [term ...]
+"""
+
+import asyncio
+import sys
+
+from api import POSTS_SEARCH_TSQUERY
+from api.db_client import Database, close_pool, get_pool
+
+TERMS = ["open access", "retraction watch", "climate change", "citation"]
+RUNS = 5
+
+ILIKE_QUERIES = [
+    """
+    SELECT p.id
+    FROM posts p
+    INNER JOIN blogs b ON p.blog_slug = b.slug
+    WHERE p.status = ANY(:statuses) AND p.title ILIKE :title_pattern
+    ORDER BY p.published_at DESC
+    LIMIT 10
+    """,
+    """
+    SELECT COUNT(*) as count
+    FROM posts p
+    WHERE p.status = ANY(:statuses) AND p.title ILIKE :title_pattern
+    """,
+]
+
+SEARCH_QUERIES = [
+    f"""
+    WITH page AS (
+        SELECT p.id, COUNT(*) OVER () as found,
+               ROW_NUMBER() OVER (
+                   ORDER BY ts_rank_cd(p.search_vector, {POSTS_SEARCH_TSQUERY})
+                   + word_similarity(:query, p.title) DESC,
+                   p.published_at DESC
+               ) as position
+        FROM posts p
+        WHERE p.status = ANY(:statuses)
+        AND (p.search_vector @@ {POSTS_SEARCH_TSQUERY} OR :query <%% p.title)
+        ORDER BY position
+        LIMIT 10
+    )
+    SELECT p.id, page.found
+    FROM page
+    INNER JOIN posts p ON p.id = page.id
+    INNER JOIN blogs b ON p.blog_slug = b.slug
+    ORDER BY page.position
+    """,
+]
+
+
+async def execution_time(queries: list[str], params: dict) -> float:
+    """Sum of the execution times of the queries, best of RUNS."""
+    best = None
+    for _ in range(RUNS):
+        total = 0.0
+        for query in queries:
+            rows = await Database.fetch_all(
+                "EXPLAIN (ANALYZE, FORMAT JSON) " + query, params
+            )
+            plan = rows[0]["QUERY PLAN"][0]
+            total += plan["Planning Time"] + plan["Execution Time"]
+        best = total if best is None else min(best, total)
+    return best or 0.0
+
+
+async def main(terms: list[str]) -> None:
+    await get_pool()
+    try:
+        print(f"{'term':<24} {'ilike (ms)':>12} {'search (ms)':>12}")
+        for term in terms:
+            params = {
+                "statuses": ["active", "archived", "expired"],
+                "title_pattern": f"%{term}%",
+                "query": term,
+                "search_language": "en",
+            }
+            before = await execution_time(ILIKE_QUERIES, params)
+            after = await execution_time(SEARCH_QUERIES, params)
+            print(f"{term:<24} {before:>12.1f} {after:>12.1f}")
+    finally:
+        await close_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:] or TERMS))
@@ -0,0 +1,25 @@
+import argparse
+import asyncio
+
+import orjson
+
+from api.db_client import close_pool
+from api.snapshots import write_snapshot
+
+
+async def main(include_content_html: bool) -> None:
+    # Expect env vars to be set externally.
+    try:
+        manifest = await write_snapshot(include_content_html=include_content_html)
+        print(orjson.dumps(manifest, option=orjson.OPT_INDENT_2).decode())
+    finally:
+        await close_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a Parquet snapshot.")
+    parser.add_argument(
+        "--content-html", action="store_true", help="include content_html"
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.content_html))
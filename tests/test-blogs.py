@@ -1,6 +1,9 @@
 """Test blogs"""
 
 import importlib
+from unittest.mock import AsyncMock
+
+import httpx
 import requests
 import pytest  # noqa: F401
 
@@ -12,6 +15,7 @@ from api.blogs import (
     parse_generator,
     parse_feed_format,
     find_feed,
+    fetch_feed,
     upsert_blog_community,
     create_blog_community,
     update_blog_community,
@@ -293,7 +297,8 @@ async def test_update_single_blog():
     pytest.skip("Requires database and external API access")
 
 
-def test_create_blog_community_already_exits():
+@pytest.mark.asyncio
+async def test_create_blog_community_already_exits():
     "create blog community that already exists"
     blog = {
         "slug": "metadatagamechangers",
@@ -301,12 +306,13 @@ def test_create_blog_community_already_exits():
         "title": "Blog - Metadata Game Changers",
         "description": "Exploring metadata, communities, and new idea.",
     }
-    result = create_blog_community(blog)
+    result = await create_blog_community(blog)
     # May return error if already exists or succeed
     assert result.status_code in [200, 400]
 
 
-def test_update_blog_community_metadatagamechangers():
+@pytest.mark.asyncio
+async def test_update_blog_community_metadatagamechangers():
     "update blog community metadatagamechangers"
     blog = {
         "slug": "metadatagamechangers",
@@ -314,12 +320,13 @@ def test_update_blog_community_metadatagamechangers():
         "title": "Blog - Metadata Game Changers",
         "description": "Exploring metadata, communities, and new idea.",
     }
-    result = update_blog_community(blog)
+    result = await update_blog_community(blog)
     # May succeed or fail depending on community state
     assert result.status_code in [200, 404]
 
 
-def test_upsert_blog_community_continues_after_metadata_timeout(monkeypatch):
+@pytest.mark.asyncio
+async def test_upsert_blog_community_continues_after_metadata_timeout(monkeypatch):
     "community upsert continues when DOI metadata fetch times out"
 
     class DummyResponse:
@@ -340,10 +347,10 @@ def test_upsert_blog_community_continues_after_metadata_timeout(monkeypatch):
         ),
     )
     monkeypatch.setattr(
-        blogs_module, "create_blog_community", lambda blog: DummyResponse()
+        blogs_module, "create_blog_community", AsyncMock(return_value=DummyResponse())
     )
 
-    result = upsert_blog_community(blog)
+    result = await upsert_blog_community(blog)
 
     assert result.status_code == 200
 
@@ -505,3 +512,40 @@ async def test_generate_opml_force_overwrites_cache(monkeypatch):
 
     assert xml != "cached"
     mock_select.assert_called_once()
+
+
+def test_generate_opml_cache_evicted_on_blog_update():
+    """A blog invalidation event evicts the cached OPML export."""
+    import time
+    from api.cache import dispatch
+
+    blogs_module._opml_cache = (time.monotonic(), "cached")
+
+    dispatch({"type": "blog", "blog_slug": "blog-a"})
+
+    assert blogs_module._opml_cache is None
+
+
+@pytest.mark.asyncio
+async def test_fetch_feed_parses_in_worker_thread(monkeypatch):
+    "fetch feed with the shared async client and parse the bytes"
+    feed = b"""<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <title>Example Blog</title>
+  <link href="/" rel="alternate"/>
+  <generator uri="https://gohugo.io/" version="0.120.0">Hugo</generator>
+</feed>"""
+
+    def handler(request):
+        return httpx.Response(
+            200, content=feed, headers={"Content-Type": "application/atom+xml"}
+        )
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(blogs_module, "http_client", lambda: client)
+
+    parsed = await fetch_feed("https://blog.example.org/feed.atom")
+
+    assert parsed.feed["title"] == "Example Blog"
+    assert parsed.feed["link"] == "https://blog.example.org/"
+    await client.aclose()
@@ -0,0 +1,237 @@
+"""Test cache"""
+
+import asyncio
+import importlib
+import time
+
+import orjson as json
+import pytest  # noqa: F401
+
+from api.cache import ResponseCache
+
+cache_module = importlib.import_module("api.cache")
+
+
+@pytest.mark.asyncio
+async def test_response_cache_hit():
+    """Second request is served from the cache."""
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return {"found": 1}
+
+    cache = ResponseCache(ttl=60)
+    first = await cache.get(("posts", 1), loader)
+    second = await cache.get(("posts", 1), loader)
+
+    assert first == second == {"found": 1}
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_response_cache_shorter_ttl():
+    """Values can be stored with a shorter ttl than the cache."""
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return {"provisional": len(calls) == 1}
+
+    def ttl(value):
+        return 300 if value["provisional"] else None
+
+    cache = ResponseCache(ttl=86400, stale_ttl=0)
+    assert await cache.get("key", loader, ttl=ttl) == {"provisional": True}
+    assert await cache.get("key", loader, ttl=ttl) == {"provisional": True}
+    assert len(calls) == 1
+
+    # age the entry past the shorter ttl
+    loaded_at, value = cache._entries["key"]
+    cache._entries["key"] = (loaded_at - 301, value)
+    assert await cache.get("key", loader, ttl=ttl) == {"provisional": False}
+    loaded_at, value = cache._entries["key"]
+    cache._entries["key"] = (loaded_at - 301, value)
+    assert await cache.get("key", loader, ttl=ttl) == {"provisional": False}
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_response_cache_single_flight():
+    """Concurrent misses for the same key share one load."""
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    cache = ResponseCache(ttl=60)
+    results = await asyncio.gather(*[cache.get("key", loader) for _ in range(10)])
+
+    assert results == [1] * 10
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_response_cache_stale_while_revalidate():
+    """Stale entries are returned while refreshed in the background."""
+    values = iter(["old", "new"])
+
+    async def loader():
+        return next(values)
+
+    cache = ResponseCache(ttl=60, stale_ttl=300)
+    assert await cache.get("key", loader) == "old"
+
+    # age the entry past the ttl, but within the stale window
+    cache._entries["key"] = (time.monotonic() - 61, "old")
+    assert await cache.get("key", loader) == "old"
+    await asyncio.sleep(0)
+    assert await cache.get("key", loader) == "new"
+
+
+@pytest.mark.asyncio
+async def test_response_cache_expired():
+    """Entries older than ttl and stale window are reloaded before returning."""
+    values = iter(["old", "new"])
+
+    async def loader():
+        return next(values)
+
+    cache = ResponseCache(ttl=60, stale_ttl=300)
+    await cache.get("key", loader)
+    cache._entries["key"] = (time.monotonic() - 400, "old")
+
+    assert await cache.get("key", loader) == "new"
+
+
+@pytest.mark.asyncio
+async def test_response_cache_invalidate():
+    """Invalidation drops entries, and results of earlier loads are not stored."""
+    values = iter(["first", "second", "third"])
+
+    async def loader():
+        return next(values)
+
+    cache = ResponseCache(ttl=60)
+    assert await cache.get("key", loader) == "first"
+    cache.invalidate()
+    assert len(cache) == 0
+    assert await cache.get("key", loader) == "second"
+
+    async def slow_loader():
+        await asyncio.sleep(0.01)
+        return "slow"
+
+    task = asyncio.create_task(cache.get("other", slow_loader))
+    await asyncio.sleep(0)
+    cache.invalidate()
+    assert await task == "slow"
+    assert "other" not in cache._entries
+
+
+@pytest.mark.asyncio
+async def test_response_cache_max_size():
+    """Least recently used entries are evicted."""
+
+    async def loader():
+        return "value"
+
+    cache = ResponseCache(ttl=60, max_size=2)
+    for key in ["a", "b", "c"]:
+        await cache.get(key, loader)
+
+    assert list(cache._entries) == ["b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_response_cache_invalidate_matching_keys():
+    """Invalidation with a match function only drops matching entries."""
+
+    async def loader():
+        return "value"
+
+    cache = ResponseCache(ttl=60)
+    await cache.get(("posts", 1, 10, None, None), loader)
+    await cache.get(("posts", 1, 10, "blog-a", None), loader)
+    await cache.get(("posts", 1, 10, "blog-b", None), loader)
+
+    cache.invalidate(lambda key: key[3] in (None, "blog-a"))
+
+    assert list(cache._entries) == [("posts", 1, 10, "blog-b", None)]
+
+
+@pytest.mark.asyncio
+async def test_publish_invalidation(monkeypatch):
+    """Publishing evicts entries locally and notifies other workers."""
+    from unittest.mock import AsyncMock
+
+    mock_execute = AsyncMock(return_value=None)
+    monkeypatch.setattr(cache_module.Database, "execute", mock_execute)
+
+    async def loader():
+        return "value"
+
+    await cache_module.posts_cache.get(("posts", 1, 10, "blog-a", None), loader)
+    await cache_module.posts_cache.get(("posts", 1, 10, "blog-b", None), loader)
+
+    await cache_module.publish_invalidation("post", id="1", blog_slug="blog-a")
+
+    assert list(cache_module.posts_cache._entries) == [
+        ("posts", 1, 10, "blog-b", None)
+    ]
+    mock_execute.assert_called_once()
+    params = mock_execute.call_args.args[1]
+    assert params["channel"] == cache_module.INVALIDATION_CHANNEL
+    payload = json.loads(params["payload"])
+    assert payload["type"] == "post"
+    assert payload["blog_slug"] == "blog-a"
+    assert payload["worker"] == cache_module.WORKER_ID
+    cache_module.posts_cache.invalidate()
+
+
+@pytest.mark.asyncio
+async def test_handle_notification():
+    """Notifications from other workers evict entries, own ones are skipped."""
+
+    async def loader():
+        return "value"
+
+    posts_cache = cache_module.posts_cache
+    await posts_cache.get(("posts", 1, 10, "blog-a", None), loader)
+
+    own = {"type": "blog", "blog_slug": "blog-a", "worker": cache_module.WORKER_ID}
+    cache_module.handle_notification(json.dumps(own).decode("utf-8"))
+    assert len(posts_cache) == 1
+
+    other = {"type": "blog", "blog_slug": "blog-a", "worker": "other"}
+    cache_module.handle_notification(json.dumps(other).decode("utf-8"))
+    assert len(posts_cache) == 0
+
+    await posts_cache.get(("posts", 1, 10, "blog-b", None), loader)
+    cache_module.handle_notification(None)
+    assert len(posts_cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_citation_event_evicts_posts():
+    """Citation events evict the posts of the blog, as they include citation
+    counts."""
+
+    async def loader():
+        return "value"
+
+    posts_cache = cache_module.posts_cache
+    await posts_cache.get(("posts", 1, 10, "blog-a", None), loader)
+    await posts_cache.get(("posts", 1, 10, "blog-b", None), loader)
+
+    cache_module.dispatch({"type": "citation", "doi": "doi", "blog_slug": "blog-a"})
+    assert list(posts_cache._entries) == [("posts", 1, 10, "blog-b", None)]
+    posts_cache.invalidate()
+
+
+def test_subscribe_unknown_event():
+    """Only known invalidation events can be subscribed to."""
+    with pytest.raises(ValueError):
+        cache_module.subscribe("unknown", lambda event: None)
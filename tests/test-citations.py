@@ -1,11 +1,41 @@
 """Test citations."""
 
+import importlib
 from os import environ
+from unittest.mock import AsyncMock, MagicMock
 
+import httpx
 import pytest  # noqa: F401
 import pydash as py_  # noqa: F401
+import xmltodict
 
 from api import app
+from api.citations import (
+    extract_all_citations_by_prefix,
+    stream_forward_links,
+    upsert_citations,
+)
+
+citations = importlib.import_module("api.citations")
+
+FORWARD_LINKS = """<?xml version="1.0" encoding="UTF-8"?>
+<crossref_result xmlns="http://www.crossref.org/qrschema/3.0" version="3.0">
+  <query_result>
+    <body>
+      <forward_link doi="10.59350/4rj2q-98c96">
+        <journal_cite>
+          <doi type="journal_article">10.3233/JNR-220002</doi>
+        </journal_cite>
+      </forward_link>
+      <forward_link doi="10.59350/4rj2q-98c96">
+        <postedcontent_cite>
+          <doi type="posted_content">10.31222/osf.io/new</doi>
+        </postedcontent_cite>
+      </forward_link>
+    </body>
+  </query_result>
+</crossref_result>
+"""
 
 
 @pytest.mark.asyncio
@@ -16,7 +46,9 @@ async def test_extract_all_citations_by_prefix():
         test_client = app.test_client()
         key = environ["ROGUE_SCHOLAR_SERVICE_ROLE_KEY"]
         headers = {"Authorization": f"Bearer {key}"}
-        response = await test_client.post(f"/citations/{prefix}", headers=headers)
+        response = await test_client.post(
+            f"/citations/{prefix}?full=true", headers=headers
+        )
         assert response.status_code == 200
         result = await response.get_json()
 
@@ -38,7 +70,7 @@ async def test_extract_all_citations_by_doi():
         key = environ["ROGUE_SCHOLAR_SERVICE_ROLE_KEY"]
         headers = {"Authorization": f"Bearer {key}"}
         response = await test_client.post(
-            f"/citations/{prefix}/{suffix}", headers=headers
+            f"/citations/{prefix}/{suffix}?full=true", headers=headers
         )
         assert response.status_code == 200
         result = await response.get_json()
@@ -49,3 +81,198 @@ async def test_extract_all_citations_by_doi():
     assert citation["doi"] == "https://doi.org/10.59350/ffgmk-zjj78"
     assert citation["citation"] == "https://doi.org/10.53731/4bvt3-hmd07"
     assert citation["published_at"] == "2025-02-03"
+
+
+@pytest.mark.asyncio
+async def test_extract_citations_by_prefix_since_watermark(monkeypatch):
+    """Only ask for forward links since the last sync, and only look up citing
+    DOIs of citations not yet stored."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, text=FORWARD_LINKS)
+
+    transport = httpx.MockTransport(handler)
+    async_client = httpx.AsyncClient
+    monkeypatch.setattr(
+        citations.httpx,
+        "AsyncClient",
+        lambda **kwargs: async_client(transport=transport, **kwargs),
+    )
+    monkeypatch.setenv("QUART_CROSSREF_USERNAME_WITH_ROLE", "user")
+    monkeypatch.setenv("QUART_CROSSREF_PASSWORD", "password")
+    known = {"cid": "10.59350/4rj2q-98c96::10.3233/jnr-220002"}
+    queries = citations.CitationsQueries
+    monkeypatch.setattr(
+        queries,
+        "select_sync_watermark",
+        AsyncMock(return_value="2025-03-10T04:00:00+00:00"),
+    )
+    monkeypatch.setattr(queries, "select_by_cids", AsyncMock(return_value=[known]))
+    update_sync_watermark = AsyncMock(return_value=None)
+    monkeypatch.setattr(queries, "update_sync_watermark", update_sync_watermark)
+    monkeypatch.setattr(citations.Database, "fetch_all", AsyncMock(return_value=[]))
+    format_crossref_citation = MagicMock(
+        return_value={"cid": "new", "doi": "doi", "citation": "citation"}
+    )
+    monkeypatch.setattr(citations, "format_crossref_citation", format_crossref_citation)
+    monkeypatch.setattr(
+        queries, "upsert_citations", AsyncMock(return_value=[{"cid": "new"}])
+    )
+    monkeypatch.setattr(citations, "publish_invalidation", AsyncMock())
+
+    result = await extract_all_citations_by_prefix("10.59350")
+
+    assert requests[0].url.params["startDate"] == "2025-03-03"
+    assert queries.select_by_cids.call_args.args[0] == [
+        "10.59350/4rj2q-98c96::10.3233/jnr-220002",
+        "10.59350/4rj2q-98c96::10.31222/osf.io/new",
+    ]
+    assert format_crossref_citation.call_count == 1
+    assert result == [known, {"cid": "new"}]
+    assert update_sync_watermark.call_args.args[0] == "10.59350"
+    assert update_sync_watermark.call_args.args[2] == 2
+
+
+@pytest.mark.asyncio
+async def test_extract_citations_by_prefix_failed_lookup(monkeypatch):
+    """Citations that failed are left out of the result, and the watermark is
+    not moved, so that the next sync retries them."""
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(200, text=FORWARD_LINKS)
+    )
+    async_client = httpx.AsyncClient
+    monkeypatch.setattr(
+        citations.httpx,
+        "AsyncClient",
+        lambda **kwargs: async_client(transport=transport, **kwargs),
+    )
+    monkeypatch.setenv("QUART_CROSSREF_USERNAME_WITH_ROLE", "user")
+    monkeypatch.setenv("QUART_CROSSREF_PASSWORD", "password")
+    queries = citations.CitationsQueries
+    monkeypatch.setattr(queries, "select_sync_watermark", AsyncMock(return_value=None))
+    monkeypatch.setattr(queries, "select_by_cids", AsyncMock(return_value=[]))
+    update_sync_watermark = AsyncMock(return_value=None)
+    monkeypatch.setattr(queries, "update_sync_watermark", update_sync_watermark)
+    monkeypatch.setattr(citations.Database, "fetch_all", AsyncMock(return_value=[]))
+    format_crossref_citation = MagicMock(
+        side_effect=[
+            {"cid": "new", "doi": "doi", "citation": "citation"},
+            RuntimeError("lookup failed"),
+        ]
+    )
+    monkeypatch.setattr(citations, "format_crossref_citation", format_crossref_citation)
+    monkeypatch.setattr(
+        queries, "upsert_citations", AsyncMock(return_value=[{"cid": "new"}])
+    )
+    monkeypatch.setattr(citations, "publish_invalidation", AsyncMock())
+
+    result = await extract_all_citations_by_prefix("10.59350")
+
+    assert result == [{"cid": "new"}]
+    assert update_sync_watermark.call_count == 0
+
+
+@pytest.mark.asyncio
+async def test_extract_citations_by_prefix_download_error(monkeypatch):
+    """Download errors are raised as is, without moving the watermark."""
+    transport = httpx.MockTransport(lambda request: httpx.Response(500))
+    async_client = httpx.AsyncClient
+    monkeypatch.setattr(
+        citations.httpx,
+        "AsyncClient",
+        lambda **kwargs: async_client(transport=transport, **kwargs),
+    )
+    monkeypatch.setenv("QUART_CROSSREF_USERNAME_WITH_ROLE", "user")
+    monkeypatch.setenv("QUART_CROSSREF_PASSWORD", "password")
+    queries = citations.CitationsQueries
+    monkeypatch.setattr(queries, "select_sync_watermark", AsyncMock(return_value=None))
+    update_sync_watermark = AsyncMock(return_value=None)
+    monkeypatch.setattr(queries, "update_sync_watermark", update_sync_watermark)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await extract_all_citations_by_prefix("10.59350")
+    assert update_sync_watermark.call_count == 0
+
+
+class CitingMetadata:
+    """Metadata of a citing DOI, without network access."""
+
+    def __init__(self, doi):
+        self.id = f"https://doi.org/{doi}"
+        self.type = "JournalArticle"
+        self.date = {"published": "2024-05-01"}
+
+    def write(self, to, **kwargs):
+        return f"Citation of {self.id}".encode("utf-8")
+
+
+@pytest.mark.asyncio
+async def test_upsert_citations_pipeline(monkeypatch):
+    """Blogs of all cited DOIs are looked up with one query, and all new
+    citations are upserted with one statement."""
+    forward_links = [
+        {
+            "@doi": "10.59350/aaaaa-11111",
+            "journal_cite": {"doi": {"#text": "10.1234/A"}},
+        },
+        {"@doi": "10.59350/bbbbb-22222", "book_cite": {"doi": {"#text": "10.1234/b"}}},
+        {"@doi": "10.59350/bbbbb-22222", "book_cite": {"doi": {"#text": "10.1234/b"}}},
+        {"@doi": "10.59350/ccccc-33333"},
+    ]
+    fetch_all = AsyncMock(
+        return_value=[
+            {"doi": "https://doi.org/10.59350/aaaaa-11111", "blog_slug": "a"},
+            {"doi": "https://doi.org/10.59350/bbbbb-22222", "blog_slug": "b"},
+        ]
+    )
+    monkeypatch.setattr(citations.Database, "fetch_all", fetch_all)
+    monkeypatch.setattr(citations, "Metadata", CitingMetadata)
+    queries = citations.CitationsQueries
+    monkeypatch.setattr(queries, "select_by_cids", AsyncMock(return_value=[]))
+    upsert = AsyncMock(side_effect=lambda rows: rows)
+    monkeypatch.setattr(queries, "upsert_citations", upsert)
+    publish_invalidation = AsyncMock()
+    monkeypatch.setattr(citations, "publish_invalidation", publish_invalidation)
+
+    result, failed = await upsert_citations(forward_links)
+
+    assert fetch_all.call_count == 1
+    assert fetch_all.call_args.args[1] == {
+        "dois": [
+            "https://doi.org/10.59350/aaaaa-11111",
+            "https://doi.org/10.59350/bbbbb-22222",
+        ]
+    }
+    assert upsert.call_count == 1
+    assert [(c["cid"], c["blog_slug"]) for c in result] == [
+        ("10.59350/aaaaa-11111::10.1234/a", "a"),
+        ("10.59350/bbbbb-22222::10.1234/b", "b"),
+    ]
+    assert result[0]["citation"] == "https://doi.org/10.1234/a"
+    assert result[0]["published_at"] == "2024-05-01"
+    assert failed == 0
+    assert publish_invalidation.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_stream_forward_links():
+    """Forward links are parsed from small chunks as they arrive, in the shape
+    of xmltodict."""
+    body = FORWARD_LINKS.encode("utf-8")
+    received = []
+
+    async def chunks():
+        for start in range(0, len(body), 16):
+            received.append(start)
+            yield body[start : start + 16]
+
+    links = []
+    async for link in stream_forward_links(chunks()):
+        links.append((len(received), link))
+
+    expected = xmltodict.parse(FORWARD_LINKS)["crossref_result"]["query_result"]
+    assert [link for _, link in links] == expected["body"]["forward_link"]
+    # the first forward link is yielded before the download finished
+    assert links[0][0] < len(received)
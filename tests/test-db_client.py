@@ -0,0 +1,163 @@
+"""Test database client"""
+
+import importlib
+from unittest.mock import AsyncMock
+
+import psycopg
+import pytest  # noqa: F401
+from psycopg.adapt import AdaptersMap, Transformer
+from psycopg.pq import Format
+
+from api.db_client import CitationsQueries, PostsQueries, register_loaders
+
+db_client = importlib.import_module("api.db_client")
+
+
+class LoaderContext:
+    """Adaptation context without connection, like a cursor's."""
+
+    def __init__(self):
+        self.adapters = AdaptersMap(psycopg.adapters)
+        self.connection = None
+
+
+def load(type_name: str, data: bytes, array: bool = False):
+    context = LoaderContext()
+    register_loaders(context)
+    info = psycopg.adapters.types[type_name]
+    oid = info.array_oid if array else info.oid
+    return Transformer(context).get_loader(oid, Format.TEXT).load(data)
+
+
+def test_numeric_loader():
+    """Numeric values are loaded as int if integral, otherwise as float."""
+    assert load("numeric", b"3") == 3
+    assert load("numeric", b"3.00") == 3
+    assert isinstance(load("numeric", b"3.00"), int)
+    assert load("numeric", b"-0.25") == -0.25
+    assert load("numeric", b"12345678901234567890.0") == 12345678901234567890
+    assert load("numeric", b"{1.5,2.0}", array=True) == [1.5, 2]
+
+
+def test_datetime_loaders():
+    """Timestamps and dates are loaded as ISO 8601 strings."""
+    assert (
+        load("timestamptz", b"2024-01-02 03:04:05.123+00")
+        == "2024-01-02T03:04:05.123000+00:00"
+    )
+    assert load("timestamp", b"2024-01-02 03:04:05") == "2024-01-02T03:04:05"
+    assert load("date", b"2024-01-02") == "2024-01-02"
+
+
+def test_uuid_loader():
+    """UUIDs are loaded as strings."""
+    uuid = "0b5d6a9c-7a3e-4f2b-9c1d-2e3f4a5b6c7d"
+    assert load("uuid", uuid.encode("ascii")) == uuid
+
+
+def test_jsonb_loader():
+    """JSONB is parsed."""
+    assert load("jsonb", b'{"authors": [{"name": "Jane Doe"}]}') == {
+        "authors": [{"name": "Jane Doe"}]
+    }
+
+
+@pytest.mark.asyncio
+async def test_select_post_by_id_from_document(monkeypatch):
+    """Posts are read from the post_documents read model with one query."""
+    document = {
+        "id": "0b5d6a9c-7a3e-4f2b-9c1d-2e3f4a5b6c7d",
+        "title": "A post",
+        "blog": {"slug": "blog"},
+        "citations": [{"cid": "1"}],
+    }
+    mock_fetch_one = AsyncMock(side_effect=lambda *args: {"document": dict(document)})
+    monkeypatch.setattr(db_client.Database, "fetch_one", mock_fetch_one)
+
+    post = await PostsQueries.select_by_id(document["id"], with_citations=True)
+    assert post == document
+    assert "post_documents" in mock_fetch_one.call_args.args[0]
+    # the blog is joined when reading, not embedded in the document
+    assert "JOIN blogs" in mock_fetch_one.call_args.args[0]
+
+    post = await PostsQueries.select_by_doi("https://doi.org/10.59350/abc")
+    assert "citations" not in post
+    assert mock_fetch_one.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_select_post_by_id_missing(monkeypatch):
+    """Missing posts return None."""
+    monkeypatch.setattr(db_client.Database, "fetch_one", AsyncMock(return_value=None))
+
+    assert (
+        await PostsQueries.select_by_id("0b5d6a9c-7a3e-4f2b-9c1d-2e3f4a5b6c7d") is None
+    )
+
+
+@pytest.mark.asyncio
+async def test_select_posts_by_ids_or_dois(monkeypatch):
+    """Posts are read by ids and DOIs with a single query."""
+    document = {
+        "id": "0b5d6a9c-7a3e-4f2b-9c1d-2e3f4a5b6c7d",
+        "doi": "https://doi.org/10.59350/abc",
+        "citations": [{"cid": "1"}],
+    }
+    mock_fetch_all = AsyncMock(return_value=[{"document": dict(document)}])
+    monkeypatch.setattr(db_client.Database, "fetch_all", mock_fetch_all)
+
+    posts = await PostsQueries.select_by_ids_or_dois(
+        [document["id"]], ["https://doi.org/10.59350/abc"]
+    )
+    assert posts == [{"id": document["id"], "doi": document["doi"]}]
+    assert mock_fetch_all.call_count == 1
+    assert mock_fetch_all.call_args.args[1] == {
+        "post_ids": [document["id"]],
+        "dois": ["https://doi.org/10.59350/abc"],
+    }
+
+    assert await PostsQueries.select_by_ids_or_dois([], []) == []
+    assert mock_fetch_all.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_select_citations_by_cids(monkeypatch):
+    """Known citations are selected with one query."""
+    mock_fetch_all = AsyncMock(return_value=[{"cid": "abc"}])
+    monkeypatch.setattr(db_client.Database, "fetch_all", mock_fetch_all)
+
+    assert await CitationsQueries.select_by_cids(["abc", "def"]) == [{"cid": "abc"}]
+    assert mock_fetch_all.call_args.args[1] == {"cids": ["abc", "def"]}
+    assert await CitationsQueries.select_by_cids([]) == []
+    assert mock_fetch_all.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_upsert_citations_in_one_statement(monkeypatch):
+    """Citations are upserted with one statement, the citation counts of the
+    cited posts are updated by triggers in the same statement."""
+    mock_fetch_all = AsyncMock(
+        return_value=[
+            {"cid": "a", "doi": "https://doi.org/10.59350/a"},
+            {"cid": "b", "doi": "https://doi.org/10.59350/b"},
+        ]
+    )
+    mock_execute = AsyncMock(return_value=None)
+    monkeypatch.setattr(db_client.Database, "fetch_all", mock_fetch_all)
+    monkeypatch.setattr(db_client.Database, "execute", mock_execute)
+
+    result = await CitationsQueries.upsert_citations(
+        [
+            {"cid": "a", "doi": "https://doi.org/10.59350/a", "citation": "x"},
+            {"cid": "b", "doi": "https://doi.org/10.59350/b", "citation": "y"},
+        ]
+    )
+
+    assert [row["cid"] for row in result] == ["a", "b"]
+    assert mock_fetch_all.call_count == 1
+    assert "jsonb_populate_recordset" in mock_fetch_all.call_args.args[0]
+    rows = mock_fetch_all.call_args.args[1]["citations"].obj
+    assert rows[0]["citation"] == "x" and rows[0]["blog_slug"] is None
+    mock_execute.assert_not_called()
+    assert await CitationsQueries.upsert_citations([]) == []
+    assert mock_fetch_all.call_count == 1
@@ -0,0 +1,118 @@
+"""Test sitemaps and feeds"""
+
+import gzip
+from xml.etree.ElementTree import fromstring
+
+import orjson
+import pytest
+
+from api.feeds import (
+    SITEMAP_MAX_URLS,
+    atom_feed,
+    compress,
+    json_feed,
+    parse_sitemap_name,
+    shard_range,
+    sitemap_index,
+    sitemap_name,
+)
+
+BLOG = {
+    "slug": "front_matter",
+    "title": "Front Matter",
+    "home_page_url": "https://blog.front-matter.de",
+    "language": "en",
+    "authors": [
+        {"name": "Martin Fenner", "url": "https://orcid.org/0000-0003-1419-2405"}
+    ],
+    "updated_at": 1700000000.0,
+}
+POSTS = [
+    {
+        "id": "0b5d6a9c-7a3e-4f2b-9c1d-2e3f4a5b6c7d",
+        "doi": "https://doi.org/10.53731/example",
+        "url": "https://blog.front-matter.de/posts/example",
+        "title": "Examples & counterexamples",
+        "summary": "A summary",
+        "content_html": "<p>Content</p>",
+        "published_at": 1700000000.0,
+        "updated_at": 1700000100.0,
+        "authors": [{"name": "Martin Fenner"}],
+        "tags": ["Open Science"],
+        "language": "en",
+        "image": None,
+    }
+]
+
+
+def test_shard_range():
+    """Shards are months in UTC."""
+    assert shard_range("2023-12") == (1701388800.0, 1704067200.0)
+    with pytest.raises(ValueError):
+        shard_range("2023-13")
+    with pytest.raises(ValueError):
+        shard_range("2023")
+
+
+def test_parse_sitemap_name():
+    """Months continue in numbered parts, the first part has no number."""
+    assert parse_sitemap_name("2023-12") == ("2023-12", 1)
+    assert parse_sitemap_name("2023-12-2") == ("2023-12", 2)
+    assert parse_sitemap_name(sitemap_name("2023-12", 3)) == ("2023-12", 3)
+    assert sitemap_name("2023-12", 1) == "2023-12"
+    for name in ["2023-12-1", "2023-12-02", "2023-12-", "2023-12x2", "2023-12-²"]:
+        with pytest.raises(ValueError):
+            parse_sitemap_name(name)
+
+
+@pytest.mark.asyncio
+async def test_sitemap_index_parts(monkeypatch):
+    """Shards with more posts than a sitemap can hold are listed in parts."""
+
+    async def stream(query, params=None, batch_size=None):
+        yield {"shard": "2023-11", "post_count": 3, "lastmod": 1700000000.0}
+        yield {
+            "shard": "2023-12",
+            "post_count": SITEMAP_MAX_URLS + 1,
+            "lastmod": 1700000100.0,
+        }
+
+    monkeypatch.setattr("api.feeds.Database.stream", stream)
+    body = b"".join([chunk async for chunk in sitemap_index()])
+    ns = {"sm": "http://www.sitemaps.org/schemas/sitemap/0.9"}
+    locs = [e.text for e in fromstring(body).findall("sm:sitemap/sm:loc", ns)]
+    assert [loc.rsplit("/", 1)[1] for loc in locs] == [
+        "2023-11.xml",
+        "2023-12.xml",
+        "2023-12-2.xml",
+    ]
+
+
+def test_json_feed():
+    """JSON Feed 1.1 with DOIs as item ids."""
+    feed = orjson.loads(json_feed(BLOG, POSTS))
+    assert feed["version"] == "https://jsonfeed.org/version/1.1"
+    assert feed["feed_url"].endswith("/blogs/front_matter/feed.json")
+    item = feed["items"][0]
+    assert item["id"] == "https://doi.org/10.53731/example"
+    assert item["date_published"] == "2023-11-14T22:13:20Z"
+    assert item["tags"] == ["Open Science"]
+    assert "image" not in item
+
+
+def test_atom_feed():
+    """Atom feed with escaped titles and html content."""
+    ns = {"atom": "http://www.w3.org/2005/Atom"}
+    feed = fromstring(atom_feed(BLOG, POSTS))
+    assert feed.find("atom:title", ns).text == "Front Matter"
+    assert feed.find("atom:updated", ns).text == "2023-11-14T22:15:00Z"
+    entry = feed.find("atom:entry", ns)
+    assert entry.find("atom:title", ns).text == "Examples & counterexamples"
+    assert entry.find("atom:content", ns).text == "<p>Content</p>"
+
+
+def test_compress():
+    """Bodies are stored with their gzip version, which is deterministic."""
+    document = compress(b"<urlset/>")
+    assert gzip.decompress(document["gzip"]) == b"<urlset/>"
+    assert compress(b"<urlset/>")["gzip"] == document["gzip"]
@@ -0,0 +1,61 @@
+"""Test JSON provider"""
+
+from datetime import datetime, timezone
+from decimal import Decimal
+from uuid import UUID
+
+import orjson as json
+import pytest  # noqa: F401
+from psycopg.types.json import Jsonb
+from quart import Quart
+
+from api.json_provider import OrjsonProvider, dumps, ndjson_lines
+
+
+def test_dumps_native_types():
+    """UUID, datetime, Decimal and Jsonb are serialized."""
+    value = {
+        "id": UUID("0b5d6a9c-7a3e-4f2b-9c1d-2e3f4a5b6c7d"),
+        "updated_at": datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+        "count": Decimal("3"),
+        "score": Decimal("0.5"),
+        "authors": Jsonb([{"name": "Jane Doe"}]),
+    }
+    assert json.loads(dumps(value)) == {
+        "id": "0b5d6a9c-7a3e-4f2b-9c1d-2e3f4a5b6c7d",
+        "updated_at": "2024-01-02T03:04:05+00:00",
+        "count": 3,
+        "score": 0.5,
+        "authors": [{"name": "Jane Doe"}],
+    }
+
+
+def test_dumps_sort_keys():
+    """Keys are sorted when requested."""
+    assert dumps({"b": 1, "a": 2}, sort_keys=True) == b'{"a":2,"b":1}'
+
+
+def test_dumps_unsupported_type():
+    """Unsupported types raise TypeError."""
+    with pytest.raises(TypeError):
+        dumps({"value": object()})
+
+
+@pytest.mark.asyncio
+async def test_ndjson_lines():
+    """Items are serialized one per line."""
+    lines = [line async for line in ndjson_lines([{"a": 1}, {"b": Decimal("2")}])]
+    assert lines == [b'{"a":1}\n', b'{"b":2}\n']
+
+
+@pytest.mark.asyncio
+async def test_orjson_provider_response():
+    """jsonify uses the orjson provider."""
+    app = Quart(__name__)
+    app.json = OrjsonProvider(app)
+    async with app.app_context():
+        response = app.json.response({"b": Decimal("1.5"), "a": "ü"})
+        assert response.mimetype == "application/json"
+        assert await response.get_data() == '{"a":"ü","b":1.5}\n'.encode("utf-8")
+        assert app.json.loads(app.json.dumps({"a": 1})) == {"a": 1}
+
@@ -1,3 +1,5 @@
+import gzip
+import orjson as json
 import pytest
 import pydash as py_
 from os import environ
@@ -73,6 +75,75 @@ async def test_single_blog_route():
             assert "slug" in result or "title" in result
 
 
+async def test_blog_posts_cursor_route():
+    """Test blog route with cursor pagination of posts."""
+    async with app.test_app():
+        test_client = app.test_client()
+        response = await test_client.get("/blogs/front_matter?per_page=2")
+        assert response.status_code in [200, 404]
+        if response.status_code == 200:
+            result = await response.get_json()
+            assert result["post_count"] >= len(result["posts"])
+            assert len(result["posts"]) <= 2
+            if result["next_cursor"]:
+                response = await test_client.get(
+                    f"/blogs/front_matter?per_page=2&cursor={result['next_cursor']}"
+                )
+                assert response.status_code == 200
+                next_page = await response.get_json()
+                ids = [post["id"] for post in result["posts"]]
+                assert all(post["id"] not in ids for post in next_page["posts"])
+                assert (
+                    next_page["posts"][0]["published_at"]
+                    <= result["posts"][-1]["published_at"]
+                )
+
+
+async def test_blog_invalid_cursor_route():
+    """Test blog route with invalid cursor."""
+    async with app.test_app():
+        test_client = app.test_client()
+        response = await test_client.get("/blogs/front_matter?cursor=invalid")
+        assert response.status_code == 400
+
+
+async def test_blog_json_feed_route():
+    """Test blog JSON Feed route."""
+    async with app.test_app():
+        test_client = app.test_client()
+        response = await test_client.get("/blogs/front_matter/feed.json")
+        assert response.status_code in [200, 404]
+        if response.status_code == 200:
+            assert response.mimetype == "application/feed+json"
+            result = await response.get_json()
+            assert len(result["items"]) <= 50
+
+
+async def test_sitemap_route():
+    """Test sitemap index and sitemap of a month, gzip compressed."""
+    async with app.test_app():
+        test_client = app.test_client()
+        response = await test_client.get(
+            "/sitemap.xml", headers={"Accept-Encoding": "identity"}
+        )
+        assert response.status_code == 200
+        index = await response.get_data(as_text=True)
+        assert "<sitemapindex" in index
+        shard = index.split("/sitemaps/")[1].split(".xml")[0]
+
+        response = await test_client.get(
+            f"/sitemaps/{shard}.xml", headers={"Accept-Encoding": "gzip"}
+        )
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert b"<urlset" in gzip.decompress(await response.get_data())
+
+        response = await test_client.get(
+            f"/sitemaps/{shard}.xml", headers={"If-None-Match": response.headers["ETag"]}
+        )
+        assert response.status_code == 304
+
+
 async def test_posts_redirect_route():
     """Test posts redirect route."""
     async with app.test_app():
@@ -192,6 +263,51 @@ async def test_posts_unregistered_route():
         assert isinstance(result, list)
 
 
+async def test_posts_with_included_blogs_route():
+    """Test posts route with blogs returned once in included map."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        response = await test_client.get("/posts?include=blogs")
+        assert response.status_code == 200
+        result = await response.get_json()
+        blogs = result["included"]["blogs"]
+        for hit in result["hits"]:
+            post = hit["document"]
+            assert "blog" not in post
+            assert blogs[post["blog_slug"]]["slug"] == post["blog_slug"]
+
+
+async def test_posts_unregistered_with_included_blogs_route():
+    """Test posts unregistered route with blogs returned once in included map."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        response = await test_client.get("/posts/unregistered?include=blogs")
+        assert response.status_code == 200
+        result = await response.get_json()
+        assert isinstance(result["items"], list)
+        for post in result["items"]:
+            assert post["blog_slug"] in result["included"]["blogs"]
+
+
+async def test_posts_as_ndjson_route():
+    """Test posts route streaming newline-delimited JSON."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        response = await test_client.get(
+            "/posts?per_page=5", headers={"Accept": "application/x-ndjson"}
+        )
+        assert response.status_code == 200
+        assert response.mimetype == "application/x-ndjson"
+        lines = (await response.get_data(as_text=True)).splitlines()
+        assert len(lines) <= 5
+        assert int(response.headers["X-Total-Count"]) >= len(lines)
+        for line in lines:
+            assert json.loads(line)["title"] is not None
+
+
 async def test_posts_filter_by_published_since_route():
     """Test posts route with published_since and published_until filters."""
     async with app.test_app():
@@ -219,6 +335,95 @@ async def test_posts_filter_by_tags_route():
             assert post["title"] is not None
 
 
+async def test_posts_filter_by_all_tags_route():
+    """Test posts route with tags filter matching all tags."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        response = await test_client.get(
+            "/posts?tags=open+access,open+science&tags_match=all"
+        )
+        assert response.status_code == 200
+        result = await response.get_json()
+        assert result["found"] >= 0
+        for hit in result["hits"]:
+            tags = py_.get(hit, "document.tags")
+            assert "Open Access" in tags
+            assert "Open Science" in tags
+
+
+async def test_posts_with_sort_and_order_route():
+    """Test posts route with sort and ascending order."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        response = await test_client.get("/posts?sort=updated_at&order=asc")
+        assert response.status_code == 200
+        result = await response.get_json()
+        if result["found"] > 1:
+            post0 = py_.get(result, "hits[0].document")
+            post1 = py_.get(result, "hits[1].document")
+            assert post0["updated_at"] <= post1["updated_at"]
+
+
+async def test_posts_with_invalid_sort_route():
+    """Test posts route with sort key that is not supported."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        response = await test_client.get("/posts?sort=content_html")
+        assert response.status_code == 400
+
+
+async def test_posts_with_invalid_published_since_route():
+    """Test posts route with dates that are not ISO 8601 dates."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        response = await test_client.get("/posts?published_since=yesterday")
+        assert response.status_code == 400
+        response = await test_client.get("/posts?published_until=2024-13")
+        assert response.status_code == 400
+
+
+async def test_posts_with_invalid_numbers_route():
+    """Test posts and blog routes with page options that are not integers."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        for args in ["per_page=ten", "page=1.5", "max_facet_values=x", "per_page=0"]:
+            response = await test_client.get(f"/posts?{args}")
+            assert response.status_code == 400
+            result = await response.get_json()
+            assert result["error"].startswith("Invalid ")
+        response = await test_client.get("/blogs/front_matter?per_page=ten")
+        assert response.status_code == 400
+
+
+async def test_posts_with_facet_by_route():
+    """Test posts route with facet counts."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        response = await test_client.get("/posts?facet_by=language,tags&language=en")
+        assert response.status_code == 200
+        result = await response.get_json()
+        facet_counts = result["facet_counts"]
+        assert [f["field_name"] for f in facet_counts] == ["language", "tags"]
+        for count in facet_counts[0]["counts"]:
+            assert count["value"] == "en"
+            assert count["count"] == result["found"]
+
+
+async def test_posts_with_invalid_facet_by_route():
+    """Test posts route with facet field that is not supported."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        response = await test_client.get("/posts?facet_by=title")
+        assert response.status_code == 400
+
+
 async def test_posts_filter_by_language_route():
     """Test posts route with language filter."""
     async with app.test_app():
@@ -233,6 +438,205 @@ async def test_posts_filter_by_language_route():
             assert post["language"] == "es"
 
 
+async def test_posts_changes_route():
+    """Test posts changes route with cursor."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        response = await test_client.get("/posts/changes?per_page=5")
+        assert response.status_code == 200
+        result = await response.get_json()
+        assert len(result["items"]) <= 5
+        for change in result["items"]:
+            assert change["operation"] in ["upsert", "delete"]
+            if change["operation"] == "upsert" and change["post"]:
+                assert change["post"]["id"] == change["id"]
+                assert "status" not in change["post"]
+        if result["has_more"]:
+            response = await test_client.get(
+                f"/posts/changes?per_page=5&cursor={result['next_cursor']}"
+            )
+            assert response.status_code == 200
+            next_page = await response.get_json()
+            ids = [change["id"] for change in result["items"]]
+            assert all(change["id"] not in ids for change in next_page["items"])
+
+
+async def test_posts_changes_since_route():
+    """Test posts changes route with since."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        response = await test_client.get("/posts/changes?since=2024-01-01")
+        assert response.status_code == 200
+        result = await response.get_json()
+        assert all(change["changed_at"] >= "2024-01-01" for change in result["items"])
+
+
+async def test_posts_changes_invalid_cursor_route():
+    """Test posts changes route with invalid cursor."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        response = await test_client.get("/posts/changes?cursor=invalid")
+        assert response.status_code == 400
+
+
+async def test_posts_changes_invalid_since_route():
+    """Test posts changes route with since that is neither a date nor a unix
+    timestamp."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        response = await test_client.get("/posts/changes?since=yesterday")
+        assert response.status_code == 400
+
+
+async def test_posts_changes_invalid_per_page_route():
+    """Test posts changes route with per_page that is not a positive integer."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        for per_page in ["abc", "0"]:
+            response = await test_client.get(f"/posts/changes?per_page={per_page}")
+            assert response.status_code == 400
+
+
+async def test_posts_batch_route():
+    """Test posts batch route with ids and DOIs."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        ids = [
+            "77b2102f-fec5-425a-90a3-4a97c768bdc4",
+            "10.53731/ybhah-9jy85",
+            "https://doi.org/10.53731/not-found",
+        ]
+        response = await test_client.post(
+            "/posts/batch", json={"ids": ids, "include_fields": "id,doi,title"}
+        )
+        assert response.status_code == 200
+        result = await response.get_json()
+        assert sorted(result["items"].keys()) == sorted(ids)
+        assert result["items"]["https://doi.org/10.53731/not-found"] is None
+        post = result["items"]["77b2102f-fec5-425a-90a3-4a97c768bdc4"]
+        assert post["id"] == "77b2102f-fec5-425a-90a3-4a97c768bdc4"
+        assert "summary" not in post
+
+
+async def test_posts_batch_route_invalid():
+    """Test posts batch route with invalid body."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        response = await test_client.post("/posts/batch", json={"ids": "10.53731/x"})
+        assert response.status_code == 400
+
+
+async def test_posts_bibliography_route():
+    """Test posts bibliography route with DOIs, style and locale."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        ids = ["10.53731/ybhah-9jy85", "https://doi.org/10.53731/not-found"]
+        response = await test_client.post(
+            "/posts/bibliography",
+            json={"ids": ids, "style": "apa", "locale": "en-US"},
+        )
+        assert response.status_code == 200
+        assert response.headers["Content-Type"] == (
+            "text/x-bibliography; style=apa; locale=en-US"
+        )
+        result = await response.get_data(as_text=True)
+        assert result.startswith("Fenner, M. (2023). <i>The rise of the (science)")
+
+
+async def test_posts_bibliography_route_invalid():
+    """Test posts bibliography route with unknown format and style."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        ids = ["10.53731/ybhah-9jy85"]
+        response = await test_client.post(
+            "/posts/bibliography", json={"ids": ids, "format": "pdf"}
+        )
+        assert response.status_code == 400
+        response = await test_client.post(
+            "/posts/bibliography", json={"ids": ids, "style": "not-a-style"}
+        )
+        assert response.status_code == 400
+
+
+async def test_posts_export_route_unauthorized():
+    """Test posts export route without service role key."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        response = await test_client.get("/posts/export")
+        assert response.status_code == 401
+
+
+async def test_posts_export_route():
+    """Test posts export route, ordered by updated_at and resumable."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        key = environ["ROGUE_SCHOLAR_SERVICE_ROLE_KEY"]
+        headers = {"Authorization": f"Bearer {key}", "Accept-Encoding": "identity"}
+        response = await test_client.get(
+            "/posts/export?blog_slug=front_matter", headers=headers
+        )
+        assert response.status_code == 200
+        assert response.mimetype == "application/x-ndjson"
+        assert "Content-Encoding" not in response.headers
+        posts = [
+            json.loads(line)
+            for line in (await response.get_data(as_text=True)).splitlines()
+        ]
+        assert len(posts) > 1
+        assert all(post["blog_slug"] == "front_matter" for post in posts)
+        keys = [(post["updated_at"], post["id"]) for post in posts]
+        assert keys == sorted(keys)
+
+        # resume after the first post
+        first = posts[0]
+        response = await test_client.get(
+            f"/posts/export?blog_slug=front_matter&since={first['updated_at']}&after={first['id']}",
+            headers=headers,
+        )
+        assert response.status_code == 200
+        lines = (await response.get_data(as_text=True)).splitlines()
+        assert [json.loads(line)["id"] for line in lines] == [
+            post["id"] for post in posts[1:]
+        ]
+
+
+async def test_posts_export_route_gzip():
+    """Test posts export route with gzip compression."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        key = environ["ROGUE_SCHOLAR_SERVICE_ROLE_KEY"]
+        headers = {"Authorization": f"Bearer {key}", "Accept-Encoding": "gzip"}
+        response = await test_client.get(
+            "/posts/export?blog_slug=front_matter", headers=headers
+        )
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        lines = gzip.decompress(await response.get_data()).splitlines()
+        assert len(lines) > 1
+        assert json.loads(lines[0])["blog_slug"] == "front_matter"
+
+
+async def test_snapshots_latest_route_unauthorized():
+    """Test latest snapshot route without service role key."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        response = await test_client.get("/snapshots/latest")
+        assert response.status_code == 401
+
+
 async def test_posts_post_route():
     """Test posts post route."""
     async with app.test_app():
@@ -260,6 +664,70 @@ async def test_post_route():
         assert result["language"] == "es"
 
 
+async def test_post_route_not_modified():
+    """Test post route returns 304 for a matching ETag."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        response = await test_client.get("/posts/77b2102f-fec5-425a-90a3-4a97c768bdc4")
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        assert response.headers["Last-Modified"] is not None
+        assert "max-age=300" in response.headers["Cache-Control"]
+
+        response = await test_client.get(
+            "/posts/77b2102f-fec5-425a-90a3-4a97c768bdc4",
+            headers={"If-None-Match": etag},
+        )
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert await response.get_data(as_text=True) == ""
+
+
+async def test_post_as_bibtex_etag_differs_from_json():
+    """Test post formats have different ETags."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        response = await test_client.get("/posts/10.59350/sfzv4-xdb68")
+        json_etag = response.headers["ETag"]
+        response = await test_client.get("/posts/10.59350/sfzv4-xdb68.bib")
+        assert response.status_code == 200
+        assert response.headers["ETag"] != json_etag
+
+
+async def test_post_content_negotiation():
+    """Test post formats negotiated with the Accept header."""
+    async with app.test_app():
+        test_client = app.test_client()
+
+        response = await test_client.get(
+            "/posts/10.59350/sfzv4-xdb68",
+            headers={"Accept": "application/x-bibtex;q=0.9, application/json;q=0.5"},
+        )
+        assert response.status_code == 200
+        assert response.headers["Content-Type"] == "application/x-bibtex"
+        assert "Accept" in response.headers["Vary"]
+        result = await response.get_data(as_text=True)
+        assert result.startswith("@article{10.59350/sfzv4-xdb68,")
+
+        response = await test_client.get(
+            "/posts/10.59350/sfzv4-xdb68",
+            headers={"Accept": "text/x-bibliography; style=ieee; locale=en-US"},
+        )
+        assert response.status_code == 200
+        assert response.headers["Content-Type"] == (
+            "text/x-bibliography; style=ieee; locale=en-US"
+        )
+
+        response = await test_client.get(
+            "/posts/10.59350/sfzv4-xdb68", headers={"Accept": "text/html,*/*;q=0.8"}
+        )
+        assert response.status_code == 200
+        assert response.mimetype == "application/json"
+        assert "Accept" in response.headers["Vary"]
+
+
 async def test_post_invalid_uuid_route():
     """Test post route with invalid uuid."""
     async with app.test_app():
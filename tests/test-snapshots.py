@@ -0,0 +1,108 @@
+"""Test snapshots"""
+
+import importlib
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from api.snapshots import (
+    BLOGS_COLUMNS,
+    CITATIONS_COLUMNS,
+    POSTS_COLUMNS,
+    latest_snapshot,
+    snapshot_file_path,
+    write_snapshot,
+)
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+snapshots = importlib.import_module("api.snapshots")
+
+
+def _post(year):
+    post = {name: None for name, _, _ in POSTS_COLUMNS}
+    post.update(
+        {
+            "id": "0b5d6a9c-7a3e-4f2b-9c1d-2e3f4a5b6c7d",
+            "title": "A post",
+            "tags": ["Open Science"],
+            "authors": '[{"name": "Jane Doe"}]',
+            "published_at": 1700000000.0,
+            "citation_count": 2,
+            "content_html": "<p>Content</p>",
+            "year": year,
+        }
+    )
+    return post
+
+
+@pytest.fixture
+def database(monkeypatch, tmp_path):
+    """Serve posts from two years, a blog and a citation from one database
+    snapshot, and write snapshots to a temporary directory."""
+    queries = []
+
+    async def stream(query, params=None, batch_size=1000):
+        queries.append(query)
+        if "FROM posts" in query:
+            rows = [_post(2023), _post(2024), _post(2024)]
+        elif "FROM blogs" in query:
+            rows = [{name: None for name, _, _ in BLOGS_COLUMNS} | {"slug": "blog"}]
+        else:
+            rows = [{name: None for name, _, _ in CITATIONS_COLUMNS}]
+        for row in rows:
+            yield dict(row)
+
+    @asynccontextmanager
+    async def snapshot():
+        queries.append("BEGIN")
+        yield SimpleNamespace(stream=stream)
+
+    monkeypatch.setenv("QUART_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(snapshots.Database, "snapshot", snapshot)
+    return queries
+
+
+@pytest.mark.asyncio
+async def test_write_snapshot(database, tmp_path):
+    """Posts are partitioned by year, without content_html by default."""
+    manifest = await write_snapshot()
+    assert manifest["content_html"] is False
+    assert [(f["path"], f["rows"]) for f in manifest["files"]] == [
+        ("posts/year=2023/part-0.parquet", 1),
+        ("posts/year=2024/part-0.parquet", 2),
+        ("blogs.parquet", 1),
+        ("citations.parquet", 1),
+    ]
+    # all tables are read in one transaction
+    assert database[0] == "BEGIN" and database.count("BEGIN") == 1
+    assert "content_html" not in database[1]
+    table = pq.read_table(
+        tmp_path / manifest["name"] / "posts/year=2024/part-0.parquet"
+    )
+    assert "content_html" not in table.column_names
+    assert table.column("tags").to_pylist() == [["Open Science"], ["Open Science"]]
+    assert table.column("citation_count").type == pa.int64()
+    assert latest_snapshot() == manifest
+
+
+@pytest.mark.asyncio
+async def test_write_snapshot_with_content_html(database, tmp_path):
+    """content_html is included on request."""
+    manifest = await write_snapshot(include_content_html=True)
+    table = pq.read_table(
+        tmp_path / manifest["name"] / "posts/year=2023/part-0.parquet"
+    )
+    assert table.column("content_html").to_pylist() == ["<p>Content</p>"]
+
+
+@pytest.mark.asyncio
+async def test_snapshot_file_path(database):
+    """Only files listed in the manifest can be downloaded."""
+    manifest = await write_snapshot()
+    assert snapshot_file_path(manifest, "blogs.parquet").endswith(
+        f"{manifest['name']}/blogs.parquet"
+    )
+    assert snapshot_file_path(manifest, "manifest.json") is not None
+    assert snapshot_file_path(manifest, "../manifest.json") is None
@@ -10,6 +10,8 @@ from api.utils import (
     get_date,
     convert_to_commonmeta,
     get_formatted_metadata,
+    format_bibliography,
+    negotiate_format,
     validate_uuid,
     unix_timestamp,
     end_of_date,
@@ -34,7 +36,11 @@ from api.utils import (
     parse_blogger_guid,
     extract_wordpress_post_id,
     next_version,
+    get_known_doi_ra,
+    resolve_doi_ra,
+    DOI_RA_REGISTRY,
 )
+import api.utils as utils_module
 
 
 def test_get_date_rss():
@@ -144,6 +150,55 @@ def test_get_url_metadata_csl():
     assert csl["URL"].endswith("/posts/the-rise-of-the-science-newsletter")
 
 
+def test_format_bibliography_citation():
+    "format bibliography with one style for all entries"
+    data = path.join(path.dirname(__file__), "fixtures", "commonmeta.json")
+    data_no_doi = path.join(
+        path.dirname(__file__), "fixtures", "commonmeta-no-doi.json"
+    )
+    result = format_bibliography([data, data_no_doi], style="apa", locale="en-US")
+    entries = result["data"].split("\n\n")
+    assert len(entries) == 2
+    assert entries[0].startswith("Fenner, M. (2023). <i>The rise of the (science)")
+    assert entries[0].endswith("https://doi.org/10.53731/ybhah-9jy85")
+    assert (
+        result["options"]["Content-Type"]
+        == "text/x-bibliography; style=apa; locale=en-US"
+    )
+
+
+def test_format_bibliography_csl():
+    "format bibliography as csl array"
+    data = path.join(path.dirname(__file__), "fixtures", "commonmeta.json")
+    result = format_bibliography([data, data], format_="csl")
+    csl = json.loads(result["data"])
+    assert len(csl) == 2
+    assert csl[0]["type"] == "article"
+    assert csl[0]["title"] == "The rise of the (science) newsletter"
+
+
+def test_format_bibliography_bibtex():
+    "format bibliography as bibtex"
+    data = path.join(path.dirname(__file__), "fixtures", "commonmeta.json")
+    result = format_bibliography([data, data], format_="bibtex")
+    assert result["data"].count("@article{10.53731/ybhah-9jy85,") == 2
+    assert result["options"]["Content-Type"] == "application/x-bibtex"
+
+
+def test_negotiate_format():
+    "negotiate format with q-values and media type parameters"
+    assert negotiate_format([]) == ("json", {})
+    assert negotiate_format([("text/html", 1), ("*/*", 0.8)]) == ("json", {})
+    assert negotiate_format(
+        [("application/x-bibtex", 0.9), ("application/json", 0.5)]
+    ) == ("bibtex", {})
+    assert negotiate_format([("Text/X-Bibliography; style=ieee; locale=de-DE", 1)]) == (
+        "citation",
+        {"style": "ieee", "locale": "de-DE"},
+    )
+    assert negotiate_format([("image/png", 1)]) == ("json", {})
+
+
 def test_get_formatted_metadata_ris():
     "get formatted metadata in ris format"
     data = path.join(path.dirname(__file__), "fixtures", "commonmeta.json")
@@ -669,3 +724,33 @@ def test_next_version():
     assert next_version(None) == "v1"
     assert next_version("v1") == "v2"
     assert next_version("final_version") == "v1"
+
+
+def test_get_known_doi_ra():
+    """Get DOI registration agency from the prefix registry"""
+    assert get_known_doi_ra("https://doi.org/10.53731/r79z0kh-97aq74v-ag58n") == "Crossref"
+    assert get_known_doi_ra("https://doi.org/10.34732/xdtwp-bjp93") == "DataCite"
+    assert get_known_doi_ra("https://doi.org/10.9999/unknown") is None
+    assert get_known_doi_ra(None) is None
+
+
+@pytest.mark.asyncio
+async def test_resolve_doi_ra_looks_up_prefix_once(monkeypatch):
+    """Unknown prefixes are looked up once and then served from the registry"""
+    from unittest.mock import AsyncMock, MagicMock
+
+    mock_lookup = MagicMock(return_value="Crossref")
+    mock_execute = AsyncMock(return_value=None)
+    monkeypatch.setattr(utils_module, "get_doi_ra", mock_lookup)
+    monkeypatch.setattr(utils_module.Database, "execute", mock_execute)
+    monkeypatch.delitem(DOI_RA_REGISTRY, "10.5555", raising=False)
+
+    first = await resolve_doi_ra("https://doi.org/10.5555/12345678")
+    second = await resolve_doi_ra("https://doi.org/10.5555/87654321")
+
+    assert first == "Crossref"
+    assert second == "Crossref"
+    assert get_known_doi_ra("https://doi.org/10.5555/12345678") == "Crossref"
+    mock_lookup.assert_called_once_with("10.5555")
+    mock_execute.assert_called_once()
+    DOI_RA_REGISTRY.pop("10.5555", None)